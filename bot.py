@@ -1,94 +1,163 @@
 import asyncio
-import threading
-import os
-from dotenv import load_dotenv
-from discord_bot import create_discord_bot
+import discord
+from discord_bot import create_discord_bot, setup_discord_bot
 from kook import create_kook_bot
 from forward_config import ForwardConfig
 from cleanup import get_cleanup_service
-
-# 加载环境变量
-load_dotenv()
-
-# 获取平台启用配置
-ENABLE_DISCORD = os.getenv('ENABLE_DISCORD', 'true').lower() == 'true'
-ENABLE_KOOK = os.getenv('ENABLE_KOOK', 'true').lower() == 'true'
-ENABLE_STEAM_MONITOR = os.getenv('ENABLE_STEAM_MONITOR', 'true').lower() == 'true'
-STEAM_CHECK_INTERVAL = int(os.getenv('STEAM_CHECK_INTERVAL', '30'))
+from kook_api_client import close_kook_api_client
+from settings import get_settings
 
 # 全局变量存储机器人实例
 kook_bot_instance = None
 discord_bot_instance = None
 
-def run_discord_bot(kook_bot=None):
-    """在单独线程中运行Discord机器人"""
-    global discord_bot_instance
+async def wait_until_kook_ready(bot, kook_task, timeout):
+    """等待KOOK机器人就绪
+    
+    机器人启动后 client.fetch_me() 成功时 bot.kook_ready 被设置，见 kook.watch_kook_ready。
+    
+    Args:
+        bot: KOOK机器人
+        kook_task: 运行KOOK机器人的任务
+        timeout: 等待的最长时间，单位为秒
+    
+    Returns:
+        bool: 是否就绪；启动任务提前退出或超时返回False
+    """
+    ready = asyncio.create_task(bot.kook_ready.wait())
+    try:
+        # 启动任务提前退出（如Token无效）时不必等到超时
+        await asyncio.wait_for(
+            asyncio.wait({ready, kook_task}, return_when=asyncio.FIRST_COMPLETED), timeout
+        )
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        ready.cancel()
+    if not bot.kook_ready.is_set() and bot.kook_ready_check is not None:
+        # 放弃等待后不再重试
+        bot.kook_ready_check.cancel()
+    return bot.kook_ready.is_set()
+
+async def run_bots(kook_token, discord_token, settings=None):
+    """在同一个事件循环中运行KOOK和Discord机器人
+    
+    两个客户端作为同一循环中的任务运行，转发器直接调用KOOK机器人的协程，
+    共享同一个KOOK HTTP连接池和频道缓存；任一机器人退出不影响另一个，
+    全部退出或收到Ctrl+C时依次关闭。启动时读取的配置传给所有组件。
+    """
+    global kook_bot_instance, discord_bot_instance
+    settings = settings or get_settings()
+    tasks = []
+    cleanup_service = get_cleanup_service(settings)
+    
     try:
-        discord_token = os.getenv('DISCORD_BOT_TOKEN')
+        # 先启动KOOK机器人，等待就绪后再启动Discord机器人（转发依赖KOOK）
+        if kook_token:
+            print('正在启动KOOK机器人...')
+            kook_bot_instance = create_kook_bot(kook_token, settings)
+            kook_task = asyncio.create_task(kook_bot_instance.start(), name='KOOK')
+            tasks.append(kook_task)
+            
+            if await wait_until_kook_ready(kook_bot_instance, kook_task, settings.kook_ready_timeout):
+                print('✅ KOOK机器人已就绪')
+                print('\n【KOOK可用文本命令】:')
+                print('  .ping - 测试机器人是否在线')
+                print('  .hello - 问候命令')
+                print('------')
+            elif kook_task.done():
+                print('❌ KOOK机器人启动失败，消息转发功能将不可用')
+                kook_bot_instance = None
+            else:
+                print(f'⚠️ KOOK机器人未能在{settings.kook_ready_timeout}秒内就绪，转发的消息将保留在发件箱中稍后补发')
+        
         if discord_token:
             print('正在启动Discord机器人...')
-            bot = create_discord_bot(discord_token)
+            discord.utils.setup_logging()
+            bot = create_discord_bot(discord_token, settings)
             # 传递KOOK机器人实例以启用转发功能
-            if kook_bot:
-                from discord_bot import setup_discord_bot
-                bot = setup_discord_bot(bot, discord_token, kook_bot)
+            discord_bot_instance = setup_discord_bot(bot, discord_token, kook_bot_instance, settings)
+            if kook_bot_instance:
                 print('✅ Discord机器人已启用消息转发功能')
-            else:
-                from discord_bot import setup_discord_bot
-                bot = setup_discord_bot(bot, discord_token)
-            discord_bot_instance = bot
-            bot.run(discord_token)
-        else:
-            print('警告: 未找到DISCORD_BOT_TOKEN，跳过Discord机器人启动')
-    except Exception as e:
-        print(f'Discord机器人启动失败: {e}')
+            tasks.append(asyncio.create_task(discord_bot_instance.start(discord_token), name='Discord'))
+        
+        # 启动定期清理服务（启动时先补做一次清理）
+        cleanup_service.start()
+        print(f'🧹 定期清理功能已启用 (间隔: {cleanup_service.cleanup_interval}小时)')
+        
+        print('\n所有机器人已启动，按Ctrl+C退出...')
+        
+        # 等待机器人退出，单个机器人退出时输出原因
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception():
+                    print(f'{task.get_name()}机器人运行失败: {task.exception()}')
+                else:
+                    print(f'{task.get_name()}机器人已停止')
+        print('所有机器人已停止')
+    finally:
+        await shutdown_bots(tasks, cleanup_service)
 
-def run_kook_bot():
-    """在单独线程中运行KOOK机器人"""
-    global kook_bot_instance
+async def shutdown_bots(tasks, cleanup_service=None):
+    """关闭机器人：先停止Discord（不再接收新消息），再在限定时间内发送完转发队列并落盘发件箱，最后停止KOOK"""
+    print('正在关闭机器人...')
+    if discord_bot_instance is not None:
+        try:
+            await discord_bot_instance.close()
+        except Exception as e:
+            print(f'关闭Discord机器人失败: {e}')
+        forwarder = getattr(discord_bot_instance, 'forwarder', None)
+        if forwarder is not None:
+            await forwarder.close()
     
-    async def start_kook():
-        kook_token = os.getenv('KOOK_BOT_TOKEN')
-        if kook_token:
-            print('正在启动KOOK机器人...')
-            bot = create_kook_bot(kook_token)
-            global kook_bot_instance
-            kook_bot_instance = bot
-            await bot.start()
-        else:
-            print('警告: 未找到KOOK_BOT_TOKEN，跳过KOOK机器人启动')
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
     
-    try:
-        # 使用asyncio.run在新线程中运行异步函数
-        asyncio.run(start_kook())
-    except Exception as e:
-        print(f'KOOK机器人启动失败: {e}')
+    # 停止清理服务，关闭KOOK HTTP连接池和本地媒体存储
+    if cleanup_service is not None:
+        stats = cleanup_service.get_stats()
+        print(f'🧹 本次运行共清理 {stats["store"]["deleted_files"]} 个本地媒体文件，'
+              f'释放 {stats["store"]["deleted_bytes"]/1024/1024:.1f}MB')
+        await cleanup_service.stop()
+        await cleanup_service.media_store.close()
+    await close_kook_api_client()
 
 def main():
     """主函数，根据配置启动所需功能"""
     print('=== 多平台机器人启动器（带转发功能）===')
     print('正在检查配置...')
     
+    # 读取配置（只在启动时读取一次.env，之后共享给所有组件）
+    try:
+        settings = get_settings()
+    except ValueError as e:
+        print(f'错误: 配置格式不正确: {e}')
+        return
+    
     # 加载转发配置
-    config = ForwardConfig()
+    config = ForwardConfig(settings)
     forward_rules = config.get_forward_channels()
     if forward_rules:
         print(f'📋 已配置 {len(forward_rules)} 条转发规则:')
-        for discord_id, kook_id in forward_rules:
-            print(f'   Discord频道 {discord_id} -> KOOK频道 {kook_id}')
+        for source, kook_ids in forward_rules:
+            print(f'   {source} -> KOOK频道 {kook_ids}')
     else:
         print('⚠️ 未配置转发规则，消息转发功能将不可用')
         print('   请在.env文件中配置FORWARD_RULES')
     
-    discord_token = os.getenv('DISCORD_BOT_TOKEN')
-    kook_token = os.getenv('KOOK_BOT_TOKEN')
+    discord_token = settings.discord_token
+    kook_token = settings.kook_token
     
     # 检查平台启用状态
-    if not ENABLE_DISCORD:
+    if not settings.enable_discord:
         print('📢 Discord平台已禁用')
         discord_token = None
     
-    if not ENABLE_KOOK:
+    if not settings.enable_kook:
         print('📢 KOOK平台已禁用')
         kook_token = None
     
@@ -97,59 +166,15 @@ def main():
         print('请在.env文件中配置DISCORD_BOT_TOKEN和/或KOOK_BOT_TOKEN，并确保至少启用一个平台')
         return
     
-    threads = []
-    
-    # 先启动KOOK机器人（为了获取实例）
-    if kook_token and ENABLE_KOOK:
-        kook_thread = threading.Thread(target=run_kook_bot, daemon=True)
-        kook_thread.start()
-        threads.append(kook_thread)
-        print('✅ KOOK机器人线程已启动')
-        
-        # 等待KOOK机器人初始化
-        import time
-        time.sleep(3)
-        
-        # 直接输出KOOK可用命令
-        print('\n【KOOK可用文本命令】:')
-        print('  .ping - 测试机器人是否在线')
-        print('  .hello - 问候命令')
-        print('------')
-    
-    # 启动Discord机器人（传递KOOK机器人实例）
-    if discord_token and ENABLE_DISCORD:
-        discord_thread = threading.Thread(target=lambda: run_discord_bot(kook_bot_instance), daemon=True)
-        discord_thread.start()
-        threads.append(discord_thread)
-        print('✅ Discord机器人线程已启动')
-    
-    print('\n所有机器人已启动，按Ctrl+C退出...')
     if forward_rules:
         print('📤 消息转发功能已启用')
     
-    # 启动定期清理服务
-    cleanup_service = get_cleanup_service()
-    cleanup_task = None
-    
     try:
-        # 创建并启动清理任务
-        loop = asyncio.get_event_loop()
-        cleanup_task = loop.create_task(cleanup_service.start_cleanup_task())
-        print(f'🧹 定期清理功能已启用 (间隔: {cleanup_service.cleanup_interval}小时, 最大保留: {cleanup_service.max_age}小时)')
-        
-        # 保持主线程运行
-        while True:
-            # 检查线程状态
-            alive_threads = [t for t in threads if t.is_alive()]
-            if not alive_threads:
-                print('所有机器人线程已停止')
-                break
-            import time
-            time.sleep(1)
+        asyncio.run(run_bots(kook_token, discord_token, settings))
     except KeyboardInterrupt:
-        print('\n正在关闭机器人...')
+        print('机器人已关闭')
     except Exception as e:
         print(f'运行时错误: {e}')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
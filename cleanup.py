@@ -1,24 +1,40 @@
-import os
 import time
 import asyncio
 import logging
 from pathlib import Path
-from datetime import datetime, timedelta
+from typing import Optional
+
+from media_store import MediaStore, get_media_store
+from settings import Settings, get_settings
 
 class CleanupService:
-    def __init__(self, download_dir="downloads", cleanup_interval=24, max_age=72):
+    def __init__(self, download_dir="downloads", cleanup_interval=24, media_store: Optional[MediaStore] = None):
         """
         初始化清理服务
         
+        文件的保留时间和磁盘预算由媒体存储统一管理。清理服务作为常驻组件运行在
+        机器人的事件循环中：启动时对齐一次下载目录和索引，并立即补做一次清理
+        （处理停机期间到期的文件），之后按固定间隔兜底清理，清理时只查询索引。
+        
         Args:
             download_dir: 下载目录路径
             cleanup_interval: 清理间隔，单位为小时
-            max_age: 文件最大保留时间，单位为小时
+            media_store: 媒体存储，为空时使用全局共享的媒体存储
         """
         self.download_dir = Path(download_dir)
         self.cleanup_interval = cleanup_interval
-        self.max_age = max_age
+        self.media_store = media_store or get_media_store()
         self.logger = logging.getLogger("CleanupService")
+        self._task: Optional[asyncio.Task] = None
+        
+        # 运行状态
+        self.runs = 0
+        self.last_run: Optional[float] = None
+        self.last_files = 0
+        self.last_bytes = 0
+        self.total_files = 0
+        self.total_bytes = 0
+        self.next_run: Optional[float] = None
         
         # 确保下载目录存在
         self.ensure_directories()
@@ -31,67 +47,87 @@ class CleanupService:
                 dir_path.mkdir(parents=True, exist_ok=True)
                 self.logger.info(f"创建目录: {dir_path}")
     
+    def start(self):
+        """启动清理服务（需要在事件循环中调用，重复调用无副作用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.start_cleanup_task())
+    
+    async def stop(self):
+        """停止清理服务"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.next_run = None
+    
     async def start_cleanup_task(self):
-        """启动定期清理任务"""
-        self.logger.info(f"启动定期清理任务，间隔: {self.cleanup_interval}小时，最大保留时间: {self.max_age}小时")
+        """运行清理服务：启动时对齐索引并补做一次清理，之后定期清理"""
+        self.logger.info(f"启动定期清理任务，间隔: {self.cleanup_interval}小时")
+        try:
+            result = await asyncio.to_thread(self.media_store.reconcile, {
+                self.download_dir / "images": "image",
+                self.download_dir / "videos": "video",
+                self.download_dir: "other"
+            })
+            self.logger.info(f"本地媒体索引已对齐: 共 {result['total']} 个文件，"
+                             f"补登记 {result['added']} 个，移除失效记录 {result['removed']} 个")
+        except Exception as e:
+            self.logger.error(f"对齐本地媒体索引失败: {e}")
+        # 到期清理和磁盘预算由媒体存储的定时任务实时处理
+        self.media_store.start()
+        
         while True:
             try:
                 await self.cleanup_old_files()
                 # 转换小时为秒
+                self.next_run = time.time() + self.cleanup_interval * 3600
                 await asyncio.sleep(self.cleanup_interval * 3600)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 self.logger.error(f"清理任务出错: {e}")
                 # 出错后等待10分钟再重试
+                self.next_run = time.time() + 600
                 await asyncio.sleep(600)
     
     async def cleanup_old_files(self):
-        """清理过期文件"""
-        now = time.time()
-        max_age_seconds = self.max_age * 3600
-        deleted_count = 0
-        
-        self.logger.info(f"开始清理过期文件，最大保留时间: {self.max_age}小时")
+        """清理过期文件及超出磁盘预算的文件"""
+        self.logger.info("开始清理过期文件")
+        result = await self.media_store.purge()
         
-        # 遍历下载目录的所有子目录
-        for subdir in ["images", "videos"]:
-            dir_path = self.download_dir / subdir
-            if not dir_path.exists():
-                continue
-                
-            for file_path in dir_path.glob("*"):
-                if not file_path.is_file():
-                    continue
-                    
-                # 获取文件修改时间
-                file_mtime = file_path.stat().st_mtime
-                file_age = now - file_mtime
-                
-                # 如果文件超过最大保留时间，则删除
-                if file_age > max_age_seconds:
-                    try:
-                        file_path.unlink()
-                        deleted_count += 1
-                        self.logger.debug(f"已删除过期文件: {file_path}")
-                    except Exception as e:
-                        self.logger.error(f"删除文件失败 {file_path}: {e}")
+        self.runs += 1
+        self.last_run = time.time()
+        self.last_files = result['files']
+        self.last_bytes = result['bytes']
+        self.total_files += result['files']
+        self.total_bytes += result['bytes']
         
-        self.logger.info(f"清理完成，共删除 {deleted_count} 个过期文件")
-        return deleted_count
+        self.logger.info(f"清理完成，共删除 {result['files']} 个文件，释放 {result['bytes']/1024/1024:.1f}MB")
+        return result['files']
+    
+    def get_stats(self) -> dict:
+        """获取清理服务运行状态"""
+        return {
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "last_files": self.last_files,
+            "last_bytes": self.last_bytes,
+            "total_files": self.total_files,
+            "total_bytes": self.total_bytes,
+            "next_run": self.next_run,
+            "store": self.media_store.get_stats()
+        }
 
-def get_cleanup_service():
+def get_cleanup_service(settings: Optional[Settings] = None):
     """
-    从环境变量获取配置并创建清理服务实例
-    """
-    from dotenv import load_dotenv
-    load_dotenv()
-    
-    # 从环境变量获取配置，如果不存在则使用默认值
-    cleanup_interval = int(os.getenv("CLEANUP_INTERVAL", "24"))
-    max_age = int(os.getenv("CLEANUP_MAX_AGE", "72"))
-    download_dir = os.getenv("DOWNLOAD_DIR", "downloads")
+    根据机器人配置创建清理服务实例
     
+    Args:
+        settings: 机器人配置，为空时使用全局共享的配置
+    """
+    settings = settings or get_settings()
     return CleanupService(
-        download_dir=download_dir,
-        cleanup_interval=cleanup_interval,
-        max_age=max_age
-    )
\ No newline at end of file
+        download_dir=settings.download_dir,
+        cleanup_interval=settings.cleanup_interval,
+        media_store=get_media_store(settings)
+    )
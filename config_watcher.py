@@ -0,0 +1,85 @@
+import asyncio
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+
+class ConfigWatcher:
+    """配置文件监视器
+
+    定期检查文件的修改时间和大小（不依赖额外的文件监听库），发生变化时
+    在线程中调用重新加载回调，解析和校验不会阻塞事件循环；
+    回调返回的新配置再交给 apply 在事件循环中应用，不会与消息处理交错。
+    """
+
+    def __init__(self, paths: Iterable, callback: Callable[[], Any], interval: float = 5.0,
+                 settle_delay: float = 0.5, apply: Optional[Callable[[Any], bool]] = None):
+        """
+        初始化配置文件监视器
+
+        Args:
+            paths: 需要监视的文件路径（文件可以暂不存在）
+            callback: 文件变化时在线程中调用的重新加载函数；未指定 apply 时返回是否加载成功，
+                否则返回新的配置（None表示加载失败）
+            interval: 检查间隔，单位为秒
+            settle_delay: 检测到变化后等待文件写完的时间，单位为秒
+            apply: 在事件循环中应用 callback 返回的配置，返回是否应用成功
+        """
+        self.paths = [Path(path) for path in paths]
+        self.callback = callback
+        self.apply = apply
+        self.interval = interval
+        self.settle_delay = settle_delay
+        self._snapshot = self._take_snapshot()
+        self._task: Optional[asyncio.Task] = None
+
+        # 统计信息
+        self.reloads = 0
+        self.failures = 0
+
+    def _take_snapshot(self) -> Dict[Path, Optional[Tuple[int, int]]]:
+        snapshot = {}
+        for path in self.paths:
+            try:
+                stat = path.stat()
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                snapshot[path] = None
+        return snapshot
+
+    def start(self):
+        """启动监视任务（需要在事件循环中调用，重复调用无副作用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.sleep(self.interval)
+                if await asyncio.to_thread(self._take_snapshot) == self._snapshot:
+                    continue
+
+                # 编辑器保存文件可能分多次写入，稍等片刻后以最终状态为准
+                await asyncio.sleep(self.settle_delay)
+                snapshot = await asyncio.to_thread(self._take_snapshot)
+                changed = [str(path) for path in self.paths if snapshot[path] != self._snapshot[path]]
+                self._snapshot = snapshot
+                print(f"🔄 检测到配置文件变化，重新加载: {', '.join(changed)}")
+                result = await asyncio.to_thread(self.callback)
+                if self.apply is not None and result is not None:
+                    result = self.apply(result)
+                if result:
+                    self.reloads += 1
+                else:
+                    self.failures += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                print(f"❌ 重新加载配置失败: {e}")
+
+    async def stop(self):
+        """停止监视任务"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -1,38 +1,44 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import os
 from message_forwarder import MessageForwarder
-from steam_monitor import SteamMonitor
+from settings import get_settings
+from steam_monitor import get_steam_monitor
 
-def create_discord_bot(token, config=None):
+def create_discord_bot(token, settings=None):
     """创建Discord机器人实例"""
+    settings = settings or get_settings()
     # 创建机器人实例，设置命令前缀和权限
     intents = discord.Intents.default()
     intents.message_content = True  # 启用消息内容权限
     bot = commands.Bot(command_prefix='/', intents=intents)
     
     # 检查是否启用Steam监控
-    enable_steam = os.getenv('ENABLE_STEAM_MONITOR', 'true').lower() == 'true'
-    if enable_steam:
-        # 获取Steam检查间隔
-        steam_interval = int(os.getenv('STEAM_CHECK_INTERVAL', '30'))
+    if settings.enable_steam_monitor:
         # 初始化Steam监控
-        bot.steam_monitor = SteamMonitor({"interval_minutes": steam_interval})
+        bot.steam_monitor = get_steam_monitor({
+            "interval_minutes": settings.steam_check_interval,
+            "price_concurrency": settings.steam_price_concurrency,
+            "app_list_refresh_hours": settings.steam_app_list_refresh_hours,
+            "api_key": settings.steam_api_key
+        })
     else:
         bot.steam_monitor = None
     
     return bot
 
-def setup_discord_bot(bot, token, kook_bot=None):
+def setup_discord_bot(bot, token, kook_bot=None, settings=None):
     """设置Discord机器人的事件和命令"""
+    settings = settings or get_settings()
     
     # 初始化消息转发器
     forwarder = None
-    enable_hello_reply = os.getenv('DISCORD_HELLO_REPLY_ENABLED', 'true').lower() == 'true'
+    enable_hello_reply = settings.discord_hello_reply
     if kook_bot:
-        forwarder = MessageForwarder(kook_bot)
+        forwarder = MessageForwarder(kook_bot, settings)
         print("✅ 消息转发器已初始化")
+    # 供关闭时落盘发件箱等状态
+    bot.forwarder = forwarder
     
     # 当机器人准备就绪时触发
     @bot.event
@@ -47,10 +53,11 @@ def setup_discord_bot(bot, token, kook_bot=None):
             for cmd in synced:
                 print(f'  /{cmd.name} - {cmd.description}')
             print('------')
-            # 启动定期清理任务
             if forwarder:
-                bot.loop.create_task(forwarder._run_periodic_cleanup())
-                print('📤 定期清理任务已启动')
+                # 启动发件箱，补发上次未送达的消息
+                forwarder.start_outbox()
+                # 监视配置文件，转发规则修改后无需重启
+                forwarder.start_config_watcher()
             
             # 初始化Steam监控（如果启用）
             if bot.steam_monitor:
@@ -181,12 +188,12 @@ def setup_discord_bot(bot, token, kook_bot=None):
             await bot.process_commands(message)
             return
         
-        # 尝试转发消息到KOOK
+        # 将消息加入KOOK频道转发队列（按频道有序、异步转发，不阻塞事件处理）
         if forwarder:
             try:
-                success = await forwarder.forward_message(message)
-                if success:
-                    print(f"📤 消息已转发: {message.content[:30]}...")
+                queued = await forwarder.enqueue_message(message)
+                if queued:
+                    print(f"📤 消息已加入转发队列: {message.content[:30]}... ({forwarder.queue.get_stats()['pending']} 条待转发)")
             except Exception as e:
                 print(f"❌ 转发消息时出错: {e}")
         
@@ -316,10 +323,7 @@ def setup_discord_bot(bot, token, kook_bot=None):
 
 if __name__ == '__main__':
     # 从环境变量获取token，或者直接在这里填入你的机器人token
-    from dotenv import load_dotenv
-    load_dotenv()
-    
-    TOKEN = os.getenv('DISCORD_BOT_TOKEN')
+    TOKEN = get_settings().discord_token
     
     if TOKEN is None:
         print('错误: 请设置DISCORD_BOT_TOKEN环境变量或在代码中直接填入token')
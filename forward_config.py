@@ -1,77 +1,160 @@
-import os
-from dotenv import load_dotenv
-from typing import Dict, List, Tuple
+from dataclasses import replace
+from typing import Iterable, List, Optional, Tuple
+from forward_rules import ForwardRuleTable, parse_rules_text, load_rules_file
+from settings import Settings, get_settings, read_settings, reload_settings
+
+# 启动时用来创建队列、数据库等资源的配置，修改后需要重启才生效，重新加载时保持不变
+RESTART_REQUIRED = (
+    'forward_workers', 'forward_queue_size', 'outbox_path', 'media_cache_path',
+    'attachment_concurrency', 'attachment_workers', 'config_watch_interval'
+)
 
 class ForwardConfig:
     """转发配置管理类"""
     
-    def __init__(self):
-        load_dotenv()
-        self.forward_rules = self._parse_forward_rules()
-        self.forward_bot_messages = os.getenv('FORWARD_BOT_MESSAGES', 'false').lower() == 'true'
-        self.message_prefix = os.getenv('MESSAGE_PREFIX', '[Discord]')
+    def __init__(self, settings: Optional[Settings] = None):
+        """
+        初始化转发配置
+        
+        Args:
+            settings: 机器人配置，为空时使用全局共享的配置
+        """
+        self._apply(settings or get_settings())
     
-    def _parse_forward_rules(self) -> Dict[str, str]:
-        """解析转发规则
+    def _apply(self, settings: Settings, forward_rules: Optional[ForwardRuleTable] = None):
+        """把配置快照展开为属性（消息处理路径只读取属性，不再读取环境变量）"""
+        self.settings = settings
+        self.forward_bot_messages = settings.forward_bot_messages
+        # 带过滤条件的转发规则文件（JSON），与FORWARD_RULES合并
+        self.forward_rules_file = settings.forward_rules_file
+        self.forward_rules = forward_rules if forward_rules is not None else self._parse_forward_rules(settings)
+        self.message_prefix = settings.message_prefix
+        # 转发队列配置：全局并发转发数、单个KOOK频道队列长度上限
+        self.forward_workers = settings.forward_workers
+        self.forward_queue_size = settings.forward_queue_size
+        # 发件箱配置：数据库路径、重试间隔（秒）、消息最长保留时间（小时）
+        self.outbox_path = settings.outbox_path
+        self.outbox_retry_interval = settings.outbox_retry_interval
+        self.outbox_max_age_hours = settings.outbox_max_age_hours
+        # 附件内存缓冲上限（字节），超过时落盘
+        self.media_memory_limit = settings.media_memory_limit
+        # 媒体去重缓存路径
+        self.media_cache_path = settings.media_cache_path
+        # 附件并发配置：单条消息内、全局同时下载上传的附件数
+        self.attachment_concurrency = settings.attachment_concurrency
+        self.attachment_workers = settings.attachment_workers
+        # 相册模式：同一条消息中的多张图片合并为一条图片组卡片消息
+        self.album_mode = settings.album_mode
+        # 配置热加载：检查.env和规则文件变化的间隔（秒），0表示不监视
+        self.config_watch_interval = settings.config_watch_interval
+    
+    def _parse_forward_rules(self, settings: Settings, strict: bool = False) -> ForwardRuleTable:
+        """解析转发规则并编译为规则表
+        
+        Args:
+            settings: 机器人配置（规则文本、规则文件路径、是否转发机器人消息）
+            strict: 解析失败时抛出异常（重新加载时使用，避免用不完整的规则替换当前规则）
         
         Returns:
-            Dict[str, str]: Discord频道ID -> KOOK频道ID的映射
+            ForwardRuleTable: 编译后的转发规则表
         """
-        rules_str = os.getenv('FORWARD_RULES', '')
-        rules = {}
-        
-        if not rules_str.strip():
-            return rules
+        rules_str = settings.forward_rules
+        rules_file = settings.forward_rules_file
+        rules = []
         
         try:
-            # 解析格式: discord_id1:kook_id1,discord_id2:kook_id2
-            pairs = rules_str.split(',')
-            for pair in pairs:
-                if ':' in pair:
-                    discord_id, kook_id = pair.strip().split(':', 1)
-                    rules[discord_id.strip()] = kook_id.strip()
+            # 解析格式: discord_id1:kook_id1,discord_id2:kook_id2|kook_id3,guild:guild_id:kook_id4
+            rules.extend(parse_rules_text(rules_str))
         except Exception as e:
+            if strict:
+                raise ValueError(f"解析转发规则失败: {e}") from e
             print(f"解析转发规则失败: {e}")
             print(f"规则格式应为: discord_id1:kook_id1,discord_id2:kook_id2")
         
-        return rules
+        try:
+            rules.extend(load_rules_file(rules_file))
+        except Exception as e:
+            if strict:
+                raise ValueError(f"加载转发规则文件 {rules_file} 失败: {e}") from e
+            print(f"加载转发规则文件 {rules_file} 失败: {e}")
+        
+        return ForwardRuleTable(rules, forward_bots=settings.forward_bot_messages)
     
-    def get_kook_channel_id(self, discord_channel_id: str) -> str:
-        """根据Discord频道ID获取对应的KOOK频道ID
+    def get_kook_channel_ids(self, discord_channel_id: str, guild_id: Optional[str] = None,
+                             author_id: Optional[str] = None, role_ids: Iterable[str] = (),
+                             is_bot: bool = False, content: str = "") -> List[str]:
+        """根据消息来源和内容获取需要转发到的KOOK频道ID
         
         Args:
             discord_channel_id: Discord频道ID
+            guild_id: Discord服务器ID
+            author_id: 发送者ID
+            role_ids: 发送者的身份组ID
+            is_bot: 消息是否来自机器人
+            content: 消息内容
             
         Returns:
-            str: 对应的KOOK频道ID，如果没有配置则返回None
+            List[str]: 对应的KOOK频道ID列表，不需要转发时为空
         """
-        return self.forward_rules.get(str(discord_channel_id))
+        return self.forward_rules.route(discord_channel_id, guild_id, author_id, role_ids, is_bot, content)
     
-    def should_forward_message(self, is_bot: bool) -> bool:
-        """判断是否应该转发消息
+    def get_forward_channels(self) -> List[Tuple[str, str]]:
+        """获取所有转发规则
         
-        Args:
-            is_bot: 消息是否来自机器人
-            
         Returns:
-            bool: 是否应该转发
+            List[Tuple[str, str]]: (来源描述, KOOK频道ID)的列表
         """
-        if is_bot and not self.forward_bot_messages:
-            return False
-        return True
+        return self.forward_rules.get_forward_channels()
     
-    def get_forward_channels(self) -> List[Tuple[str, str]]:
-        """获取所有转发规则
+    def load_snapshot(self) -> Optional[Tuple[Settings, ForwardRuleTable]]:
+        """读取并校验配置，返回新的（配置，转发规则表）快照，不修改当前配置
+        
+        读取文件和编译规则较慢，可以在线程中调用（不修改进程环境变量）；
+        得到的快照交给 apply_snapshot 在事件循环中应用。
         
         Returns:
-            List[Tuple[str, str]]: (Discord频道ID, KOOK频道ID)的列表
+            Optional[Tuple[Settings, ForwardRuleTable]]: 配置快照，校验失败时返回None（保留当前配置）
         """
-        return list(self.forward_rules.items())
+        try:
+            settings = read_settings()
+            forward_rules = self._parse_forward_rules(settings, strict=True)
+        except Exception as e:
+            print(f"❌ 配置校验失败，继续使用当前配置: {e}")
+            return None
+        
+        # 启动时确定的资源配置保持不变，修改了的给出提示
+        current = self.settings
+        changed = [name.upper() for name in RESTART_REQUIRED if getattr(settings, name) != getattr(current, name)]
+        if changed:
+            print(f"⚠️ {', '.join(changed)} 不支持热加载，需要重启后生效")
+        if settings.outbox_retry_interval != current.outbox_retry_interval:
+            print("ℹ️ OUTBOX_RETRY_INTERVAL 将在本次发件箱重试等待结束后生效")
+        settings = replace(settings, **{name: getattr(current, name) for name in RESTART_REQUIRED})
+        return settings, forward_rules
     
-    def reload_config(self):
-        """重新加载配置"""
-        load_dotenv(override=True)
-        self.forward_rules = self._parse_forward_rules()
-        self.forward_bot_messages = os.getenv('FORWARD_BOT_MESSAGES', 'false').lower() == 'true'
-        self.message_prefix = os.getenv('MESSAGE_PREFIX', '[Discord]')
-        print(f"配置已重新加载，转发规则数量: {len(self.forward_rules)}")
\ No newline at end of file
+    def apply_snapshot(self, snapshot: Tuple[Settings, ForwardRuleTable]) -> bool:
+        """应用 load_snapshot 返回的配置快照，并通过 reload_settings 把新配置推送给其他组件
+        
+        需要在事件循环中调用：展开属性的过程中没有await，正在路由的消息不会看到
+        新的转发规则和旧的消息前缀这类只更新了一半的配置。
+        
+        Returns:
+            bool: 是否应用成功
+        """
+        settings, forward_rules = snapshot
+        self._apply(settings, forward_rules)
+        reload_settings(settings)
+        print(f"配置已重新加载，转发规则数量: {len(self.forward_rules)}")
+        return True
+    
+    def reload_config(self) -> bool:
+        """重新加载配置（读取、校验并立即应用，供同步调用方使用）
+        
+        先在局部变量中解析并校验全部配置，成功后再替换。转发规则表是编译好的不可变快照，
+        正在路由的消息继续使用旧规则表，之后的消息使用新规则表。校验失败时保留当前配置。
+        
+        Returns:
+            bool: 是否重新加载成功
+        """
+        snapshot = self.load_snapshot()
+        return snapshot is not None and self.apply_snapshot(snapshot)
@@ -0,0 +1,128 @@
+import asyncio
+import contextlib
+import itertools
+from typing import Awaitable, Callable, Dict
+
+
+class ForwardQueue:
+    """按KOOK目标频道划分的有序转发队列
+
+    每个目标频道一个FIFO队列和一个消费协程，保证同一频道内消息顺序；
+    全局信号量限制同时执行的转发任务数，不同频道之间并行推进。
+    从发件箱重放的任务以 front=True 提交，排在该频道所有新提交的任务之前。
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue_size: int = 100, idle_timeout: int = 60):
+        """
+        初始化转发队列
+
+        Args:
+            max_workers: 全局同时执行的转发任务数上限
+            max_queue_size: 单个频道队列的最大长度，队列满时提交方等待（背压）
+            idle_timeout: 频道队列空闲多久后回收消费协程，单位为秒
+        """
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.idle_timeout = idle_timeout
+        self._queues: Dict[str, asyncio.PriorityQueue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(max_workers)
+        # 同一优先级内按提交顺序执行
+        self._sequence = itertools.count()
+
+        # 统计信息
+        self.submitted = 0
+        self.processed = 0
+        self.failed = 0
+
+    async def submit(self, channel_id: str, job: Callable[[], Awaitable], front: bool = False):
+        """提交一个转发任务到目标频道的队列
+
+        Args:
+            channel_id: KOOK目标频道ID
+            job: 无参协程函数，执行实际的转发
+            front: 是否排在该频道所有普通任务之前（用于重放更早的消息）
+        """
+        queue = self._queues.get(channel_id)
+        if queue is None:
+            queue = asyncio.PriorityQueue(maxsize=self.max_queue_size)
+            self._queues[channel_id] = queue
+
+        if queue.full():
+            print(f"⚠️ KOOK频道 {channel_id} 的转发队列已满 ({queue.qsize()})，等待队列空出")
+        await queue.put((0 if front else 1, next(self._sequence), job))
+        self.submitted += 1
+
+        worker = self._workers.get(channel_id)
+        if worker is None or worker.done():
+            self._workers[channel_id] = asyncio.create_task(self._worker(channel_id, queue))
+
+    async def _worker(self, channel_id: str, queue: asyncio.PriorityQueue):
+        """逐个消费某个频道队列中的任务"""
+        while True:
+            try:
+                _, _, job = await asyncio.wait_for(queue.get(), timeout=self.idle_timeout)
+            except asyncio.TimeoutError:
+                if queue.empty():
+                    # 空闲回收，下次提交时重新创建
+                    self._workers.pop(channel_id, None)
+                    self._queues.pop(channel_id, None)
+                    return
+                continue
+
+            try:
+                async with self._semaphore:
+                    await job()
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ KOOK频道 {channel_id} 的转发任务失败: {e}")
+            finally:
+                queue.task_done()
+
+    @contextlib.asynccontextmanager
+    async def pause(self):
+        """在任务内部等待（如退避重试）期间让出全局并发名额
+
+        任务仍占着自己频道的消费协程，该频道后面的任务继续等待，其他频道可以使用让出的名额。
+        只能在队列执行的任务中使用。
+        """
+        self._semaphore.release()
+        try:
+            yield
+        finally:
+            # 被取消时也要重新拿回名额，与消费协程退出时的释放配对
+            await asyncio.shield(self._semaphore.acquire())
+
+    def get_queue_depths(self) -> Dict[str, int]:
+        """获取各频道队列中等待的任务数
+
+        Returns:
+            Dict[str, int]: KOOK频道ID -> 队列深度
+        """
+        return {channel_id: queue.qsize() for channel_id, queue in self._queues.items()}
+
+    def get_stats(self) -> dict:
+        """获取队列统计信息"""
+        depths = self.get_queue_depths()
+        return {
+            "channels": len(depths),
+            "pending": sum(depths.values()),
+            "max_depth": max(depths.values(), default=0),
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "failed": self.failed
+        }
+
+    async def join(self):
+        """等待所有队列中的任务处理完成"""
+        for queue in list(self._queues.values()):
+            await queue.join()
+
+    async def close(self):
+        """停止所有消费协程（未处理的任务将被丢弃）"""
+        for worker in list(self._workers.values()):
+            worker.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
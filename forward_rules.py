@@ -0,0 +1,211 @@
+import json
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# 匹配任意频道的通配符
+WILDCARD = "*"
+
+
+class ForwardRule:
+    """一条转发规则：来源（频道 / 服务器 / 任意）-> 一个或多个KOOK频道，附带过滤条件
+
+    过滤条件在构造时编译：ID列表转为集合，正则表达式预先编译，匹配时只做集合查询和一次正则搜索。
+    """
+
+    __slots__ = (
+        "channel", "guild", "targets", "include_bots", "authors", "exclude_authors",
+        "roles", "exclude_roles", "pattern", "exclude_pattern", "fallback"
+    )
+
+    def __init__(self, targets: Iterable[str], channel: str = WILDCARD, guild: Optional[str] = None,
+                 include_bots: Optional[bool] = None, authors: Iterable[str] = (), exclude_authors: Iterable[str] = (),
+                 roles: Iterable[str] = (), exclude_roles: Iterable[str] = (), pattern: Optional[str] = None,
+                 exclude_pattern: Optional[str] = None, fallback: bool = False):
+        """
+        初始化转发规则
+
+        Args:
+            targets: 目标KOOK频道ID列表
+            channel: 来源Discord频道ID，"*" 表示任意频道
+            guild: 来源Discord服务器ID，与 channel="*" 组合表示该服务器的所有频道
+            include_bots: 是否转发机器人消息，None表示使用全局配置
+            authors: 只转发这些用户的消息（为空不限制）
+            exclude_authors: 不转发这些用户的消息
+            roles: 只转发拥有其中任一身份组的用户的消息（为空不限制）
+            exclude_roles: 不转发拥有其中任一身份组的用户的消息
+            pattern: 只转发内容匹配该正则的消息
+            exclude_pattern: 不转发内容匹配该正则的消息
+            fallback: 兜底规则，只在没有其他规则匹配时生效
+        """
+        self.channel = str(channel)
+        self.guild = str(guild) if guild else None
+        self.targets = tuple(dict.fromkeys(str(target) for target in targets if target))
+        self.include_bots = include_bots
+        self.authors = frozenset(str(author) for author in authors)
+        self.exclude_authors = frozenset(str(author) for author in exclude_authors)
+        self.roles = frozenset(str(role) for role in roles)
+        self.exclude_roles = frozenset(str(role) for role in exclude_roles)
+        self.pattern = re.compile(pattern) if pattern else None
+        self.exclude_pattern = re.compile(exclude_pattern) if exclude_pattern else None
+        self.fallback = fallback
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ForwardRule":
+        """从配置字典创建规则（规则文件中的一项）"""
+        targets = data.get("targets", data.get("target", []))
+        if isinstance(targets, str):
+            targets = [targets]
+        return cls(
+            targets=targets,
+            channel=data.get("channel", WILDCARD),
+            guild=data.get("guild"),
+            include_bots=data.get("include_bots"),
+            authors=data.get("authors", ()),
+            exclude_authors=data.get("exclude_authors", ()),
+            roles=data.get("roles", ()),
+            exclude_roles=data.get("exclude_roles", ()),
+            pattern=data.get("pattern"),
+            exclude_pattern=data.get("exclude_pattern"),
+            fallback=data.get("fallback", False)
+        )
+
+    def matches(self, author_id: Optional[str], role_ids: frozenset, is_bot: bool, content: str,
+                forward_bots: bool) -> bool:
+        """判断消息是否满足本规则的过滤条件（来源已由规则表匹配）"""
+        if is_bot and not (forward_bots if self.include_bots is None else self.include_bots):
+            return False
+        if self.authors and author_id not in self.authors:
+            return False
+        if author_id in self.exclude_authors:
+            return False
+        if self.roles and self.roles.isdisjoint(role_ids):
+            return False
+        if self.exclude_roles and not self.exclude_roles.isdisjoint(role_ids):
+            return False
+        if self.pattern is not None and not self.pattern.search(content or ""):
+            return False
+        if self.exclude_pattern is not None and self.exclude_pattern.search(content or ""):
+            return False
+        return True
+
+    def describe(self) -> str:
+        """规则来源的可读描述"""
+        if self.channel != WILDCARD:
+            return f"Discord频道 {self.channel}"
+        if self.guild:
+            return f"Discord服务器 {self.guild} 的所有频道"
+        return "所有Discord频道"
+
+
+class ForwardRuleTable:
+    """编译后的转发规则表
+
+    规则按来源分到 频道ID -> 规则、服务器ID -> 规则 两张哈希表和一个通配列表中，
+    每条消息只查两次字典，与规则总数无关。匹配的所有规则的目标合并去重（一对多转发）；
+    兜底规则只在没有普通规则匹配时生效。规则表编译完成后不再修改，重新加载配置时整体替换。
+    """
+
+    def __init__(self, rules: Iterable[ForwardRule] = (), forward_bots: bool = False):
+        """
+        编译规则表
+
+        Args:
+            rules: 转发规则
+            forward_bots: 规则未指定 include_bots 时是否转发机器人消息
+        """
+        self.forward_bots = forward_bots
+        self.rules: List[ForwardRule] = []
+        self._by_channel: Dict[str, List[ForwardRule]] = {}
+        self._by_guild: Dict[str, List[ForwardRule]] = {}
+        self._global: List[ForwardRule] = []
+        for rule in rules:
+            self._add(rule)
+
+    def _add(self, rule: ForwardRule):
+        if not rule.targets:
+            return
+        self.rules.append(rule)
+        if rule.channel != WILDCARD:
+            self._by_channel.setdefault(rule.channel, []).append(rule)
+        elif rule.guild:
+            self._by_guild.setdefault(rule.guild, []).append(rule)
+        else:
+            self._global.append(rule)
+
+    def route(self, channel_id, guild_id=None, author_id=None, role_ids: Iterable = (), is_bot: bool = False,
+              content: str = "") -> List[str]:
+        """计算消息需要转发到的KOOK频道
+
+        Args:
+            channel_id: Discord频道ID
+            guild_id: Discord服务器ID
+            author_id: 发送者ID
+            role_ids: 发送者的身份组ID
+            is_bot: 是否为机器人消息
+            content: 消息内容（用于正则过滤）
+
+        Returns:
+            List[str]: 目标KOOK频道ID列表（按规则顺序去重），不需要转发时为空
+        """
+        candidates = self._by_channel.get(str(channel_id), [])
+        if guild_id is not None:
+            candidates = candidates + self._by_guild.get(str(guild_id), [])
+        if self._global:
+            candidates = candidates + self._global
+        if not candidates:
+            return []
+
+        author_id = str(author_id) if author_id is not None else None
+        role_ids = frozenset(str(role) for role in role_ids)
+        targets: Dict[str, None] = {}
+        fallback_targets: Dict[str, None] = {}
+        for rule in candidates:
+            if rule.matches(author_id, role_ids, is_bot, content, self.forward_bots):
+                bucket = fallback_targets if rule.fallback else targets
+                for target in rule.targets:
+                    bucket[target] = None
+        return list(targets or fallback_targets)
+
+    def get_forward_channels(self) -> List[tuple]:
+        """获取所有规则的 (来源描述, 目标KOOK频道) 列表"""
+        return [(rule.describe(), ", ".join(rule.targets)) for rule in self.rules]
+
+    def __len__(self):
+        return len(self.rules)
+
+
+def parse_rules_text(rules_str: str) -> List[ForwardRule]:
+    """解析环境变量格式的转发规则
+
+    格式: discord_id:kook_id,discord_id:kook_id1|kook_id2,guild:服务器ID:kook_id,*:kook_id
+    同一来源可以写多次或用 | 分隔多个KOOK频道（一对多转发）；
+    guild:服务器ID 表示该服务器的所有频道，* 表示所有频道。
+    """
+    rules = []
+    for pair in rules_str.split(','):
+        pair = pair.strip()
+        if ':' not in pair:
+            continue
+        guild = None
+        if pair.startswith('guild:'):
+            guild, kook_ids = pair[len('guild:'):].split(':', 1)
+            source = WILDCARD
+        else:
+            source, kook_ids = pair.split(':', 1)
+        rules.append(ForwardRule(
+            targets=[kook_id.strip() for kook_id in kook_ids.split('|')],
+            channel=source.strip() or WILDCARD,
+            guild=guild.strip() if guild else None
+        ))
+    return rules
+
+
+def load_rules_file(path) -> List[ForwardRule]:
+    """从JSON规则文件加载转发规则（规则对象数组，字段见 ForwardRule.from_dict）"""
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return [ForwardRule.from_dict(item) for item in data]
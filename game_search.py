@@ -0,0 +1,258 @@
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from rapidfuzz import process, fuzz
+
+# 规范化时去掉的字符（标点、符号）
+_PUNCT_RE = re.compile(r"[^\w\s]+", re.UNICODE)
+_SPACE_RE = re.compile(r"\s+")
+# 批量规范化时保留换行（游戏名之间的分隔符）
+_INLINE_SPACE_RE = re.compile(r"[^\S\n]+")
+
+
+def normalize_name(name: str) -> str:
+    """规范化游戏名：全角转半角、转小写、去掉标点和多余空白"""
+    name = unicodedata.normalize("NFKC", str(name)).lower()
+    name = _PUNCT_RE.sub(" ", name)
+    return _SPACE_RE.sub(" ", name).strip()
+
+
+def normalize_names(names: Sequence[str]) -> List[str]:
+    """批量规范化游戏名，结果与逐个调用 normalize_name 相同
+
+    把所有游戏名用换行拼接后整体做一次 Unicode 规范化和正则替换，
+    比逐个调用快得多；游戏名本身含有换行时退回逐个处理。
+    """
+    joined = "\n".join(map(str, names))
+    if joined.count("\n") != max(len(names) - 1, 0):
+        return [normalize_name(name) for name in names]
+    joined = unicodedata.normalize("NFKC", joined).lower()
+    joined = _INLINE_SPACE_RE.sub(" ", _PUNCT_RE.sub(" ", joined))
+    return [line.strip() for line in joined.split("\n")] if names else []
+
+
+def _trigrams(normalized: str) -> set:
+    padded = f" {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _PackedIndex:
+    """只读的 字符串 -> 整数列表 倒排表
+
+    键按UTF-8字节排序后拼接成一个 bytes，所有倒排表拼接成一个 array，用偏移量定位，
+    不为每个键、每个倒排表单独创建 Python 对象；按键查找和按前缀查找都是二分查找。
+    """
+
+    def __init__(self, table: Dict[str, List[int]]):
+        encoded = sorted((key.encode('utf-8'), key) for key in table)
+        blob = bytearray()
+        key_offsets = array('I', [0])
+        values = array('I')
+        value_offsets = array('I', [0])
+        for key_bytes, key in encoded:
+            blob += key_bytes
+            key_offsets.append(len(blob))
+            values.extend(table[key])
+            value_offsets.append(len(values))
+        self._blob = bytes(blob)
+        self._key_offsets = key_offsets
+        self._values = values
+        self._value_offsets = value_offsets
+
+    def __len__(self):
+        return len(self._key_offsets) - 1
+
+    def _key_bytes(self, index: int) -> bytes:
+        return self._blob[self._key_offsets[index]:self._key_offsets[index + 1]]
+
+    def key(self, index: int) -> str:
+        return self._key_bytes(index).decode('utf-8')
+
+    def find(self, key: str) -> int:
+        """返回键的下标，不存在时返回-1"""
+        key_bytes = key.encode('utf-8')
+        index = bisect_left(range(len(self)), key_bytes, key=self._key_bytes)
+        if index < len(self) and self._key_bytes(index) == key_bytes:
+            return index
+        return -1
+
+    def prefixed(self, prefix: str) -> range:
+        """以 prefix 开头的键的下标范围"""
+        prefix_bytes = prefix.encode('utf-8')
+        start = bisect_left(range(len(self)), prefix_bytes, key=self._key_bytes)
+        end = start
+        while end < len(self) and self._key_bytes(end).startswith(prefix_bytes):
+            end += 1
+        return range(start, end)
+
+    def count(self, index: int) -> int:
+        return self._value_offsets[index + 1] - self._value_offsets[index]
+
+    def values(self, index: int) -> array:
+        return self._values[self._value_offsets[index]:self._value_offsets[index + 1]]
+
+    def memory_usage(self) -> int:
+        return (len(self._blob) + sum(values.itemsize * len(values) for values in
+                                      (self._key_offsets, self._values, self._value_offsets)))
+
+
+class GameNameIndex:
+    """游戏名模糊搜索索引
+
+    全量Steam游戏名（十几万条）建一次 词 -> 游戏 的倒排索引，游戏名本身直接引用传入的序列
+    （如 SteamCatalog），不另存一份。查询时用倒排索引筛出少量候选，只对候选调用 rapidfuzz 打分，
+    不再扫描全部游戏名；规范化后与输入完全一致的游戏优先返回。
+    常见词（如 the、edition）对应的游戏过多，筛选时跳过，只在没有其他词时使用。
+
+    拼写错误或只输入了部分单词时，用 三字母组 -> 词 的索引找出相近的词（只对词表建索引，
+    比对每个游戏名建三字母组索引小一个数量级），再用这些词的倒排表代替。
+    两个索引都用 _PackedIndex 紧凑存储。
+    """
+
+    def __init__(self, names: Sequence[str] = (), max_postings: int = 5000, max_candidates: int = 500,
+                 max_similar_tokens: int = 20):
+        """
+        初始化搜索索引
+
+        Args:
+            names: 游戏名序列（按下标引用，不复制）
+            max_postings: 对应游戏数超过该值的词视为常见词，筛选候选时跳过
+            max_candidates: 交给 rapidfuzz 打分的最大候选数
+            max_similar_tokens: 输入的词不在词表中时，最多用多少个相近的词代替
+        """
+        self.max_postings = max_postings
+        self.max_candidates = max_candidates
+        self.max_similar_tokens = max_similar_tokens
+        self._names = names
+        tokens: Dict[str, List[int]] = {}
+        for name_id, normalized in enumerate(normalize_names(names)):
+            for token in set(normalized.split()):
+                tokens.setdefault(token, []).append(name_id)
+        self._tokens = _PackedIndex(tokens)
+        del tokens
+
+        trigrams: Dict[str, List[int]] = {}
+        for token_id in range(len(self._tokens)):
+            for trigram in _trigrams(self._tokens.key(token_id)):
+                trigrams.setdefault(trigram, []).append(token_id)
+        self._trigrams = _PackedIndex(trigrams)
+
+        # 建好索引后补充的游戏名及其词
+        self._added: List[str] = []
+        self._added_tokens: Dict[str, List[int]] = {}
+
+    def _name(self, name_id: int) -> str:
+        base = len(self._names)
+        return self._names[name_id] if name_id < base else self._added[name_id - base]
+
+    def add(self, name: str):
+        """添加一个游戏名（如运行中从商店API查到的新游戏）"""
+        if not name:
+            return
+        name_id = len(self._names) + len(self._added)
+        self._added.append(name)
+        for token in set(normalize_name(name).split()):
+            self._added_tokens.setdefault(token, []).append(name_id)
+
+    def __len__(self):
+        return len(self._names) + len(self._added)
+
+    def memory_usage(self) -> int:
+        """索引占用的内存（字节，不含游戏名本身和运行中补充的游戏）"""
+        return self._tokens.memory_usage() + self._trigrams.memory_usage()
+
+    def _postings(self, token: str) -> Optional[Sequence[int]]:
+        """词对应的游戏，词不在词表中时返回None"""
+        token_id = self._tokens.find(token)
+        added = self._added_tokens.get(token)
+        if token_id < 0:
+            return added
+        ids = self._tokens.values(token_id)
+        return ids + array('I', added) if added else ids
+
+    def _similar_tokens(self, token: str) -> List[str]:
+        """词表中与输入的词相近的词：以它为前缀的词，以及三字母组重合一半以上的词"""
+        similar = [self._tokens.key(token_id) for token_id in self._tokens.prefixed(token)[:self.max_similar_tokens]]
+
+        keys = _trigrams(token)
+        postings = [self._trigrams.values(index) for index in map(self._trigrams.find, keys) if index >= 0]
+        threshold = max(2, len(keys) // 2)
+        hits = Counter()
+        for ids in postings:
+            hits.update(ids)
+        for token_id, count in hits.most_common(self.max_similar_tokens):
+            if count < threshold:
+                break
+            similar.append(self._tokens.key(token_id))
+
+        # 运行中补充的词不多，直接比较
+        similar.extend(
+            added for added in self._added_tokens
+            if added.startswith(token) or len(keys & _trigrams(added)) >= threshold
+        )
+        return similar
+
+    def candidates(self, normalized_query: str) -> List[int]:
+        """用倒排索引筛选候选游戏"""
+        postings = []
+        for token in set(normalized_query.split()):
+            ids = self._postings(token)
+            if ids is None:
+                # 拼写错误或只输入了部分单词：用相近的词的游戏代替
+                merged = set()
+                for similar in self._similar_tokens(token):
+                    merged.update(self._postings(similar) or ())
+                ids = list(merged)
+            if ids:
+                postings.append(ids)
+
+        # 跳过常见词，全部是常见词时只取同时包含所有词的游戏
+        used = [ids for ids in postings if len(ids) <= self.max_postings]
+        hits = Counter()
+        if used:
+            for ids in used:
+                hits.update(ids)
+        elif postings:
+            postings.sort(key=len)
+            common = set(postings[0]).intersection(*postings[1:])
+            hits.update(list(common)[:self.max_candidates])
+        if len(hits) > self.max_candidates:
+            return [name_id for name_id, _ in hits.most_common(self.max_candidates)]
+        return list(hits)
+
+    def search(self, query: str, scorer=fuzz.token_set_ratio, limit: int = 1,
+               score_cutoff: float = 0) -> List[Tuple[str, float]]:
+        """
+        模糊搜索游戏名（CPU密集，应在线程中调用）
+
+        Args:
+            query: 用户输入的游戏名
+            scorer: rapidfuzz 打分函数
+            limit: 最多返回的结果数
+            score_cutoff: 最低匹配分数
+
+        Returns:
+            List[Tuple[str, float]]: (游戏名, 匹配分数)，按分数从高到低排列
+        """
+        normalized = normalize_name(query)
+        if not normalized:
+            return []
+
+        choices = {name_id: normalize_name(self._name(name_id)) for name_id in self.candidates(normalized)}
+        exact = [name_id for name_id, choice in choices.items() if choice == normalized]
+        if exact and limit == 1:
+            return [(self._name(exact[0]), 100.0)]
+
+        matches = process.extract(normalized, choices, scorer=scorer, processor=None,
+                                  limit=limit, score_cutoff=score_cutoff)
+        return [(self._name(name_id), score) for _, score, name_id in matches]
+
+    def search_one(self, query: str, scorer=fuzz.token_set_ratio,
+                   score_cutoff: float = 0) -> Optional[Tuple[str, float]]:
+        """返回最匹配的一个游戏名和分数，没有满足条件的结果时返回None"""
+        matches = self.search(query, scorer=scorer, limit=1, score_cutoff=score_cutoff)
+        return matches[0] if matches else None
@@ -1,23 +1,28 @@
 import asyncio
 import json
-import aiohttp
+import zlib
 from khl import Bot, Message, Event, EventTypes
 from khl.card import CardMessage, Card, Module, Element, Types, Struct
 from khl.command import Command
-import os
-from steam_monitor import SteamMonitor
+from kook_api_client import get_kook_api_client
+from kook_channel_cache import KookChannelCache
+from settings import get_settings
+from steam_monitor import get_steam_monitor
 
-def create_kook_bot(token, config=None):
+def create_kook_bot(token, settings=None):
     """创建KOOK机器人实例"""
+    settings = settings or get_settings()
     # 创建机器人实例
     bot = Bot(token=token)
     
-    # 检查是否启用Steam监控
-    enable_steam_monitor = os.getenv("ENABLE_STEAM_MONITOR", "true").lower() == "true"
-    
     # 初始化Steam监控（如果启用）
-    if enable_steam_monitor:
-        bot.steam_monitor = SteamMonitor({})
+    if settings.enable_steam_monitor:
+        bot.steam_monitor = get_steam_monitor({
+            "interval_minutes": settings.steam_check_interval,
+            "price_concurrency": settings.steam_price_concurrency,
+            "app_list_refresh_hours": settings.steam_app_list_refresh_hours,
+            "api_key": settings.steam_api_key
+        })
         print("Steam游戏价格监控已启用")
     else:
         bot.steam_monitor = None
@@ -26,10 +31,92 @@ def create_kook_bot(token, config=None):
     # 直接输出KOOK机器人信息
     print("KOOK机器人已创建，准备设置命令...")
     
-    return setup_kook_bot(bot)
+    return setup_kook_bot(bot, settings)
+
+def watch_kook_ready(bot):
+    """KOOK连接就绪时设置 bot.kook_ready
+    
+    通过 khl 公开的启动事件（on_startup）在机器人启动后调用 client.fetch_me()，
+    请求成功说明Token有效、KOOK API可用（转发消息只依赖API），此时视为就绪；
+    请求失败时退避重试，检查任务保存在 bot.kook_ready_check，放弃等待时可以取消。
+    旧版本 khl 没有 fetch_me 时，才退回到包装 websocket 接收器的私有方法，在收到HELLO包时就绪。
+    """
+    bot.kook_ready = asyncio.Event()
+    bot.kook_ready_check = None
+    
+    if hasattr(bot.client, 'fetch_me'):
+        async def check_ready():
+            delay = 1
+            while True:
+                try:
+                    me = await bot.client.fetch_me(force_update=True)
+                    print(f'✅ KOOK连接已就绪: {getattr(me, "username", "")}')
+                    bot.kook_ready.set()
+                    return
+                except Exception as e:
+                    print(f'⚠️ 获取KOOK机器人信息失败，{delay}秒后重试: {e}')
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 10)
+        
+        # on_startup 在 bot.start() 开始时执行，检查在后台进行，不阻塞网关连接
+        @bot.on_startup
+        async def start_ready_check(_):
+            bot.kook_ready_check = asyncio.create_task(check_ready())
+        return
+    
+    _watch_receiver_ready(bot)
 
-def setup_kook_bot(bot):
+def _watch_receiver_ready(bot):
+    """退路：包装接收器在收到网关HELLO包（webhook模式为开始接收回调）时设置 bot.kook_ready
+    
+    依赖 khl 的私有属性，属性不存在时在启动时直接视为就绪，由启动超时兜底。
+    """
+    receiver = getattr(getattr(bot.client, 'gate', None), 'receiver', None)
+    handle_raw = getattr(receiver, '_handle_raw', None)
+    cert = getattr(receiver, '_cert', None)
+    
+    if receiver is None:
+        bot.kook_ready.set()
+        return
+    
+    if getattr(receiver, 'type', None) != 'websocket' or handle_raw is None or cert is None:
+        start_receiver = receiver.start
+        
+        async def start_and_mark_ready():
+            bot.kook_ready.set()
+            await start_receiver()
+        
+        receiver.start = start_and_mark_ready
+        return
+    
+    async def handle_raw_until_ready(raw):
+        if not bot.kook_ready.is_set():
+            try:
+                data = zlib.decompress(raw.data) if getattr(receiver, 'compress', False) else raw.data
+                pkg = cert.decode_raw(data)
+                if pkg.get('s') == 1 and pkg.get('d', {}).get('code') == 0:
+                    print('✅ KOOK网关已连接')
+                    bot.kook_ready.set()
+            except Exception as e:
+                print(f'⚠️ 解析KOOK网关数据包失败: {e}')
+        await handle_raw(raw)
+    
+    receiver._handle_raw = handle_raw_until_ready
+
+def setup_kook_bot(bot, settings=None):
     """设置KOOK机器人的事件和命令"""
+    settings = settings or get_settings()
+    
+    # KOOK连接就绪事件，启动器等待它再启动Discord机器人
+    # 需要在下面覆盖 bot.on_startup 之前注册启动事件
+    watch_kook_ready(bot)
+    
+    # 频道对象缓存，避免每次发送前都请求频道信息
+    bot.channel_cache = KookChannelCache(
+        bot,
+        ttl=settings.kook_channel_cache_ttl,
+        negative_ttl=settings.kook_channel_negative_ttl
+    )
     
     # 机器人启动事件处理函数
     async def on_startup():
@@ -182,9 +269,13 @@ def setup_kook_bot(bot):
                 message = bot.steam_monitor.format_price_message(change)
                 
                 try:
-                    channel = await bot.client.fetch_public_channel(channel_id)
+                    channel = await bot.channel_cache.get(channel_id)
+                    if not channel:
+                        print(f"发送价格变动通知失败: 无法访问频道 {channel_id}")
+                        continue
                     await bot.send(channel, message)
                 except Exception as e:
+                    bot.channel_cache.invalidate(channel_id)
                     print(f"发送价格变动通知失败: {e}")
         except Exception as e:
             print(f"处理价格变动时出错: {e}")
@@ -298,42 +389,17 @@ def setup_kook_bot(bot):
             # 获取频道ID
             channel_id = msg.ctx.channel.id
             
-            # 直接使用API发送消息
-            import aiohttp
-            import os
-            from dotenv import load_dotenv
-            
-            # 加载环境变量获取token
-            load_dotenv()
-            token = os.getenv('KOOK_BOT_TOKEN')
-            
-            # 构建API请求
-            url = "https://www.kookapp.cn/api/v3/message/create"
-            headers = {
-                "Authorization": f"Bot {token}",
-                "Content-Type": "application/json"
-            }
-            data = {
-                "target_id": channel_id,
-                "content": result_message,
-                "type": 1  # 1表示文本消息
-            }
-            
-            # 发送请求
-            # 使用超时设置，确保在任务内使用
-            timeout = aiohttp.ClientTimeout(total=30)  # 30秒超时
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                try:
-                    async with session.post(url, headers=headers, json=data) as response:
-                        if response.status == 200:
-                            print(f"✅ 消息已发送到KOOK频道 {channel_id}")
-                        else:
-                            resp_json = await response.json()
-                            print(f"❌ 发送消息到KOOK失败: {resp_json}")
-                except asyncio.TimeoutError:
-                    print(f"❌ 发送消息到KOOK超时")
-                except Exception as e:
-                    print(f"❌ 发送消息到KOOK请求异常: {e}")
+            # 通过共享的KOOK API客户端发送消息（1表示文本消息）
+            try:
+                status, resp_json = await get_kook_api_client().create_message(channel_id, result_message, 1)
+                if status == 200:
+                    print(f"✅ 消息已发送到KOOK频道 {channel_id}")
+                else:
+                    print(f"❌ 发送消息到KOOK失败: {resp_json}")
+            except asyncio.TimeoutError:
+                print(f"❌ 发送消息到KOOK超时")
+            except Exception as e:
+                print(f"❌ 发送消息到KOOK请求异常: {e}")
         except Exception as e:
             print(f"❌ 发送消息到KOOK失败: {e}")
         
@@ -373,42 +439,17 @@ def setup_kook_bot(bot):
             # 获取频道ID
             channel_id = msg.ctx.channel.id
             
-            # 直接使用API发送消息
-            import aiohttp
-            import os
-            from dotenv import load_dotenv
-            
-            # 加载环境变量获取token
-            load_dotenv()
-            token = os.getenv('KOOK_BOT_TOKEN')
-            
-            # 构建API请求
-            url = "https://www.kookapp.cn/api/v3/message/create"
-            headers = {
-                "Authorization": f"Bot {token}",
-                "Content-Type": "application/json"
-            }
-            data = {
-                "target_id": channel_id,
-                "content": result_message,
-                "type": 1  # 1表示文本消息
-            }
-            
-            # 发送请求
-            # 使用超时设置，确保在任务内使用
-            timeout = aiohttp.ClientTimeout(total=30)  # 30秒超时
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                try:
-                    async with session.post(url, headers=headers, json=data) as response:
-                        if response.status == 200:
-                            print(f"✅ 消息已发送到KOOK频道 {channel_id}")
-                        else:
-                            resp_json = await response.json()
-                            print(f"❌ 发送消息到KOOK失败: {resp_json}")
-                except asyncio.TimeoutError:
-                    print(f"❌ 发送消息到KOOK超时")
-                except Exception as e:
-                    print(f"❌ 发送消息到KOOK请求异常: {e}")
+            # 通过共享的KOOK API客户端发送消息（1表示文本消息）
+            try:
+                status, resp_json = await get_kook_api_client().create_message(channel_id, result_message, 1)
+                if status == 200:
+                    print(f"✅ 消息已发送到KOOK频道 {channel_id}")
+                else:
+                    print(f"❌ 发送消息到KOOK失败: {resp_json}")
+            except asyncio.TimeoutError:
+                print(f"❌ 发送消息到KOOK超时")
+            except Exception as e:
+                print(f"❌ 发送消息到KOOK请求异常: {e}")
         except Exception as e:
             print(f"❌ 发送消息到KOOK失败: {e}")
         
@@ -456,41 +497,17 @@ def setup_kook_bot(bot):
             # 获取频道ID
             channel_id = msg.ctx.channel.id
             
-            # 直接使用API发送消息
-            import aiohttp
-            import os
-            from dotenv import load_dotenv
-            
-            # 加载环境变量获取token
-            load_dotenv()
-            token = os.getenv('KOOK_BOT_TOKEN')
-            
-            # 构建API请求
-            url = "https://www.kookapp.cn/api/v3/message/create"
-            headers = {
-                "Authorization": f"Bot {token}",
-                "Content-Type": "application/json"
-            }
-            data = {
-                "target_id": channel_id,
-                "content": help_text,
-                "type": 1  # 1表示文本消息
-            }
-            
-            # 发送请求
-            timeout = aiohttp.ClientTimeout(total=30)  # 30秒超时
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                try:
-                    async with session.post(url, headers=headers, json=data) as response:
-                        if response.status == 200:
-                            print(f"✅ 帮助信息已发送到KOOK频道 {channel_id}")
-                        else:
-                            resp_json = await response.json()
-                            print(f"❌ 发送帮助信息到KOOK失败: {resp_json}")
-                except asyncio.TimeoutError:
-                    print(f"❌ 发送帮助信息到KOOK超时")
-                except Exception as e:
-                    print(f"❌ 发送帮助信息到KOOK请求异常: {e}")
+            # 通过共享的KOOK API客户端发送消息（1表示文本消息）
+            try:
+                status, resp_json = await get_kook_api_client().create_message(channel_id, help_text, 1)
+                if status == 200:
+                    print(f"✅ 帮助信息已发送到KOOK频道 {channel_id}")
+                else:
+                    print(f"❌ 发送帮助信息到KOOK失败: {resp_json}")
+            except asyncio.TimeoutError:
+                print(f"❌ 发送帮助信息到KOOK超时")
+            except Exception as e:
+                print(f"❌ 发送帮助信息到KOOK请求异常: {e}")
         except Exception as e:
             print(f"❌ 发送帮助信息到KOOK失败: {e}")
         
@@ -556,7 +573,7 @@ def setup_kook_bot(bot):
             channel_name = "未知频道"
             if channel_id:
                 try:
-                    channel = await bot.client.fetch_public_channel(channel_id)
+                    channel = await bot.channel_cache.get(channel_id)
                     channel_name = channel.name if hasattr(channel, 'name') else "私聊"
                 except:
                     pass
@@ -663,10 +680,7 @@ def setup_kook_bot(bot):
 
 if __name__ == '__main__':
     # 从环境变量获取token
-    from dotenv import load_dotenv
-    load_dotenv()
-    
-    TOKEN = os.getenv('KOOK_BOT_TOKEN')
+    TOKEN = get_settings().kook_token
     
     if TOKEN is None:
         print('错误: 请设置KOOK_BOT_TOKEN环境变量')
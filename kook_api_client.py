@@ -0,0 +1,398 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+from dotenv import load_dotenv
+
+# KOOK开放接口地址
+KOOK_API_BASE = "https://www.kookapp.cn/api/v3"
+
+
+class RateLimitBucket:
+    """单个KOOK限速桶的状态（如 message/create、asset/create）"""
+
+    # X-Rate-Limit-Reset 精度为秒，同一窗口内换算出的重置时间点会有1秒左右的抖动
+    RESET_JITTER = 1.0
+
+    def __init__(self, name: str):
+        self.name = name
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        # 本窗口重置的时间点（time.monotonic）
+        self.reset_at = 0.0
+        # 窗口是本地假定的（尚未收到新窗口的响应头）
+        self.provisional = False
+        # 已放行但还没有收到响应的请求数
+        self.inflight = 0
+        # 正在本地排队等待的请求数
+        self.waiting = 0
+
+    def reserve(self, now: float) -> float:
+        """尝试占用一次请求额度
+
+        Returns:
+            float: 需要等待的秒数，0表示可立即发送
+        """
+        if self.reset_at <= now and self.limit is not None:
+            # 窗口已重置：在拿到新的响应头之前按上限（扣除在途请求）放行，并假定一个1秒的临时窗口
+            self.remaining = max(self.limit - self.inflight, 0)
+            self.reset_at = now + 1.0
+            self.provisional = True
+        if self.remaining is None:
+            self.inflight += 1
+            return 0.0
+        if self.remaining > 0:
+            self.remaining -= 1
+            self.inflight += 1
+            return 0.0
+        return max(self.reset_at - now, 0.0)
+
+    def release(self):
+        """请求没有收到响应（网络异常等），不再计入在途请求"""
+        self.inflight = max(self.inflight - 1, 0)
+
+    def merge(self, other: "RateLimitBucket"):
+        """合并另一个记录同一服务端桶的本地状态（按接口路径记录、后来得知桶名的桶）
+
+        在途请求数相加，它们的响应之后会在这个桶上结算；额度取较少的一方、
+        重置时间取较晚的一方，宁可多等也不超发。排队数不合并，排队的请求醒来后自己迁移过来。
+        """
+        self.inflight += other.inflight
+        if self.limit is None:
+            self.limit = other.limit
+        if other.remaining is not None:
+            if self.remaining is None:
+                self.remaining = other.remaining
+                self.reset_at = other.reset_at
+                self.provisional = other.provisional
+            else:
+                self.remaining = min(self.remaining, other.remaining)
+                self.reset_at = max(self.reset_at, other.reset_at)
+
+    def update(self, limit: Optional[int], remaining: Optional[int], reset_after: Optional[float], now: float):
+        """根据响应头更新桶状态
+
+        服务端的剩余额度还没有扣除本地仍在途的请求，需要减去在途数；
+        同一窗口内的响应只会让本地额度变少，重置时间保持不变。
+        响应表明服务端已进入新窗口时（重置时间明显晚于本地窗口、剩余额度比本地估计的多，
+        或本地窗口已过期/只是临时假定的），以服务端的数值为准。
+        """
+        self.release()
+        if limit is not None:
+            self.limit = limit
+        if reset_after is None or remaining is None:
+            return
+
+        server_reset_at = now + reset_after
+        server_remaining = max(remaining - self.inflight, 0)
+        new_window = (
+            self.remaining is None
+            or self.provisional
+            or self.reset_at <= now
+            or server_reset_at > self.reset_at + self.RESET_JITTER
+            or server_remaining > self.remaining
+        )
+        if new_window:
+            self.remaining = server_remaining
+            self.reset_at = server_reset_at
+            self.provisional = False
+        else:
+            # 同一窗口：取较小值避免超发
+            self.remaining = min(self.remaining, server_remaining)
+
+
+class KookRateLimiter:
+    """按桶调度KOOK请求的限速器
+
+    根据响应头 X-Rate-Limit-* 记录每个桶的剩余额度，额度耗尽时请求在本地排队，
+    到桶重置时刻再放行，而不是发出去吃429后盲目重试。
+    """
+
+    def __init__(self):
+        self._buckets: Dict[str, RateLimitBucket] = {}
+        # 接口路径 -> 服务端返回的桶名
+        self._endpoint_buckets: Dict[str, str] = {}
+        # 全局限速解除的时间点
+        self._global_reset_at = 0.0
+
+    def _bucket_for(self, endpoint: str) -> RateLimitBucket:
+        name = self._endpoint_buckets.get(endpoint, endpoint)
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            bucket = RateLimitBucket(name)
+            self._buckets[name] = bucket
+        return bucket
+
+    async def acquire(self, endpoint: str):
+        """等待直到该接口所在的桶有可用额度"""
+        bucket = self._bucket_for(endpoint)
+        bucket.waiting += 1
+        try:
+            while True:
+                current = self._bucket_for(endpoint)
+                if current is not bucket:
+                    # 等待期间得知了接口所属的桶，之后在合并后的桶上排队
+                    bucket.waiting -= 1
+                    current.waiting += 1
+                    bucket = current
+                now = time.monotonic()
+                delay = max(self._global_reset_at - now, 0.0)
+                if not delay:
+                    delay = bucket.reserve(now)
+                if not delay:
+                    return
+                await asyncio.sleep(delay)
+        finally:
+            bucket.waiting -= 1
+
+    def release(self, endpoint: str):
+        """请求没有收到响应时调用，释放在途计数"""
+        self._bucket_for(endpoint).release()
+
+    def update(self, endpoint: str, status: int, headers):
+        """根据响应状态和响应头更新限速状态"""
+        now = time.monotonic()
+        bucket_name = headers.get('X-Rate-Limit-Bucket')
+        if bucket_name and self._endpoint_buckets.get(endpoint) != bucket_name:
+            # 首次得知接口所属的桶，把之前按接口路径记录的状态迁移过去；
+            # 其他接口已经记录了这个桶时合并两边的状态，在途请求和额度都不丢失
+            self._endpoint_buckets[endpoint] = bucket_name
+            old_bucket = self._buckets.pop(endpoint, None)
+            if old_bucket is not None:
+                existing = self._buckets.get(bucket_name)
+                if existing is None:
+                    old_bucket.name = bucket_name
+                    self._buckets[bucket_name] = old_bucket
+                else:
+                    existing.merge(old_bucket)
+        bucket = self._bucket_for(endpoint)
+
+        limit = self._parse_number(headers.get('X-Rate-Limit-Limit'), int)
+        remaining = self._parse_number(headers.get('X-Rate-Limit-Remaining'), int)
+        reset_after = self._parse_number(headers.get('X-Rate-Limit-Reset'), float)
+
+        if status == 429:
+            # 已被限速：桶额度清零，没有重置时间时保守等待1秒
+            remaining = 0
+            if reset_after is None:
+                reset_after = 1.0
+            if headers.get('X-Rate-Limit-Global'):
+                self._global_reset_at = now + reset_after
+        bucket.update(limit, remaining, reset_after, now)
+
+    def get_status(self) -> Dict[str, Dict[str, Any]]:
+        """获取各个桶的当前状态，便于排查"""
+        now = time.monotonic()
+        return {
+            name: {
+                "limit": bucket.limit,
+                "remaining": bucket.remaining,
+                "reset_in": max(bucket.reset_at - now, 0.0),
+                "waiting": bucket.waiting
+            }
+            for name, bucket in self._buckets.items()
+        }
+
+    @staticmethod
+    def _parse_number(value, cast):
+        if value is None:
+            return None
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            return None
+
+
+class KookApiClient:
+    """KOOK HTTP API客户端
+
+    所有对KOOK开放接口的调用共用长连接会话（连接池、keep-alive、DNS缓存），
+    连续转发大量消息时只需建立一次TCP/TLS连接。
+    """
+
+    def __init__(self, token: Optional[str] = None, limit: int = 100, limit_per_host: int = 20,
+                 dns_cache_ttl: int = 300, keepalive_timeout: int = 60, timeout: int = 30):
+        """
+        初始化KOOK API客户端
+
+        Args:
+            token: KOOK机器人token，为空时从环境变量KOOK_BOT_TOKEN读取
+            limit: 连接池总连接数上限
+            limit_per_host: 单个主机的连接数上限
+            dns_cache_ttl: DNS缓存时间，单位为秒
+            keepalive_timeout: 空闲连接保持时间，单位为秒
+            timeout: 单次请求总超时时间，单位为秒
+        """
+        if token is None:
+            load_dotenv()
+            token = os.getenv('KOOK_BOT_TOKEN')
+        self.token = token
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+        # aiohttp会话与创建它的事件循环绑定，每个事件循环各持有一个会话
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        # 限速状态按token共享，与事件循环无关
+        self.rate_limiter = KookRateLimiter()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取当前事件循环对应的会话，不存在或已关闭时创建"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._sessions[loop] = session
+        return session
+
+    async def request(self, method: str, endpoint: str, token: Optional[str] = None,
+                      max_attempts: int = 5, **kwargs) -> Tuple[int, Dict[str, Any]]:
+        """向KOOK API发送请求
+
+        请求会先经过限速器排队；若仍被限速（429），等到桶重置后重新发送。
+
+        Args:
+            method: HTTP方法
+            endpoint: 接口路径，如 message/create
+            token: 覆盖默认token（如AstrBot适配器提供的token）
+            max_attempts: 被限速时的最大发送次数
+            **kwargs: 透传给aiohttp的请求参数（json、data、params等），
+                data可以是返回请求体的函数，以便重发时重新构建表单
+
+        Returns:
+            Tuple[int, Dict[str, Any]]: (HTTP状态码, 响应JSON)
+        """
+        endpoint = endpoint.lstrip('/')
+        headers = dict(kwargs.pop('headers', None) or {})
+        headers['Authorization'] = f"Bot {token or self.token}"
+        url = f"{KOOK_API_BASE}/{endpoint}"
+
+        for attempt in range(max_attempts):
+            call_kwargs = dict(kwargs)
+            if callable(call_kwargs.get('data')):
+                call_kwargs['data'] = call_kwargs['data']()
+
+            await self.rate_limiter.acquire(endpoint)
+            session = self._get_session()
+            responded = False
+            try:
+                async with session.request(method, url, headers=headers, **call_kwargs) as response:
+                    responded = True
+                    self.rate_limiter.update(endpoint, response.status, response.headers)
+                    try:
+                        resp_json = await response.json(content_type=None)
+                    except ValueError:
+                        # 非JSON响应（如网关错误页），保留文本便于排查
+                        resp_json = {"code": response.status, "message": await response.text()}
+                    if not isinstance(resp_json, dict):
+                        resp_json = {"code": response.status, "data": resp_json}
+                    status = response.status
+            finally:
+                if not responded:
+                    # 没有收到响应（网络异常、超时、取消），释放在途计数
+                    self.rate_limiter.release(endpoint)
+
+            if status != 429:
+                return status, resp_json
+            print(f"⏳ KOOK接口 {endpoint} 触发限速，等待桶重置后重试 ({attempt+1}/{max_attempts})")
+
+        return status, resp_json
+
+    async def create_message(self, target_id: str, content: str, msg_type: int = 1,
+                             token: Optional[str] = None) -> Tuple[int, Dict[str, Any]]:
+        """发送频道消息
+
+        Args:
+            target_id: KOOK频道ID
+            content: 消息内容（卡片消息为JSON字符串）
+            msg_type: 消息类型，1文本 2图片 3视频 10卡片
+            token: 覆盖默认token
+
+        Returns:
+            Tuple[int, Dict[str, Any]]: (HTTP状态码, 响应JSON)
+        """
+        data = {
+            "target_id": target_id,
+            "content": content,
+            "type": msg_type
+        }
+        return await self.request("POST", "message/create", token=token, json=data)
+
+    async def upload_asset(self, file, filename: str, content_type: Optional[str] = None,
+                           file_type: Optional[int] = None,
+                           token: Optional[str] = None) -> Tuple[int, Dict[str, Any]]:
+        """上传媒体文件到KOOK
+
+        Args:
+            file: 文件对象或字节数据
+            filename: 上传使用的文件名
+            content_type: 文件MIME类型
+            file_type: 文件类型，1图片 2视频/音频 3其他文件
+            token: 覆盖默认token
+
+        Returns:
+            Tuple[int, Dict[str, Any]]: (HTTP状态码, 响应JSON)
+        """
+        def build_form():
+            # 表单只能发送一次，被限速重发时需要重新构建并回到文件开头
+            if hasattr(file, 'seek'):
+                file.seek(0)
+            form = aiohttp.FormData()
+            if content_type:
+                form.add_field('file', file, filename=filename, content_type=content_type)
+            else:
+                form.add_field('file', file, filename=filename)
+            if file_type is not None:
+                form.add_field('type', str(file_type))
+            return form
+
+        return await self.request("POST", "asset/create", token=token, data=build_form)
+
+    async def close(self):
+        """关闭当前事件循环的会话，并丢弃已关闭事件循环遗留的会话"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        for session_loop, session in list(self._sessions.items()):
+            if session_loop is loop:
+                if not session.closed:
+                    await session.close()
+                del self._sessions[session_loop]
+            elif session_loop.is_closed():
+                del self._sessions[session_loop]
+
+
+_kook_api_client: Optional[KookApiClient] = None
+
+
+def get_kook_api_client() -> KookApiClient:
+    """
+    获取全局共享的KOOK API客户端，首次调用时根据环境变量创建
+    """
+    global _kook_api_client
+    if _kook_api_client is None:
+        load_dotenv()
+        _kook_api_client = KookApiClient(
+            limit=int(os.getenv("KOOK_HTTP_POOL_SIZE", "100")),
+            limit_per_host=int(os.getenv("KOOK_HTTP_POOL_PER_HOST", "20")),
+            dns_cache_ttl=int(os.getenv("KOOK_HTTP_DNS_CACHE_TTL", "300"))
+        )
+    return _kook_api_client
+
+
+async def close_kook_api_client():
+    """关闭全局KOOK API客户端在当前事件循环上的连接"""
+    if _kook_api_client is not None:
+        await _kook_api_client.close()
@@ -0,0 +1,97 @@
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from khl import Bot, Event, EventTypes
+
+
+class KookChannelCache:
+    """KOOK频道对象缓存
+
+    fetch_public_channel 每次都是一次HTTP请求，而转发目标频道几乎不变。
+    缓存解析到的频道对象（带TTL）；已删除或无权限的频道做短时负缓存，
+    避免对失效的频道反复请求；收到频道更新/删除事件时立即失效。
+    """
+
+    def __init__(self, bot: Bot, ttl: int = 600, negative_ttl: int = 60):
+        """
+        初始化频道缓存
+
+        Args:
+            bot: KOOK机器人实例
+            ttl: 频道对象缓存时间，单位为秒
+            negative_ttl: 频道不存在或无权限时的负缓存时间，单位为秒
+        """
+        self.bot = bot
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # 频道ID -> (频道对象或None, 过期时间)
+        self._entries: Dict[str, Tuple[Optional[Any], float]] = {}
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+
+        self._register_events()
+
+    def _register_events(self):
+        """监听频道变更事件，频道被修改或删除时使缓存失效"""
+
+        @self.bot.on_event(EventTypes.UPDATED_CHANNEL)
+        async def on_channel_updated(_: Bot, event: Event):
+            self.invalidate(event.body.get('id'))
+
+        @self.bot.on_event(EventTypes.DELETED_CHANNEL)
+        async def on_channel_deleted(_: Bot, event: Event):
+            self.invalidate(event.body.get('id'))
+
+    async def get(self, channel_id: str):
+        """获取频道对象，优先使用缓存
+
+        Args:
+            channel_id: KOOK频道ID
+
+        Returns:
+            频道对象；频道不存在或无权限访问时返回None
+
+        Raises:
+            网络异常等暂时性错误原样抛出，不写入负缓存
+        """
+        channel_id = str(channel_id)
+        now = time.monotonic()
+        entry = self._entries.get(channel_id)
+        if entry is not None and entry[1] > now:
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        try:
+            channel = await self.bot.client.fetch_public_channel(channel_id)
+        except Exception as e:
+            # KOOK返回了错误码（频道已删除、无权限等），短时间内不再请求
+            if getattr(e, 'err_code', None) is not None:
+                print(f"⚠️ 无法获取KOOK频道 {channel_id}: {e}，{self.negative_ttl}秒内不再重试")
+                self._entries[channel_id] = (None, now + self.negative_ttl)
+                return None
+            raise
+
+        self._entries[channel_id] = (channel, now + (self.ttl if channel else self.negative_ttl))
+        return channel
+
+    def invalidate(self, channel_id: Optional[str] = None):
+        """使缓存失效
+
+        Args:
+            channel_id: 频道ID，为空时清空全部缓存
+        """
+        if channel_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(str(channel_id), None)
+
+    def get_stats(self) -> dict:
+        """获取缓存统计信息"""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses
+        }
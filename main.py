@@ -8,19 +8,79 @@ from astrbot.core.platform.message_type import MessageType
 from astrbot.core.star.filter.platform_adapter_type import PlatformAdapterType
 from pathlib import Path
 import asyncio
+import hashlib
 import json
 import aiohttp
 import os
+from .kook_api_client import get_kook_api_client, close_kook_api_client
+from .media_cache import MediaCache
+from .media_store import MediaStore
+from .forward_rules import ForwardRule, ForwardRuleTable
 from .translation_service import TranslationService
 from .translation_commands import TranslationCommandHandler
 
 @register("discord_to_kook_forwarder", "AstrBot Community", "Discord消息转发到Kook插件", "1.0.0", "https://github.com/AstrBotDevs/AstrBot")
 class DiscordToKookForwarder(Star):
+    # WebUI配置字段名映射（WebUI字段名 -> config.json字段名）
+    WEBUI_FIELD_MAPPING = {
+        # 基础配置
+        'enabled': 'enabled',
+        'discord_platform_id': 'discord_platform_id', 
+        'kook_platform_id': 'kook_platform_id',
+        'forward_channels': 'forward_channels',
+        'forward_all_channels': 'forward_all_channels',
+        'default_discord_channel': 'default_discord_channel',
+        'default_kook_channel': 'default_kook_channel',
+        'include_bot_messages': 'include_bot_messages',
+        'message_prefix': 'message_prefix',
+        'image_cleanup_hours': 'image_cleanup_hours',
+        'video_cleanup_hours': 'video_cleanup_hours',
+        'media_disk_budget_mb': 'media_disk_budget_mb',
+        'channel_mappings': 'channel_mappings',
+        'forward_rules': 'forward_rules',
+        # 翻译功能配置
+        'translation_enabled': 'translation_enabled',
+        'translation_platform': 'translation_platform',
+        'translation_source_lang': 'translation_source_lang',
+        'translation_target_lang': 'translation_target_lang',
+        'translation_api_key': 'translation_api_key',
+        'translation_api_secret': 'translation_api_secret',
+        'translation_api_url': 'translation_api_url',
+        'translation_only_text': 'translation_only_text',
+        'translation_min_length': 'translation_min_length',
+        # 可能的WebUI字段名变体
+        'enable': 'enabled',
+        'is_enabled': 'enabled',
+        'forward_all': 'forward_all_channels',
+        'all_channels': 'forward_all_channels',
+        'default_discord': 'default_discord_channel',
+        'discord_channel': 'default_discord_channel',
+        'default_channel': 'default_kook_channel',
+        'kook_channel': 'default_kook_channel',
+        'bot_messages': 'include_bot_messages',
+        'include_bots': 'include_bot_messages',
+        'prefix': 'message_prefix',
+        'msg_prefix': 'message_prefix'
+    }
+            
+
+    
     def __init__(self, context: Context):
         super().__init__(context)
         # 从插件元数据获取配置实例
         self.plugin_config = None
         self.config = {}
+        # 配置快照哈希：WebUI配置和已写入config.json的配置，用于变更检测
+        self._webui_config_hash = None
+        self._saved_config_hash = None
+        self._config_version = 0
+        # 需要重新同步WebUI配置的标记：配置变更回调或同步失败时设置，消息处理路径只检查标记
+        self._webui_config_dirty = True
+        # 上次同步时的plugin_config对象，插件配置对象被整体替换时重新同步
+        self._synced_plugin_config = None
+        # 编译后的转发规则表，配置变化时重新编译
+        self.forward_rules = ForwardRuleTable()
+        self._rules_config_hash = None
         
         # 查找当前插件的配置
         try:
@@ -68,7 +128,9 @@ class DiscordToKookForwarder(Star):
                 "message_prefix": "[Discord] ",  # 消息前缀
                 "image_cleanup_hours": 24,  # 图片文件自动清理时间（小时），设置为0表示不自动清理
                 "video_cleanup_hours": 24,  # 视频文件自动清理时间（小时），设置为0表示不自动清理
+                "media_disk_budget_mb": 2048,  # 本地图片、视频合计占用上限（MB），超出时删除最久未使用的文件，0表示不限制
                 "channel_mappings": [],  # 多频道映射配置（数组格式）
+                "forward_rules": [],  # 带过滤条件的转发规则（channel/guild/targets/include_bots/authors/pattern等）
                 # 翻译功能配置
                 "translation_enabled": False,  # 是否启用翻译功能
                 "translation_platform": "google",  # 翻译平台: google, baidu, youdao, deepl
@@ -84,6 +146,10 @@ class DiscordToKookForwarder(Star):
         self.discord_platform = None
         self.kook_platform = None
         self.translation_service = None
+        # 内容哈希 -> KOOK资源URL，重复的图片、视频不再重复上传
+        self.media_cache = MediaCache(Path(__file__).parent / "data" / "media_cache.db")
+        # 下载到public目录的图片、视频，按保留时间统一清理
+        self.media_store = MediaStore(Path(__file__).parent / "data" / "media_store.db")
         self.translation_command_handler = None
 
     async def initialize(self):
@@ -92,6 +158,9 @@ class DiscordToKookForwarder(Star):
             # 加载配置
             await self._load_config()
             
+            # 启动本地媒体清理
+            self._start_media_store()
+            
             # 重新初始化翻译服务
             self.translation_service = TranslationService(self.config)
             logger.info(f"✅ 翻译服务重新初始化完成，启用状态: {self.translation_service.is_enabled()}")
@@ -143,13 +212,13 @@ class DiscordToKookForwarder(Star):
                 self._create_default_config_file()
                 
             # 优先使用WebUI配置并同步到文件
-            await self._sync_webui_config()
+            await self._sync_webui_config(force=True)
                 
         except Exception as e:
             logger.warning(f"⚠️ 加载配置文件失败: {e}，使用默认配置")
             # 即使加载失败也要尝试同步WebUI配置
             try:
-                await self._sync_webui_config()
+                await self._sync_webui_config(force=True)
             except Exception as sync_e:
                 logger.warning(f"⚠️ 同步WebUI配置也失败: {sync_e}")
     
@@ -172,87 +241,79 @@ class DiscordToKookForwarder(Star):
             import traceback
             logger.error(traceback.format_exc())
     
-    async def _sync_webui_config(self):
-        """同步WebUI配置到内存和config.json文件（WebUI配置优先）"""
-        try:
-            # 如果有plugin_config对象，从中读取最新配置
-            if self.plugin_config:
-                webui_config = {}
+    def _read_webui_config(self) -> dict:
+        """从plugin_config读取WebUI配置的原始值（只读，不记录逐项日志）"""
+        webui_config = {}
+        if not self.plugin_config:
+            return webui_config
+        
+        # 尝试读取所有可能的WebUI字段
+        for webui_key, config_key in self.WEBUI_FIELD_MAPPING.items():
+            try:
+                value = None
                 
-                # WebUI配置字段名映射（WebUI字段名 -> config.json字段名）
-                webui_field_mapping = {
-                    # 基础配置
-                    'enabled': 'enabled',
-                    'discord_platform_id': 'discord_platform_id', 
-                    'kook_platform_id': 'kook_platform_id',
-                    'forward_channels': 'forward_channels',
-                    'forward_all_channels': 'forward_all_channels',
-                    'default_discord_channel': 'default_discord_channel',
-                    'default_kook_channel': 'default_kook_channel',
-                    'include_bot_messages': 'include_bot_messages',
-                    'message_prefix': 'message_prefix',
-                    'image_cleanup_hours': 'image_cleanup_hours',
-                    'video_cleanup_hours': 'video_cleanup_hours',
-                    'channel_mappings': 'channel_mappings',
-                    # 翻译功能配置
-                    'translation_enabled': 'translation_enabled',
-                    'translation_platform': 'translation_platform',
-                    'translation_source_lang': 'translation_source_lang',
-                    'translation_target_lang': 'translation_target_lang',
-                    'translation_api_key': 'translation_api_key',
-                    'translation_api_secret': 'translation_api_secret',
-                    'translation_api_url': 'translation_api_url',
-                    'translation_only_text': 'translation_only_text',
-                    'translation_min_length': 'translation_min_length',
-                    # 可能的WebUI字段名变体
-                    'enable': 'enabled',
-                    'is_enabled': 'enabled',
-                    'forward_all': 'forward_all_channels',
-                    'all_channels': 'forward_all_channels',
-                    'default_discord': 'default_discord_channel',
-                    'discord_channel': 'default_discord_channel',
-                    'default_channel': 'default_kook_channel',
-                    'kook_channel': 'default_kook_channel',
-                    'bot_messages': 'include_bot_messages',
-                    'include_bots': 'include_bot_messages',
-                    'prefix': 'message_prefix',
-                    'msg_prefix': 'message_prefix'
-                }
+                # 尝试多种方式读取配置值
+                if hasattr(self.plugin_config, '__getitem__'):
+                    try:
+                        value = self.plugin_config[webui_key]
+                    except (KeyError, TypeError):
+                        pass
                 
-                logger.info("🔍 开始读取WebUI配置...")
+                if value is None and hasattr(self.plugin_config, 'get'):
+                    try:
+                        value = self.plugin_config.get(webui_key)
+                    except Exception:
+                        pass
                 
-                # 尝试读取所有可能的WebUI字段
-                for webui_key, config_key in webui_field_mapping.items():
+                if value is None and hasattr(self.plugin_config, webui_key):
                     try:
-                        value = None
-                        
-                        # 尝试多种方式读取配置值
-                        if hasattr(self.plugin_config, '__getitem__'):
-                            try:
-                                value = self.plugin_config[webui_key]
-                            except (KeyError, TypeError):
-                                pass
-                        
-                        if value is None and hasattr(self.plugin_config, 'get'):
-                            try:
-                                value = self.plugin_config.get(webui_key)
-                            except Exception:
-                                pass
-                        
-                        if value is None and hasattr(self.plugin_config, webui_key):
-                            try:
-                                value = getattr(self.plugin_config, webui_key)
-                            except Exception:
-                                pass
-                        
-                        # 如果读取到有效值，添加到webui_config
-                        if value is not None:
-                            webui_config[config_key] = value
-                            logger.info(f"📋 WebUI配置 {webui_key} -> {config_key}: {value}")
-                            
-                    except Exception as e:
-                        logger.debug(f"⚠️ 读取WebUI配置项 {webui_key} 失败: {e}")
-                        continue
+                        value = getattr(self.plugin_config, webui_key)
+                    except Exception:
+                        pass
+                
+                # 如果读取到有效值，添加到webui_config
+                if value is not None:
+                    webui_config[config_key] = value
+                    
+            except Exception as e:
+                logger.debug(f"⚠️ 读取WebUI配置项 {webui_key} 失败: {e}")
+                continue
+        
+        return webui_config
+    
+    @staticmethod
+    def _config_hash(config: dict) -> str:
+        """计算配置快照的哈希，用于判断配置是否真的发生了变化"""
+        payload = json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    async def _sync_webui_config(self, force: bool = False) -> bool:
+        """同步WebUI配置到内存和config.json文件（WebUI配置优先）
+        
+        读取WebUI配置快照并与上次同步时的哈希比较，未变化时直接返回，不会产生磁盘写入。
+        只在插件加载、配置变更回调，或 _webui_config_needs_sync 返回True时调用，
+        消息处理路径上不再逐条读取和哈希WebUI配置。
+        
+        Args:
+            force: 忽略哈希比较，强制重新同步（插件加载、配置变更回调时使用）
+            
+        Returns:
+            bool: 本次是否执行了同步
+        """
+        self._webui_config_dirty = False
+        self._synced_plugin_config = self.plugin_config
+        try:
+            # 如果有plugin_config对象，从中读取最新配置
+            if self.plugin_config:
+                webui_config = self._read_webui_config()
+                webui_hash = self._config_hash(webui_config)
+                if not force and webui_hash == self._webui_config_hash:
+                    return False
+                self._webui_config_hash = webui_hash
+                self._config_version += 1
+                logger.info(f"🔍 WebUI配置已变化，开始同步（版本 {self._config_version}）")
+                for config_key, value in webui_config.items():
+                    logger.info(f"📋 WebUI配置 {config_key}: {value}")
                 
                 # 强制使用WebUI配置更新内存配置
                 if webui_config:
@@ -291,9 +352,9 @@ class DiscordToKookForwarder(Star):
                             webui_config['forward_channels'] = {}
                     
                     self.config.update(webui_config)
+                    self._apply_media_retention()
                     
-                    # 强制同步到config.json（确保WebUI配置持久化）
-                    logger.info("💾 强制同步WebUI配置到config.json")
+                    # 同步到config.json（仅在配置内容变化时写盘）
                     self._save_config()
                 else:
                     logger.warning("⚠️ 未能从WebUI读取到任何配置，使用现有配置")
@@ -301,6 +362,8 @@ class DiscordToKookForwarder(Star):
                     logger.info("📝 创建基础config.json文件")
                     self._save_config()
             else:
+                if not force and self._saved_config_hash is not None:
+                    return False
                 logger.warning("⚠️ plugin_config对象不存在，无法读取WebUI配置")
                 # 没有plugin_config时也要确保config.json存在
                 logger.info("📝 确保config.json文件存在")
@@ -310,11 +373,18 @@ class DiscordToKookForwarder(Star):
             logger.error(f"❌ 同步WebUI配置失败: {e}")
             import traceback
             logger.error(traceback.format_exc())
+            # 下一条消息到达时重试同步
+            self._webui_config_dirty = True
             # 即使同步失败，也要确保config.json存在
             try:
                 self._save_config()
             except Exception as save_e:
                 logger.error(f"❌ 保存配置文件也失败: {save_e}")
+        return True
+    
+    def _webui_config_needs_sync(self) -> bool:
+        """WebUI配置是否需要重新同步：配置变更回调或同步失败后，或插件配置对象被整体替换"""
+        return self._webui_config_dirty or self.plugin_config is not self._synced_plugin_config
     
     def _parse_channel_mappings_array(self, mappings_array: list) -> dict:
         """解析数组格式的频道映射配置
@@ -467,8 +537,14 @@ class DiscordToKookForwarder(Star):
         return mappings
     
     def _save_config(self):
-        """保存插件配置到文件"""
+        """保存插件配置到文件（配置内容与上次保存时相同则跳过）"""
         try:
+            config_hash = self._config_hash(self.config)
+            self._compile_forward_rules(config_hash)
+            if config_hash == self._saved_config_hash:
+                logger.debug("📋 配置未变化，跳过保存")
+                return
+            
             # 尝试多种方式保存配置
             saved = False
             
@@ -549,7 +625,11 @@ class DiscordToKookForwarder(Star):
             except Exception as e:
                 logger.warning(f"⚠️ 同步config.json失败: {e}")
             
-            if not saved:
+            if saved:
+                self._saved_config_hash = config_hash
+                # 保存时回写了plugin_config（如channel_mappings），刷新快照避免下条消息误判为变更
+                self._webui_config_hash = self._config_hash(self._read_webui_config())
+            else:
                 logger.warning("❌ 所有配置保存方式都失败，配置未保存")
         except Exception as e:
             logger.error(f"❌ 保存插件配置失败: {e}")
@@ -601,8 +681,9 @@ class DiscordToKookForwarder(Star):
         try:
             logger.info(f"🔔 接收到Discord消息: 发送者={event.get_sender_name()}, 内容='{event.message_str}', 平台={event.get_platform_name()}")
             
-            # 每次处理消息前同步WebUI配置（确保实时响应WebUI配置变更）
-            await self._sync_webui_config()
+            # 只在配置被标记为变化时同步（热路径上不读取、不哈希WebUI配置）
+            if self._webui_config_needs_sync():
+                await self._sync_webui_config(force=True)
             
             if not self.config["enabled"]:
                 logger.info("❌ 转发功能已禁用，跳过消息")
@@ -617,26 +698,19 @@ class DiscordToKookForwarder(Star):
                 logger.warning("❌ Kook平台未找到，无法转发消息")
                 return
             
-            # 检查是否应该转发此消息
-            should_forward = await self._should_forward_message(event)
-            logger.info(f"📋 消息转发检查结果: {should_forward}")
-            if not should_forward:
+            # 按转发规则表确定目标Kook频道（可能有多个）
+            target_channels = self._route_message(event)
+            if not target_channels:
                 return
             
             # 转换消息格式
             forwarded_message = await self._convert_message_for_kook(event)
             logger.info(f"🔄 消息格式转换完成，消息链长度: {len(forwarded_message.chain)}")
             
-            # 确定目标Kook频道
-            target_channel = await self._get_target_kook_channel(event)
-            logger.info(f"🎯 目标Kook频道: {target_channel}")
-            
-            if target_channel:
+            for target_channel in target_channels:
                 # 发送到Kook
                 await self._send_to_kook(target_channel, forwarded_message)
                 logger.info(f"✅ 已转发Discord消息到Kook频道: {target_channel}")
-            else:
-                logger.warning("❌ 未找到对应的Kook频道，消息未转发")
                 
         except Exception as e:
             logger.error(f"❌ 转发Discord消息到Kook时发生错误: {e}")
@@ -647,64 +721,104 @@ class DiscordToKookForwarder(Star):
         """配置变更回调 - 当WebUI配置发生变化时触发"""
         try:
             logger.info("🔄 检测到配置变更，重新加载配置...")
-            await self._sync_webui_config()
+            # 先标记，同步失败时由下一条消息重试
+            self._webui_config_dirty = True
+            await self._sync_webui_config(force=True)
             logger.info("✅ 配置重新加载完成")
         except Exception as e:
             logger.error(f"❌ 配置重新加载失败: {e}")
             import traceback
             logger.error(traceback.format_exc())
 
-    async def _should_forward_message(self, event: AstrMessageEvent) -> bool:
-        """判断是否应该转发此消息"""
-        # 检查是否包含机器人消息
-        # 优先使用is_bot属性，如果没有则回退到原来的逻辑
-        is_bot_message = False
-        if hasattr(event.message_obj.sender, 'is_bot'):
-            is_bot_message = event.message_obj.sender.is_bot
-            logger.info(f"🤖 机器人消息检查(使用is_bot属性): 发送者={event.message_obj.sender.nickname}, is_bot={is_bot_message}")
-        else:
-            # 回退到原来的逻辑：检查是否是自己发送的消息
-            is_bot_message = event.message_obj.sender.user_id == event.message_obj.self_id
-            logger.info(f"🤖 机器人消息检查(回退逻辑): 发送者ID={event.message_obj.sender.user_id}, 机器人ID={event.message_obj.self_id}, 是否机器人消息={is_bot_message}")
-        
-        if not self.config["include_bot_messages"] and is_bot_message:
-            logger.info("❌ 跳过机器人消息（配置不包含机器人消息）")
-            return False
+    def _config_number(self, key: str, default: float) -> float:
+        """读取数值配置；WebUI中的值可能是字符串，无法转换或为负数时使用默认值"""
+        value = self.config.get(key, default)
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            logger.warning(f"⚠️ 配置项 {key} 不是有效的数字: {value!r}，使用默认值 {default}")
+            return default
+        if number < 0:
+            logger.warning(f"⚠️ 配置项 {key} 不能为负数: {value!r}，使用默认值 {default}")
+            return default
+        return number
+
+    def _apply_media_retention(self):
+        """按配置设置图片、视频的保留时间（0表示不自动清理）和磁盘预算"""
+        self.media_store.max_bytes = int(self._config_number('media_disk_budget_mb', 2048) * 1024 * 1024)
+        self.media_store.set_retention("image", self._config_number('image_cleanup_hours', 24) * 3600)
+        self.media_store.set_retention("video", self._config_number('video_cleanup_hours', 24) * 3600)
+
+    def _start_media_store(self):
+        """对齐本地媒体索引与public目录中的文件，并启动清理定时任务"""
+        try:
+            self._apply_media_retention()
+            public_dir = Path(__file__).parent / "public"
+            result = self.media_store.reconcile({
+                public_dir / "image": "image",
+                public_dir / "video": "video"
+            })
+            logger.info(f"🗂️ 本地媒体索引已对齐: 共 {result['total']} 个文件, 补登记 {result['added']} 个")
+        except Exception as e:
+            logger.error(f"❌ 对齐本地媒体索引失败: {e}")
+        self.media_store.start()
+
+    def _compile_forward_rules(self, config_hash: str = None):
+        """把转发相关配置编译为规则表（配置未变化时跳过）
         
-        # 获取Discord频道ID
-        discord_channel_id = event.message_obj.group_id or event.session_id
-        logger.info(f"📍 Discord频道ID: {discord_channel_id}")
+        优先级与原有配置含义一致：多频道映射 > 默认Discord频道 > 默认Kook频道（兜底，
+        只在没有其他规则匹配时生效）。forward_channels 的值可以是频道ID列表（一对多转发），
+        forward_rules 中可以配置服务器通配、发送者/身份组/机器人过滤和正则内容过滤。
+        """
+        config_hash = config_hash or self._config_hash(self.config)
+        if config_hash == self._rules_config_hash:
+            return
+        self._rules_config_hash = config_hash
         
-        # 检查频道配置
-        if self.config["forward_all_channels"]:
-            logger.info("✅ 转发所有频道已启用，允许转发")
-            return True
+        rules = []
+        forward_channels = self.config.get("forward_channels") or {}
+        for discord_channel_id, kook_channel_ids in forward_channels.items():
+            if isinstance(kook_channel_ids, str):
+                kook_channel_ids = [kook_channel_ids]
+            rules.append(ForwardRule(kook_channel_ids, channel=discord_channel_id))
         
-        # 多频道映射检查 - 优先级最高
-        if discord_channel_id in self.config["forward_channels"]:
-            logger.info(f"✅ 频道在多频道映射列表中: {discord_channel_id} -> {self.config['forward_channels'][discord_channel_id]}")
-            return True
+        for rule_config in self.config.get("forward_rules") or []:
+            try:
+                rules.append(ForwardRule.from_dict(rule_config))
+            except Exception as e:
+                logger.error(f"❌ 转发规则无效: {rule_config} - {e}")
         
-        # 默认频道检查 - 向下兼容
         default_discord_channel = self.config.get("default_discord_channel")
         default_kook_channel = self.config.get("default_kook_channel")
+        if default_kook_channel:
+            if default_discord_channel:
+                if default_discord_channel not in forward_channels:
+                    rules.append(ForwardRule([default_kook_channel], channel=default_discord_channel))
+            else:
+                # 向下兼容：没有配置默认Discord频道时，其余频道都转发到默认Kook频道
+                rules.append(ForwardRule([default_kook_channel], fallback=True))
         
-        # 如果是默认Discord频道且有默认Kook频道
-        if default_discord_channel and discord_channel_id == default_discord_channel and default_kook_channel:
-            logger.info(f"✅ 匹配默认Discord频道: {discord_channel_id} -> {default_kook_channel}")
-            return True
-        
-        # 如果没有配置默认Discord频道，但有默认Kook频道（向下兼容旧配置）
-        if not default_discord_channel and default_kook_channel:
-            logger.info(f"✅ 使用默认Kook频道（向下兼容）: {discord_channel_id} -> {default_kook_channel}")
-            return True
-        
-        logger.info(f"❌ 频道不在转发范围内: {discord_channel_id}")
-        logger.info(f"   - 多频道映射: {list(self.config['forward_channels'].keys())}")
-        logger.info(f"   - 默认Discord频道: {default_discord_channel}")
-        logger.info(f"   - 默认Kook频道: {default_kook_channel}")
+        self.forward_rules = ForwardRuleTable(rules, forward_bots=self.config.get("include_bot_messages", False))
+        logger.info(f"📋 转发规则已编译: {len(self.forward_rules)} 条")
+
+    def _route_message(self, event: AstrMessageEvent) -> list:
+        """按转发规则表计算消息需要转发到的Kook频道"""
+        sender = event.message_obj.sender
+        # 优先使用is_bot属性，如果没有则回退到检查是否是自己发送的消息
+        if hasattr(sender, 'is_bot'):
+            is_bot_message = sender.is_bot
+        else:
+            is_bot_message = sender.user_id == event.message_obj.self_id
         
-        return False
+        discord_channel_id = event.message_obj.group_id or event.session_id
+        targets = self.forward_rules.route(
+            discord_channel_id,
+            author_id=sender.user_id,
+            is_bot=is_bot_message,
+            content=event.message_str
+        )
+        logger.debug(f"🎯 Discord频道 {discord_channel_id} (机器人消息: {is_bot_message}) -> Kook频道 {targets}")
+        return targets
 
     async def _convert_message_for_kook(self, event: AstrMessageEvent) -> MessageChain:
         """将Discord消息转换为Kook格式"""
@@ -753,40 +867,6 @@ class DiscordToKookForwarder(Star):
         
         return message_chain
 
-    async def _get_target_kook_channel(self, event: AstrMessageEvent) -> str:
-        """获取目标Kook频道ID - 支持多频道映射"""
-        discord_channel_id = event.message_obj.group_id or event.session_id
-        logger.info(f"🔍 查找目标Kook频道，Discord频道ID: {discord_channel_id}")
-        
-        # 优先级1: 检查多频道映射配置
-        forward_channels = self.config.get("forward_channels", {})
-        if discord_channel_id in forward_channels:
-            target = forward_channels[discord_channel_id]
-            logger.info(f"✅ 找到多频道映射: {discord_channel_id} -> {target}")
-            return target
-        
-        # 优先级2: 检查是否是默认Discord频道
-        default_discord_channel = self.config.get("default_discord_channel")
-        default_kook_channel = self.config.get("default_kook_channel")
-        
-        if default_discord_channel and discord_channel_id == default_discord_channel and default_kook_channel:
-            logger.info(f"✅ 匹配默认Discord频道映射: {discord_channel_id} -> {default_kook_channel}")
-            return default_kook_channel
-        
-        # 优先级3: 向下兼容 - 如果没有配置默认Discord频道，使用默认Kook频道
-        if not default_discord_channel and default_kook_channel:
-            logger.info(f"📌 使用默认Kook频道（向下兼容）: {default_kook_channel}")
-            return default_kook_channel
-        
-        # 调试信息
-        logger.warning(f"❌ 未找到目标Kook频道: {discord_channel_id}")
-        logger.info(f"   - 多频道映射数量: {len(forward_channels)}")
-        logger.info(f"   - 映射列表: {list(forward_channels.keys())}")
-        logger.info(f"   - 默认Discord频道: {default_discord_channel}")
-        logger.info(f"   - 默认Kook频道: {default_kook_channel}")
-        
-        return None
-
     async def _send_to_kook(self, channel_id: str, message_chain: MessageChain):
         """发送消息到Kook频道"""
         try:
@@ -1025,8 +1105,8 @@ class DiscordToKookForwarder(Star):
                         
                         logger.info(f"✅ 视频下载成功: {local_path}")
                         
-                        # 下载完成后进行清理
-                        await self._cleanup_old_videos()
+                        # 登记到本地媒体存储，到期后自动清理
+                        self.media_store.track(local_path, "video")
                         
                         return str(local_path)
                     else:
@@ -1039,47 +1119,6 @@ class DiscordToKookForwarder(Star):
             logger.error(traceback.format_exc())
             return None
 
-    async def _cleanup_old_videos(self):
-        """根据配置清理旧视频文件"""
-        import os
-        import time
-        from pathlib import Path
-        
-        try:
-            # 获取清理时间配置（小时）
-            cleanup_hours = self.config.get('video_cleanup_hours', 24)
-            
-            # 如果设置为0，则不清理
-            if cleanup_hours <= 0:
-                return
-                
-            plugin_dir = Path(__file__).parent
-            video_dir = plugin_dir / "public" / "video"
-            
-            if not video_dir.exists():
-                return
-                
-            current_time = time.time()
-            cleanup_count = 0
-            cleanup_seconds = cleanup_hours * 3600  # 转换为秒
-            
-            # 清理超过配置时间的视频文件
-            for video_file in video_dir.glob("*"):
-                if video_file.is_file() and video_file.name != ".gitkeep":
-                    file_age = current_time - video_file.stat().st_mtime
-                    if file_age > cleanup_seconds:
-                        try:
-                            video_file.unlink()
-                            cleanup_count += 1
-                        except Exception as e:
-                            logger.warning(f"⚠️ 删除旧视频文件失败: {video_file} - {e}")
-            
-            if cleanup_count > 0:
-                logger.info(f"🧹 清理了 {cleanup_count} 个超过 {cleanup_hours} 小时的旧视频文件")
-                
-        except Exception as e:
-            logger.error(f"❌ 清理旧视频文件异常: {e}")
-    
     async def _send_video_to_kook_direct(self, channel_id: str, video_path: str, filename: str) -> bool:
         """直接使用HTTP API发送视频到Kook"""
         try:
@@ -1098,12 +1137,19 @@ class DiscordToKookForwarder(Star):
                 logger.error("❌ 无法获取Kook认证token")
                 return False
             
-            # 第一步：上传视频文件到Kook
-            logger.info(f"📤 开始上传视频文件: {video_path}")
-            video_url = await self._upload_video_to_kook(video_path, token)
-            if not video_url:
-                logger.error(f"❌ 视频上传失败: {filename}")
-                return False
+            # 相同内容已上传过时直接引用缓存的URL
+            digest = await self.media_cache.hash_file_async(video_path)
+            video_url = await self.media_cache.get(digest)
+            if video_url:
+                logger.info(f"♻️ 媒体缓存命中，跳过上传: {filename}")
+            else:
+                # 第一步：上传视频文件到Kook
+                logger.info(f"📤 开始上传视频文件: {video_path}")
+                video_url = await self._upload_video_to_kook(video_path, token)
+                if not video_url:
+                    logger.error(f"❌ 视频上传失败: {filename}")
+                    return False
+                await self.media_cache.put(digest, video_url, os.path.getsize(video_path))
             
             # 第二步：发送视频消息到频道
             logger.info(f"📡 开始发送视频消息到频道: {channel_id}")
@@ -1129,67 +1175,57 @@ class DiscordToKookForwarder(Star):
             file_size = os.path.getsize(video_path)
             logger.info(f"📁 视频文件大小: {file_size} 字节 ({file_size / (1024 * 1024):.2f} MB)")
             
-            # 构建上传URL和请求头
-            upload_url = "https://www.kookapp.cn/api/v3/asset/create"
-            headers = {'Authorization': f'Bot {token}'}
+            logger.info("📡 发送上传请求到: asset/create")
             
-            logger.info(f"📡 发送上传请求到: {upload_url}")
+            # 通过共享的KOOK API客户端上传文件
+            with open(video_path, 'rb') as f:
+                status, result = await get_kook_api_client().upload_asset(f, Path(video_path).name, token=token)
+            logger.info(f"📥 收到上传响应，状态码: {status}")
             
-            # 使用aiohttp上传文件
-            async with aiohttp.ClientSession() as session:
-                with open(video_path, 'rb') as f:
-                    data = aiohttp.FormData()
-                    data.add_field('file', f, filename=Path(video_path).name)
+            if status == 200:
+                logger.info(f"📄 Kook视频上传响应: {result}")
+                
+                # 解析Kook返回的数据结构
+                if result.get('code') == 0 and 'data' in result:
+                    data = result['data']
                     
-                    async with session.post(upload_url, data=data, headers=headers) as response:
-                        logger.info(f"📥 收到上传响应，状态码: {response.status}")
+                    # 提取URL - Kook可能返回不同的字段名
+                    asset_url = None
+                    if 'url' in data:
+                        asset_url = data['url']
+                    elif 'file_url' in data:
+                        asset_url = data['file_url']
+                    elif 'link' in data:
+                        asset_url = data['link']
+                    elif 'asset_url' in data:
+                        asset_url = data['asset_url']
+                    
+                    if asset_url:
+                        logger.info(f"✅ 视频上传成功，获得URL: {asset_url}")
                         
-                        if response.status == 200:
-                            result = await response.json()
-                            logger.info(f"📄 Kook视频上传响应: {result}")
-                            
-                            # 解析Kook返回的数据结构
-                            if result.get('code') == 0 and 'data' in result:
-                                data = result['data']
-                                
-                                # 提取URL - Kook可能返回不同的字段名
-                                asset_url = None
-                                if 'url' in data:
-                                    asset_url = data['url']
-                                elif 'file_url' in data:
-                                    asset_url = data['file_url']
-                                elif 'link' in data:
-                                    asset_url = data['link']
-                                elif 'asset_url' in data:
-                                    asset_url = data['asset_url']
-                                
-                                if asset_url:
-                                    logger.info(f"✅ 视频上传成功，获得URL: {asset_url}")
-                                    
-                                    # 记录完整的返回数据用于调试
-                                    logger.debug(f"🔍 完整的Kook返回数据: {data}")
-                                    
-                                    # 等待服务器处理视频文件
-                                    logger.info(f"⏳ 等待服务器处理视频文件...")
-                                    import asyncio
-                                    await asyncio.sleep(5.0)  # 等待5秒让服务器处理视频
-                                    logger.info(f"✅ 服务器处理完成，准备发送消息")
-                                    
-                                    return asset_url
-                                else:
-                                    logger.error(f"❌ 无法从Kook响应中提取URL，数据结构: {data}")
-                                    return None
-                            else:
-                                error_msg = result.get('message', '未知错误')
-                                error_code = result.get('code', 'N/A')
-                                logger.error(f"❌ 视频上传失败 (代码: {error_code}): {error_msg}")
-                                return None
-                        else:
-                            response_text = await response.text()
-                            logger.error(f"❌ 视频上传HTTP错误: {response.status}")
-                            logger.error(f"📄 错误详情: {response_text}")
-                            return None
-                            
+                        # 记录完整的返回数据用于调试
+                        logger.debug(f"🔍 完整的Kook返回数据: {data}")
+                        
+                        # 等待服务器处理视频文件
+                        logger.info(f"⏳ 等待服务器处理视频文件...")
+                        import asyncio
+                        await asyncio.sleep(5.0)  # 等待5秒让服务器处理视频
+                        logger.info(f"✅ 服务器处理完成，准备发送消息")
+                        
+                        return asset_url
+                    else:
+                        logger.error(f"❌ 无法从Kook响应中提取URL，数据结构: {data}")
+                        return None
+                else:
+                    error_msg = result.get('message', '未知错误')
+                    error_code = result.get('code', 'N/A')
+                    logger.error(f"❌ 视频上传失败 (代码: {error_code}): {error_msg}")
+                    return None
+            else:
+                logger.error(f"❌ 视频上传HTTP错误: {status}")
+                logger.error(f"📄 错误详情: {result}")
+                return None
+                
         except Exception as e:
             logger.error(f"❌ 上传视频异常: {e}")
             import traceback
@@ -1199,41 +1235,27 @@ class DiscordToKookForwarder(Star):
     async def _send_video_message_to_kook(self, channel_id: str, video_url: str, filename: str, token: str) -> bool:
         """发送视频消息到Kook频道"""
         try:
-            # 构建消息发送URL和请求头
-            url = "https://www.kookapp.cn/api/v3/message/create"
-            headers = {
-                "Authorization": f"Bot {token}",
-                "Content-Type": "application/json"
-            }
-            payload = {
-                "target_id": channel_id,
-                "content": video_url,
-                "type": 3  # 使用type=3发送视频消息
-            }
-            
             logger.info(f"📡 发送视频消息到频道 {channel_id}")
-            logger.info(f"📄 消息内容: {payload}")
+            logger.info(f"📄 消息内容: {video_url} (type=3)")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=payload) as resp:
-                    logger.info(f"📥 收到发送响应，状态码: {resp.status}")
-                    
-                    if resp.status == 200:
-                        result = await resp.json()
-                        logger.info(f"📄 发送响应内容: {result}")
-                        
-                        if result.get('code') == 0:
-                            logger.info(f"✅ 发送视频消息成功: {filename}")
-                            return True
-                        else:
-                            error_msg = result.get('message', '未知错误')
-                            logger.error(f"❌ 发送视频消息失败: {error_msg}")
-                            return False
-                    else:
-                        response_text = await resp.text()
-                        logger.error(f"❌ 发送视频消息HTTP错误: {resp.status}")
-                        logger.error(f"📄 错误详情: {response_text}")
-                        return False
+            # 使用type=3发送视频消息
+            status, result = await get_kook_api_client().create_message(channel_id, video_url, 3, token=token)
+            logger.info(f"📥 收到发送响应，状态码: {status}")
+            
+            if status == 200:
+                logger.info(f"📄 发送响应内容: {result}")
+                
+                if result.get('code') == 0:
+                    logger.info(f"✅ 发送视频消息成功: {filename}")
+                    return True
+                else:
+                    error_msg = result.get('message', '未知错误')
+                    logger.error(f"❌ 发送视频消息失败: {error_msg}")
+                    return False
+            else:
+                logger.error(f"❌ 发送视频消息HTTP错误: {status}")
+                logger.error(f"📄 错误详情: {result}")
+                return False
                         
         except Exception as e:
             logger.error(f"❌ 发送视频消息异常: {e}")
@@ -1259,12 +1281,19 @@ class DiscordToKookForwarder(Star):
                 logger.error("❌ 无法获取Kook认证token")
                 return False
             
-            # 第一步：上传图片文件到Kook
-            logger.info(f"📤 开始上传图片文件: {image_path}")
-            image_url = await self._upload_image_to_kook_api(image_path, token)
-            if not image_url:
-                logger.error(f"❌ 图片上传失败: {filename}")
-                return False
+            # 相同内容已上传过时直接引用缓存的URL
+            digest = await self.media_cache.hash_file_async(image_path)
+            image_url = await self.media_cache.get(digest)
+            if image_url:
+                logger.info(f"♻️ 媒体缓存命中，跳过上传: {filename}")
+            else:
+                # 第一步：上传图片文件到Kook
+                logger.info(f"📤 开始上传图片文件: {image_path}")
+                image_url = await self._upload_image_to_kook_api(image_path, token)
+                if not image_url:
+                    logger.error(f"❌ 图片上传失败: {filename}")
+                    return False
+                await self.media_cache.put(digest, image_url, os.path.getsize(image_path))
             
             # 第二步：发送图片消息到频道
             logger.info(f"📡 开始发送图片消息到频道: {channel_id}")
@@ -1290,61 +1319,51 @@ class DiscordToKookForwarder(Star):
             file_size = os.path.getsize(image_path)
             logger.info(f"📁 图片文件大小: {file_size} 字节 ({file_size / (1024 * 1024):.2f} MB)")
             
-            # 构建上传URL和请求头
-            upload_url = "https://www.kookapp.cn/api/v3/asset/create"
-            headers = {'Authorization': f'Bot {token}'}
+            logger.info("📡 发送图片上传请求到: asset/create")
             
-            logger.info(f"📡 发送图片上传请求到: {upload_url}")
+            # 通过共享的KOOK API客户端上传文件
+            with open(image_path, 'rb') as f:
+                status, result = await get_kook_api_client().upload_asset(f, Path(image_path).name, token=token)
+            logger.info(f"📥 收到图片上传响应，状态码: {status}")
             
-            # 使用aiohttp上传文件
-            async with aiohttp.ClientSession() as session:
-                with open(image_path, 'rb') as f:
-                    data = aiohttp.FormData()
-                    data.add_field('file', f, filename=Path(image_path).name)
+            if status == 200:
+                logger.info(f"📄 Kook图片上传响应: {result}")
+                
+                # 解析Kook返回的数据结构
+                if result.get('code') == 0 and 'data' in result:
+                    data = result['data']
+                    
+                    # 提取URL - Kook可能返回不同的字段名
+                    asset_url = None
+                    if 'url' in data:
+                        asset_url = data['url']
+                    elif 'file_url' in data:
+                        asset_url = data['file_url']
+                    elif 'link' in data:
+                        asset_url = data['link']
+                    elif 'asset_url' in data:
+                        asset_url = data['asset_url']
                     
-                    async with session.post(upload_url, data=data, headers=headers) as response:
-                        logger.info(f"📥 收到图片上传响应，状态码: {response.status}")
+                    if asset_url:
+                        logger.info(f"✅ 图片上传成功，获得URL: {asset_url}")
                         
-                        if response.status == 200:
-                            result = await response.json()
-                            logger.info(f"📄 Kook图片上传响应: {result}")
-                            
-                            # 解析Kook返回的数据结构
-                            if result.get('code') == 0 and 'data' in result:
-                                data = result['data']
-                                
-                                # 提取URL - Kook可能返回不同的字段名
-                                asset_url = None
-                                if 'url' in data:
-                                    asset_url = data['url']
-                                elif 'file_url' in data:
-                                    asset_url = data['file_url']
-                                elif 'link' in data:
-                                    asset_url = data['link']
-                                elif 'asset_url' in data:
-                                    asset_url = data['asset_url']
-                                
-                                if asset_url:
-                                    logger.info(f"✅ 图片上传成功，获得URL: {asset_url}")
-                                    
-                                    # 记录完整的返回数据用于调试
-                                    logger.debug(f"🔍 完整的Kook图片返回数据: {data}")
-                                    
-                                    return asset_url
-                                else:
-                                    logger.error(f"❌ 无法从Kook响应中提取图片URL，数据结构: {data}")
-                                    return None
-                            else:
-                                error_msg = result.get('message', '未知错误')
-                                error_code = result.get('code', 'N/A')
-                                logger.error(f"❌ 图片上传失败 (代码: {error_code}): {error_msg}")
-                                return None
-                        else:
-                            response_text = await response.text()
-                            logger.error(f"❌ 图片上传HTTP错误: {response.status}")
-                            logger.error(f"📄 错误详情: {response_text}")
-                            return None
-                            
+                        # 记录完整的返回数据用于调试
+                        logger.debug(f"🔍 完整的Kook图片返回数据: {data}")
+                        
+                        return asset_url
+                    else:
+                        logger.error(f"❌ 无法从Kook响应中提取图片URL，数据结构: {data}")
+                        return None
+                else:
+                    error_msg = result.get('message', '未知错误')
+                    error_code = result.get('code', 'N/A')
+                    logger.error(f"❌ 图片上传失败 (代码: {error_code}): {error_msg}")
+                    return None
+            else:
+                logger.error(f"❌ 图片上传HTTP错误: {status}")
+                logger.error(f"📄 错误详情: {result}")
+                return None
+                
         except Exception as e:
             logger.error(f"❌ 上传图片异常: {e}")
             import traceback
@@ -1354,41 +1373,27 @@ class DiscordToKookForwarder(Star):
     async def _send_image_message_to_kook(self, channel_id: str, image_url: str, filename: str, token: str) -> bool:
         """发送图片消息到Kook频道"""
         try:
-            # 构建消息发送URL和请求头
-            url = "https://www.kookapp.cn/api/v3/message/create"
-            headers = {
-                "Authorization": f"Bot {token}",
-                "Content-Type": "application/json"
-            }
-            payload = {
-                "target_id": channel_id,
-                "content": image_url,
-                "type": 2  # 使用type=2发送图片消息
-            }
-            
             logger.info(f"📡 发送图片消息到频道 {channel_id}")
-            logger.info(f"📄 消息内容: {payload}")
+            logger.info(f"📄 消息内容: {image_url} (type=2)")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=payload) as resp:
-                    logger.info(f"📥 收到图片发送响应，状态码: {resp.status}")
-                    
-                    if resp.status == 200:
-                        result = await resp.json()
-                        logger.info(f"📄 图片发送响应内容: {result}")
-                        
-                        if result.get('code') == 0:
-                            logger.info(f"✅ 发送图片消息成功: {filename}")
-                            return True
-                        else:
-                            error_msg = result.get('message', '未知错误')
-                            logger.error(f"❌ 发送图片消息失败: {error_msg}")
-                            return False
-                    else:
-                        response_text = await resp.text()
-                        logger.error(f"❌ 发送图片消息HTTP错误: {resp.status}")
-                        logger.error(f"📄 错误详情: {response_text}")
-                        return False
+            # 使用type=2发送图片消息
+            status, result = await get_kook_api_client().create_message(channel_id, image_url, 2, token=token)
+            logger.info(f"📥 收到图片发送响应，状态码: {status}")
+            
+            if status == 200:
+                logger.info(f"📄 图片发送响应内容: {result}")
+                
+                if result.get('code') == 0:
+                    logger.info(f"✅ 发送图片消息成功: {filename}")
+                    return True
+                else:
+                    error_msg = result.get('message', '未知错误')
+                    logger.error(f"❌ 发送图片消息失败: {error_msg}")
+                    return False
+            else:
+                logger.error(f"❌ 发送图片消息HTTP错误: {status}")
+                logger.error(f"📄 错误详情: {result}")
+                return False
                         
         except Exception as e:
             logger.error(f"❌ 发送图片消息异常: {e}")
@@ -1441,8 +1446,8 @@ class DiscordToKookForwarder(Star):
                         
                         logger.info(f"✅ 图片下载成功: {local_path}")
                         
-                        # 下载完成后进行清理
-                        await self._cleanup_old_images()
+                        # 登记到本地媒体存储，到期后自动清理
+                        self.media_store.track(local_path, "image")
                         
                         return str(local_path)
                     else:
@@ -1455,47 +1460,6 @@ class DiscordToKookForwarder(Star):
             logger.error(traceback.format_exc())
             return None
 
-    async def _cleanup_old_images(self):
-        """根据配置清理旧图片文件"""
-        import os
-        import time
-        from pathlib import Path
-        
-        try:
-            # 获取清理时间配置（小时）
-            cleanup_hours = self.config.get('image_cleanup_hours', 24)
-            
-            # 如果设置为0，则不清理
-            if cleanup_hours <= 0:
-                return
-                
-            plugin_dir = Path(__file__).parent
-            image_dir = plugin_dir / "public" / "image"
-            
-            if not image_dir.exists():
-                return
-                
-            current_time = time.time()
-            cleanup_count = 0
-            cleanup_seconds = cleanup_hours * 3600  # 转换为秒
-            
-            # 清理超过配置时间的图片文件
-            for image_file in image_dir.glob("*"):
-                if image_file.is_file() and image_file.name != ".gitkeep":
-                    file_age = current_time - image_file.stat().st_mtime
-                    if file_age > cleanup_seconds:
-                        try:
-                            image_file.unlink()
-                            cleanup_count += 1
-                        except Exception as e:
-                            logger.warning(f"⚠️ 删除旧图片文件失败: {image_file} - {e}")
-            
-            if cleanup_count > 0:
-                logger.info(f"🧹 清理了 {cleanup_count} 个超过 {cleanup_hours} 小时的旧图片文件")
-                
-        except Exception as e:
-            logger.error(f"❌ 清理旧图片文件异常: {e}")
-
     @filter.command("translation_config")
     async def translation_config_command(self, event: AstrMessageEvent):
         """配置翻译功能"""
@@ -1604,13 +1568,13 @@ Kook平台状态: {platform_status}
             self._save_config()
             yield event.plain_result(f"🚀 快速测试配置已启用！\n- 转发功能：已启用\n- 转发所有频道：已启用\n- 默认Kook频道：{kook_channel_id}\n- 包含机器人消息：已禁用\n\n现在可以在Discord发送消息进行测试！")
         elif command == "cleanup_images":
-            # 立即清理旧图片文件
-            await self._cleanup_old_images()
-            yield event.plain_result("🧹 图片清理完成")
+            # 立即清理到期的图片文件
+            result = await self.media_store.purge("image")
+            yield event.plain_result(f"🧹 图片清理完成，删除 {result['files']} 个文件")
         elif command == "cleanup_videos":
-            # 立即清理旧视频文件
-            await self._cleanup_old_videos()
-            yield event.plain_result("🧹 视频清理完成")
+            # 立即清理到期的视频文件
+            result = await self.media_store.purge("video")
+            yield event.plain_result(f"🧹 视频清理完成，删除 {result['files']} 个文件")
         elif command == "set_cleanup_hours" and len(args) > 1:
             try:
                 hours = int(args[1])
@@ -1619,6 +1583,7 @@ Kook平台状态: {platform_status}
                 else:
                     self.config["image_cleanup_hours"] = hours
                     self._save_config()
+                    self._apply_media_retention()
                     if hours == 0:
                         yield event.plain_result("✅ 已禁用自动图片清理")
                     else:
@@ -1633,6 +1598,7 @@ Kook平台状态: {platform_status}
                 else:
                     self.config["video_cleanup_hours"] = hours
                     self._save_config()
+                    self._apply_media_retention()
                     if hours == 0:
                         yield event.plain_result("✅ 已禁用自动视频清理")
                     else:
@@ -1644,4 +1610,8 @@ Kook平台状态: {platform_status}
 
     async def terminate(self):
         """插件销毁时的清理工作"""
+        # 关闭共享的KOOK HTTP连接池
+        await close_kook_api_client()
+        self.media_cache.close()
+        await self.media_store.close()
         logger.info("Discord到Kook转发插件已停止")
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+
+class MediaCache:
+    """按内容哈希索引的KOOK媒体地址缓存（SQLite）
+
+    记录 文件SHA-256 -> KOOK资源URL，同一张图片（表情包、贴纸、转发的截图）
+    再次出现时直接引用已上传的URL，不再重复上传。条目按最近使用时间淘汰，
+    超过保留期限的条目视为失效。
+    """
+
+    def __init__(self, db_path="data/media_cache.db", max_entries: int = 5000, max_age_days: int = 30):
+        """
+        初始化媒体缓存
+
+        Args:
+            db_path: SQLite数据库路径
+            max_entries: 最多保留的条目数，超出时淘汰最久未使用的条目
+            max_age_days: 条目保留天数，0表示不过期
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn_lock = threading.Lock()
+        with self._conn_lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS media_cache (
+                    digest TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_media_cache_last_used ON media_cache (last_used)")
+            self._conn.commit()
+
+    @staticmethod
+    def hash_file(file_path) -> str:
+        """计算本地文件的SHA-256"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    async def hash_file_async(self, file_path) -> str:
+        """在线程中计算本地文件的SHA-256，避免大文件阻塞事件循环"""
+        return await asyncio.to_thread(self.hash_file, file_path)
+
+    async def get(self, digest: Optional[str]) -> Optional[str]:
+        """查询内容哈希对应的KOOK资源URL
+
+        Returns:
+            Optional[str]: 命中时返回URL，否则返回None
+        """
+        if not digest:
+            return None
+        try:
+            url = await asyncio.to_thread(self._get, digest, time.time())
+        except Exception as e:
+            print(f"⚠️ 读取媒体缓存失败: {e}")
+            url = None
+        if url:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return url
+
+    async def put(self, digest: Optional[str], url: str, size: int = 0):
+        """记录内容哈希对应的KOOK资源URL"""
+        if not digest or not url:
+            return
+        try:
+            await asyncio.to_thread(self._put, digest, url, size, time.time())
+        except Exception as e:
+            print(f"⚠️ 写入媒体缓存失败: {e}")
+
+    def _get(self, digest: str, now: float) -> Optional[str]:
+        with self._conn_lock:
+            row = self._conn.execute(
+                "SELECT url, created_at FROM media_cache WHERE digest = ?", (digest,)
+            ).fetchone()
+            if row is None:
+                return None
+            url, created_at = row
+            with self._conn:
+                if self.max_age and now - created_at > self.max_age:
+                    self._conn.execute("DELETE FROM media_cache WHERE digest = ?", (digest,))
+                    return None
+                self._conn.execute("UPDATE media_cache SET last_used = ? WHERE digest = ?", (now, digest))
+            return url
+
+    def _put(self, digest: str, url: str, size: int, now: float):
+        with self._conn_lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO media_cache (digest, url, size, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (digest, url, size, now, now)
+                )
+                count = self._conn.execute("SELECT COUNT(*) FROM media_cache").fetchone()[0]
+                if count > self.max_entries:
+                    # 淘汰最久未使用的条目，多删一些避免每次写入都触发淘汰
+                    excess = count - int(self.max_entries * 0.9)
+                    self._conn.execute(
+                        "DELETE FROM media_cache WHERE digest IN "
+                        "(SELECT digest FROM media_cache ORDER BY last_used LIMIT ?)",
+                        (excess,)
+                    )
+
+    def get_stats(self) -> dict:
+        """获取缓存统计信息"""
+        with self._conn_lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM media_cache").fetchone()[0]
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def close(self):
+        """关闭数据库"""
+        with self._conn_lock:
+            self._conn.close()
@@ -0,0 +1,351 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+
+class MediaStore:
+    """本地媒体文件存储管理（SQLite索引）
+
+    文件写入磁盘时登记 路径、类别、大小、最近使用时间和过期时间，
+    由一个定时任务在最近的过期时间醒来删除到期文件；总大小超过磁盘预算时
+    按最近使用时间淘汰最旧的文件。稳态下只查询索引，不需要遍历目录，
+    只在启动时用 reconcile 把索引和磁盘对齐一次。
+    """
+
+    def __init__(self, db_path="data/media_store.db", retention: Optional[Dict[str, float]] = None,
+                 max_bytes: int = 0, batch_size: int = 200):
+        """
+        初始化媒体存储
+
+        Args:
+            db_path: SQLite数据库路径
+            retention: 类别 -> 保留时间（秒），0表示不按时间清理
+            max_bytes: 所有文件合计的磁盘预算（字节），0表示不限制
+            batch_size: 每次最多删除的文件数
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.retention = dict(retention or {})
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn_lock = threading.Lock()
+        with self._conn_lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS media_files (
+                    path TEXT PRIMARY KEY,
+                    category TEXT NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    expires_at REAL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_media_files_expires ON media_files (expires_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_media_files_last_used ON media_files (last_used)")
+            self._conn.commit()
+            # 当前登记的文件总大小，之后增量维护
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM media_files").fetchone()[0]
+
+        self._wake_event: Optional[asyncio.Event] = None
+        self._timer_task: Optional[asyncio.Task] = None
+        # 定时任务当前等待的过期时间
+        self._next_deadline: Optional[float] = None
+
+        # 统计信息
+        self.deleted_files = 0
+        self.deleted_bytes = 0
+        self.evicted_files = 0
+
+    def _expires_at(self, category: str, created_at: float) -> Optional[float]:
+        max_age = self.retention.get(category, 0)
+        return created_at + max_age if max_age > 0 else None
+
+    def track(self, file_path, category: str = "other"):
+        """登记刚写入磁盘的文件
+
+        Args:
+            file_path: 文件路径
+            category: 文件类别（决定保留时间），如 image / video / other
+        """
+        path = Path(file_path)
+        try:
+            size = path.stat().st_size
+        except OSError:
+            return
+        now = time.time()
+        expires_at = self._expires_at(category, now)
+        with self._conn_lock:
+            with self._conn:
+                row = self._conn.execute("SELECT size FROM media_files WHERE path = ?", (str(path),)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO media_files (path, category, size, created_at, last_used, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (str(path), category, size, now, now, expires_at)
+                )
+            self._total_bytes += size - (row[0] if row else 0)
+        # 更早到期或超出磁盘预算时唤醒定时任务
+        if expires_at is not None and (self._next_deadline is None or expires_at < self._next_deadline):
+            self._wake()
+        elif self._over_budget():
+            self._wake()
+
+    def touch(self, file_path):
+        """标记文件刚被使用过（淘汰时最后考虑）"""
+        with self._conn_lock:
+            with self._conn:
+                self._conn.execute("UPDATE media_files SET last_used = ? WHERE path = ?", (time.time(), str(file_path)))
+
+    def set_retention(self, category: str, seconds: float):
+        """修改某类文件的保留时间，已登记的文件按新的保留时间重新计算过期时间"""
+        self.retention[category] = seconds
+        with self._conn_lock:
+            with self._conn:
+                if seconds > 0:
+                    self._conn.execute(
+                        "UPDATE media_files SET expires_at = created_at + ? WHERE category = ?", (seconds, category)
+                    )
+                else:
+                    self._conn.execute("UPDATE media_files SET expires_at = NULL WHERE category = ?", (category,))
+        self._wake()
+
+    def reconcile(self, directories: Dict[Path, str]) -> dict:
+        """启动时把索引和磁盘上的文件对齐
+
+        删除索引中已不存在的文件记录；磁盘上未登记的文件按修改时间补登记。
+        只处理目录下的文件本身，不进入子目录，跳过以点开头的文件（如 .gitkeep）。
+
+        Args:
+            directories: 目录 -> 该目录中文件的类别
+
+        Returns:
+            dict: 对齐结果统计
+        """
+        with self._conn_lock:
+            indexed = {row[0]: row[1] for row in self._conn.execute("SELECT path, size FROM media_files")}
+
+        missing = [path for path in indexed if not Path(path).is_file()]
+        added = []
+        for directory, category in directories.items():
+            if not directory.is_dir():
+                continue
+            for item in directory.iterdir():
+                if item.name.startswith('.') or str(item) in indexed or not item.is_file():
+                    continue
+                stat = item.stat()
+                added.append((str(item), category, stat.st_size, stat.st_mtime, stat.st_mtime,
+                              self._expires_at(category, stat.st_mtime)))
+                indexed[str(item)] = stat.st_size
+
+        with self._conn_lock:
+            with self._conn:
+                if missing:
+                    self._conn.executemany("DELETE FROM media_files WHERE path = ?", [(path,) for path in missing])
+                if added:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO media_files (path, category, size, created_at, last_used, expires_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)", added
+                    )
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM media_files").fetchone()[0]
+        self._wake()
+        return {"removed": len(missing), "added": len(added), "total": len(indexed) - len(missing)}
+
+    def start(self):
+        """启动定时任务（需要在事件循环中调用）"""
+        if self._timer_task is None or self._timer_task.done():
+            self._wake_event = asyncio.Event()
+            self._timer_task = asyncio.create_task(self._run_timer())
+
+    def _wake(self):
+        if self._wake_event is not None:
+            self._wake_event.set()
+
+    def _over_budget(self) -> bool:
+        return self.max_bytes > 0 and self._total_bytes > self.max_bytes
+
+    async def _run_timer(self):
+        """在最近的过期时间或超出磁盘预算时醒来清理文件"""
+        while True:
+            try:
+                self._wake_event.clear()
+                self._next_deadline = self._peek_deadline()
+                if not self._over_budget():
+                    if self._next_deadline is None:
+                        await self._wake_event.wait()
+                        continue
+                    delay = self._next_deadline - time.time()
+                    if delay > 0:
+                        try:
+                            await asyncio.wait_for(self._wake_event.wait(), timeout=delay)
+                            # 有更早到期的文件或超出预算，重新计算
+                            continue
+                        except asyncio.TimeoutError:
+                            pass
+
+                result = await asyncio.to_thread(self.sweep)
+                if result["files"]:
+                    print(f"🗑️ 已清理 {result['files']} 个本地媒体文件，释放 {result['bytes']/1024/1024:.1f}MB")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ 清理本地媒体文件失败: {e}")
+                await asyncio.sleep(60)
+
+    def _peek_deadline(self) -> Optional[float]:
+        with self._conn_lock:
+            row = self._conn.execute("SELECT MIN(expires_at) FROM media_files").fetchone()
+        return row[0] if row else None
+
+    def sweep(self, now: Optional[float] = None, category: Optional[str] = None) -> dict:
+        """删除已到期的文件，并在超出磁盘预算时按最近使用时间淘汰文件
+
+        Args:
+            now: 当前时间，为空时使用 time.time()
+            category: 只清理该类别（image/video/other）的到期文件，此时不做磁盘预算淘汰
+                （淘汰按最近使用时间跨类别进行）
+
+        Returns:
+            dict: 删除的文件数和释放的字节数
+        """
+        now = time.time() if now is None else now
+        files = 0
+        freed = 0
+
+        while True:
+            with self._conn_lock:
+                if category is None:
+                    rows = self._conn.execute(
+                        "SELECT path, size FROM media_files WHERE expires_at <= ? ORDER BY expires_at LIMIT ?",
+                        (now, self.batch_size)
+                    ).fetchall()
+                else:
+                    rows = self._conn.execute(
+                        "SELECT path, size FROM media_files WHERE expires_at <= ? AND category = ? "
+                        "ORDER BY expires_at LIMIT ?",
+                        (now, category, self.batch_size)
+                    ).fetchall()
+            if not rows:
+                break
+            count, size = self._delete(rows)
+            files += count
+            freed += size
+
+        while category is None and self._over_budget():
+            with self._conn_lock:
+                rows = self._conn.execute(
+                    "SELECT path, size FROM media_files ORDER BY last_used LIMIT ?", (self.batch_size,)
+                ).fetchall()
+            if not rows:
+                break
+            # 只淘汰到预算以内
+            excess = self._total_bytes - self.max_bytes
+            selected = []
+            for path, size in rows:
+                if excess <= 0:
+                    break
+                selected.append((path, size))
+                excess -= size
+            count, size = self._delete(selected)
+            files += count
+            freed += size
+            self.evicted_files += count
+
+        return {"files": files, "bytes": freed}
+
+    def _delete(self, rows: List[Tuple[str, int]]) -> Tuple[int, int]:
+        """删除文件及其索引记录，返回实际删除的文件数和字节数"""
+        files = 0
+        freed = 0
+        for path, size in rows:
+            try:
+                Path(path).unlink(missing_ok=True)
+                files += 1
+                freed += size
+            except Exception as e:
+                # 删除失败的文件同样移出索引，避免反复重试
+                print(f"❌ 删除本地媒体文件失败 {path}: {e}")
+
+        if rows:
+            with self._conn_lock:
+                with self._conn:
+                    self._conn.executemany("DELETE FROM media_files WHERE path = ?", [(path,) for path, _ in rows])
+                self._total_bytes -= sum(size for _, size in rows)
+        self.deleted_files += files
+        self.deleted_bytes += freed
+        return files, freed
+
+    async def purge(self, category: Optional[str] = None) -> dict:
+        """立即执行一次清理
+
+        Args:
+            category: 只清理该类别的到期文件，为空时清理全部类别并按磁盘预算淘汰
+        """
+        return await asyncio.to_thread(self.sweep, None, category)
+
+    def get_stats(self) -> dict:
+        """获取存储统计信息"""
+        with self._conn_lock:
+            files = self._conn.execute("SELECT COUNT(*) FROM media_files").fetchone()[0]
+        return {
+            "files": files,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "next_deadline": self._next_deadline,
+            "deleted_files": self.deleted_files,
+            "deleted_bytes": self.deleted_bytes,
+            "evicted_files": self.evicted_files
+        }
+
+    async def close(self):
+        """停止定时任务并关闭数据库"""
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+            await asyncio.gather(self._timer_task, return_exceptions=True)
+            self._timer_task = None
+        with self._conn_lock:
+            self._conn.close()
+
+
+_media_store: Optional[MediaStore] = None
+
+
+def get_media_store(settings=None) -> MediaStore:
+    """
+    获取全局共享的媒体存储，首次调用时根据配置创建
+
+    Args:
+        settings: 机器人配置（提供 media_store_path、*_cleanup_hours、media_disk_budget_mb），
+            为空时读取环境变量
+    """
+    global _media_store
+    if _media_store is None and settings is not None:
+        _media_store = MediaStore(
+            db_path=settings.media_store_path,
+            retention={
+                "image": settings.image_cleanup_hours * 3600,
+                "video": settings.video_cleanup_hours * 3600,
+                "other": settings.other_cleanup_hours * 3600
+            },
+            max_bytes=int(settings.media_disk_budget_mb * 1024 * 1024)
+        )
+    elif _media_store is None:
+        load_dotenv()
+        _media_store = MediaStore(
+            db_path=os.getenv("MEDIA_STORE_PATH", "data/media_store.db"),
+            retention={
+                "image": float(os.getenv("IMAGE_CLEANUP_HOURS", "24")) * 3600,
+                "video": float(os.getenv("VIDEO_CLEANUP_HOURS", "12")) * 3600,
+                "other": float(os.getenv("OTHER_CLEANUP_HOURS", "6")) * 3600
+            },
+            max_bytes=int(float(os.getenv("MEDIA_DISK_BUDGET_MB", "2048")) * 1024 * 1024)
+        )
+    return _media_store
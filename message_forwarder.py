@@ -1,21 +1,117 @@
 import asyncio
 import aiohttp
+import contextlib
+import hashlib
+import io
+import json
 import os
 import time
 from pathlib import Path
-from typing import Optional, List
+from typing import AsyncIterator, Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple, Union
 import discord
 from khl import Bot as KookBot
 from forward_config import ForwardConfig
+from forward_queue import ForwardQueue
+from outbox import MSG_TYPE_FORWARD, Outbox
+from media_cache import MediaCache
+from kook_channel_cache import KookChannelCache
+from media_store import get_media_store
+from settings import Settings, add_reload_listener, get_settings, remove_reload_listener
+from config_watcher import ConfigWatcher
+from kook_api_client import get_kook_api_client
 from translator import Translator
 
+# KOOK上传文件大小限制
+KOOK_UPLOAD_LIMIT = 20 * 1024 * 1024
+# KOOK卡片消息限制：单个图片组最多9张图片，单张卡片最多50个模块，单条消息最多5张卡片
+KOOK_IMAGE_GROUP_LIMIT = 9
+KOOK_CARD_MODULE_LIMIT = 50
+KOOK_CARDS_PER_MESSAGE = 5
+# 一条图片组卡片消息最多容纳的图片数（首张卡片的标题占用的模块不计入图片模块）
+KOOK_IMAGES_PER_MESSAGE = KOOK_IMAGE_GROUP_LIMIT * (KOOK_CARD_MODULE_LIMIT - 1) * KOOK_CARDS_PER_MESSAGE
+# 转发任务中文字部分的键，附件部分的键为 attachment:<附件ID>
+TEXT_PART_KEY = "text"
+# 转发任务暂时发送失败时的首次重试间隔（秒），之后逐次翻倍，最长为发件箱重试间隔
+FORWARD_RETRY_INITIAL_DELAY = 2
+
+
+class _KookPart(NamedTuple):
+    """转发任务中的一条KOOK消息"""
+    msg_type: int  # 1文本 10卡片
+    content: str  # 文本内容或卡片JSON
+    description: str = "文字消息"  # 日志中使用的消息描述
+    fallback_text: Optional[str] = None  # 卡片被拒绝时回退发送的文本
+    keys: Tuple[str, ...] = ()  # 这条消息包含的文字/附件的键，与附件下载结果、相册分组无关
+
+
+class _SharedParts:
+    """一条Discord消息构建出的KOOK消息，由所有目标频道的转发任务共享
+
+    第一个开始读取的任务启动构建，翻译和附件下载上传只进行一次；构建出的消息缓存下来，
+    各频道按自己的进度读取，不必等全部附件上传完成。构建出错时所有读取方收到同一个异常。
+    """
+
+    def __init__(self, build: Callable[[], AsyncIterator[_KookPart]]):
+        self._build = build
+        self._parts: List[_KookPart] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        try:
+            async with contextlib.aclosing(self._build()) as parts:
+                async for part in parts:
+                    self._parts.append(part)
+                    self._notify()
+        except asyncio.CancelledError:
+            self._error = RuntimeError("消息构建已取消")
+            raise
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done = True
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def parts(self) -> AsyncIterator[_KookPart]:
+        """按顺序读取构建出的KOOK消息"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        index = 0
+        while True:
+            if index < len(self._parts):
+                yield self._parts[index]
+                index += 1
+            elif self._error is not None:
+                raise self._error
+            elif self._done:
+                return
+            else:
+                await self._changed.wait()
+
 class MessageForwarder:
     """消息转发器类"""
     
-    def __init__(self, kook_bot: KookBot):
+    def __init__(self, kook_bot: KookBot, settings: Optional[Settings] = None):
+        """
+        初始化消息转发器
+        
+        Args:
+            kook_bot: KOOK机器人
+            settings: 机器人配置，为空时使用全局共享的配置（启动时只读取一次）
+        """
+        settings = settings or get_settings()
         self.kook_bot = kook_bot
-        self.config = ForwardConfig()
-        self.download_dir = Path("downloads")
+        self.kook_api = get_kook_api_client()
+        # 优先复用KOOK机器人上的频道缓存（已监听频道变更事件）
+        self.channel_cache = getattr(kook_bot, 'channel_cache', None) or KookChannelCache(kook_bot)
+        self.config = ForwardConfig(settings)
+        self.download_dir = Path(settings.download_dir)
         self.download_dir.mkdir(exist_ok=True)
         
         # 确保子目录存在
@@ -23,8 +119,119 @@ class MessageForwarder:
         (self.download_dir / "videos").mkdir(exist_ok=True)
         
         # 初始化翻译器
-        self.translator = Translator()
+        self.translator = Translator(settings)
+        
+        # 按KOOK目标频道划分的有序转发队列
+        self.queue = ForwardQueue(
+            max_workers=self.config.forward_workers,
+            max_queue_size=self.config.forward_queue_size
+        )
+        
+        # 转发消息的预写发件箱，KOOK不可用或进程重启时不丢消息
+        self.outbox = Outbox(self.config.outbox_path)
+        self._outbox_task = None
+        
+        # 内容哈希 -> KOOK资源URL，重复的媒体不再重复上传
+        self.media_cache = MediaCache(self.config.media_cache_path)
+        
+        # 本地媒体存储，按保留时间和磁盘预算统一清理落盘文件
+        self.media_store = get_media_store(settings)
+        
+        # 配置文件监视器，.env或规则文件变化时在线程中解析校验，再回到事件循环中替换配置
+        self.config_watcher = ConfigWatcher(
+            [Path('.env'), Path(self.config.forward_rules_file)],
+            self.config.load_snapshot,
+            interval=self.config.config_watch_interval,
+            apply=self.config.apply_snapshot
+        )
+        
+        # 全局附件下载上传并发上限（所有消息共享）
+        self._attachment_semaphore = asyncio.Semaphore(self.config.attachment_workers)
+        
+        # 下载Discord附件共用的HTTP会话，首次下载时创建
+        self._download_session: Optional[aiohttp.ClientSession] = None
+        
+        # 配置重新加载后更新翻译器和媒体保留时间（转发配置由ForwardConfig自己应用）
+        self._settings = settings
+        add_reload_listener(self._on_settings_reload)
+        
+    def _resolve_targets(self, discord_message: discord.Message) -> List[str]:
+        """按转发规则表计算消息需要转发到的KOOK频道
+        
+        Args:
+            discord_message: Discord消息对象
+            
+        Returns:
+            List[str]: 目标KOOK频道ID列表，不需要转发时为空
+        """
+        author = discord_message.author
+        return self.config.get_kook_channel_ids(
+            str(discord_message.channel.id),
+            guild_id=str(discord_message.guild.id) if discord_message.guild else None,
+            author_id=str(author.id),
+            # 只有服务器成员（Member）才有身份组
+            role_ids=[str(role.id) for role in getattr(author, 'roles', ())],
+            is_bot=author.bot,
+            content=discord_message.content
+        )
+    
+    def _snapshot_message(self, discord_message: discord.Message) -> dict:
+        """提取转发需要的消息内容，登记到发件箱后不依赖Discord对象即可重放
+        
+        Args:
+            discord_message: Discord消息对象
+            
+        Returns:
+            dict: 消息快照（可序列化为JSON）
+        """
+        return {
+            "message_id": str(discord_message.id),
+            "author": discord_message.author.display_name,
+            "content": discord_message.content,
+            "attachments": [
+                {
+                    "id": str(attachment.id),
+                    "filename": attachment.filename,
+                    "url": attachment.url,
+                    "size": attachment.size,
+                    "content_type": attachment.content_type
+                }
+                for attachment in discord_message.attachments
+            ]
+        }
+    
+    async def enqueue_message(self, discord_message: discord.Message) -> bool:
+        """将Discord消息加入每个目标KOOK频道的转发队列，不等待转发完成
+        
+        每个（消息，目标频道）转发任务在入队前先登记到发件箱，文字和附件全部发送到KOOK后才确认；
+        KOOK暂时不可用时任务在队列中退避重试，同一频道后面的消息继续等待；
+        队列中尚未执行或发送到一半的任务在进程重启后从发件箱补发。
+        
+        Args:
+            discord_message: Discord消息对象
+            
+        Returns:
+            bool: 是否已加入转发队列
+        """
+        kook_channel_ids = self._resolve_targets(discord_message)
+        if not kook_channel_ids:
+            return False
         
+        snapshot = self._snapshot_message(discord_message)
+        payload = json.dumps(snapshot, ensure_ascii=False)
+        created_at = time.time()
+        # 所有目标频道共享同一次构建（翻译、附件上传）
+        parts = _SharedParts(lambda: self._build_kook_parts(snapshot))
+        for kook_channel_id in kook_channel_ids:
+            entry_id = self.outbox.add(kook_channel_id, payload, MSG_TYPE_FORWARD)
+            await self.queue.submit(
+                kook_channel_id,
+                lambda entry_id=entry_id, kook_channel_id=kook_channel_id: self._run_forward_job(
+                    entry_id, kook_channel_id, parts, created_at=created_at
+                )
+            )
+        return True
+    
     async def forward_message(self, discord_message: discord.Message) -> bool:
         """转发Discord消息到KOOK
         
@@ -32,68 +239,143 @@ class MessageForwarder:
             discord_message: Discord消息对象
             
         Returns:
-            bool: 是否成功转发
+            bool: 是否成功转发到至少一个KOOK频道
         """
         try:
-            # 检查是否应该转发此消息
-            if not self.config.should_forward_message(discord_message.author.bot):
+            kook_channel_ids = self._resolve_targets(discord_message)
+            if not kook_channel_ids:
                 return False
             
-            # 获取目标KOOK频道ID
-            kook_channel_id = self.config.get_kook_channel_id(str(discord_message.channel.id))
-            if not kook_channel_id:
-                return False
-            
-            print(f"🔄 正在转发消息到KOOK频道 {kook_channel_id}")
+            snapshot = self._snapshot_message(discord_message)
+            payload = json.dumps(snapshot, ensure_ascii=False)
+            parts = _SharedParts(lambda: self._build_kook_parts(snapshot))
+            # 不经过转发队列，暂时失败时不在这里等待重试，留给发件箱补发
+            results = await asyncio.gather(*(
+                self._run_forward_job(
+                    self.outbox.add(kook_channel_id, payload, MSG_TYPE_FORWARD), kook_channel_id, parts,
+                    retry=False
+                )
+                for kook_channel_id in kook_channel_ids
+            ))
+            return any(results)
             
-            # 构建转发消息
-            forwarded_content = await self._build_forward_message(discord_message)
+        except Exception as e:
+            print(f"转发消息失败: {e}")
+            return False
+    
+    async def _run_forward_job(self, entry_id: str, kook_channel_id: str, shared: _SharedParts,
+                               sent: Iterable[str] = (), created_at: Optional[float] = None,
+                               retry: bool = True) -> bool:
+        """执行一个转发任务：把构建好的KOOK消息按顺序发送到指定的KOOK频道
+        
+        每发送一条消息就在发件箱中记录它包含的文字/附件的键，全部发送后确认。暂时失败时在任务内退避重试，
+        直到发送成功、被KOOK拒绝或消息过期；重试期间任务一直占着该频道的队列，
+        后面的消息不会抢先发出。
+        
+        Args:
+            entry_id: 发件箱条目ID
+            kook_channel_id: KOOK频道ID
+            shared: 消息构建出的KOOK消息（各目标频道共享）
+            sent: 之前的尝试中已发送部分的键，包含的键都已发送的消息会被跳过
+            created_at: 消息登记时间，用于判断是否过期，为空时从现在算起
+            retry: 暂时失败时是否在任务内重试（只能在转发队列中执行的任务使用）；
+                为False时保留在发件箱中，由重放补发
             
-            # 尝试直接通过KOOK机器人发送消息
-            success = False
-            if forwarded_content:
-                try:
-                    # 尝试获取频道对象
-                    channel = await self.kook_bot.client.fetch_public_channel(kook_channel_id)
-                    if channel:
-                        await channel.send(forwarded_content)
-                        print(f"✅ 直接通过KOOK机器人发送消息成功: {forwarded_content[:50]}...")
-                        success = True
-                except Exception as e:
-                    print(f"⚠️ 直接通过KOOK机器人发送消息失败，尝试API方法: {e}")
-                    # 如果直接发送失败，使用API方法
-                    await self._send_text_message(kook_channel_id, forwarded_content)
-                    success = True
+        Returns:
+            bool: 是否成功转发
+        """
+        if created_at is None:
+            created_at = time.time()
+        sent = set(sent)
+        success = False
+        try:
+            print(f"🔄 正在转发消息到KOOK频道 {kook_channel_id}")
             
-            # 处理附件（图片、视频等）
-            # 注意：main.py中的AstrMessageEvent处理器也会处理视频附件，这里跳过视频处理以避免重复发送
-            if discord_message.attachments:
-                await self._forward_attachments(discord_message, kook_channel_id)
-                success = True
+            async with contextlib.aclosing(shared.parts()) as parts:
+                async for part in parts:
+                    if part.keys and sent.issuperset(part.keys):
+                        # 之前的尝试中已发送
+                        continue
+                    
+                    result = await self._send_part(kook_channel_id, part)
+                    delay = FORWARD_RETRY_INITIAL_DELAY
+                    while result is None:
+                        if not retry:
+                            self.outbox.release(entry_id)
+                            print(f"⏳ 暂时无法发送消息到KOOK频道 {kook_channel_id}，已保留在发件箱中稍后重试")
+                            return success
+                        if time.time() - created_at > self.config.outbox_max_age_hours * 3600:
+                            # 过期消息不再补发
+                            self.outbox.ack(entry_id)
+                            print(f"🗑️ 消息已过期，放弃转发到KOOK频道 {kook_channel_id}")
+                            return success
+                        print(f"⏳ 暂时无法发送消息到KOOK频道 {kook_channel_id}，{delay}秒后重试")
+                        # 等待期间让出全局并发名额，其他频道继续转发
+                        async with self.queue.pause():
+                            await asyncio.sleep(delay)
+                        delay = min(delay * 2, max(self.config.outbox_retry_interval, FORWARD_RETRY_INITIAL_DELAY))
+                        result = await self._send_part(kook_channel_id, part)
+                    # 被KOOK拒绝的消息（权限、参数等）重放也不会成功，同样记为已发送
+                    success = success or result
+                    sent.update(part.keys)
+                    self.outbox.advance(entry_id, sent)
             
+            self.outbox.ack(entry_id)
             return success
             
         except Exception as e:
+            self.outbox.release(entry_id)
             print(f"转发消息失败: {e}")
             return False
     
-    async def _build_forward_message(self, discord_message: discord.Message) -> str:
+    async def _build_kook_parts(self, snapshot: dict, sent: FrozenSet[str] = frozenset()) -> AsyncIterator[_KookPart]:
+        """把消息快照转换为依次发送的KOOK消息：先发送文字，再按原始顺序发送附件
+        
+        Args:
+            snapshot: 消息快照
+            sent: 之前的尝试中已发送部分的键，这些文字/附件不再构建（不再翻译、下载上传）
+            
+        Yields:
+            _KookPart: 一条KOOK消息
+        """
+        # 构建转发消息
+        if TEXT_PART_KEY not in sent:
+            forwarded_content = await self._build_forward_message(snapshot)
+            if forwarded_content:
+                yield _KookPart(1, forwarded_content, keys=(TEXT_PART_KEY,))
+        
+        # 处理附件（图片、视频等）
+        # 注意：main.py中的AstrMessageEvent处理器也会处理视频附件，这里跳过视频处理以避免重复发送
+        attachments = [
+            attachment for attachment in snapshot["attachments"]
+            if self._attachment_key(attachment) not in sent
+        ]
+        if attachments:
+            async with contextlib.aclosing(self._build_attachment_parts(attachments)) as parts:
+                async for part in parts:
+                    yield part
+    
+    def _attachment_key(self, attachment: dict) -> str:
+        """附件部分在转发任务中的键"""
+        return f"attachment:{attachment['id']}"
+    
+    async def _build_forward_message(self, snapshot: dict) -> str:
         """构建转发消息内容
         
         Args:
-            discord_message: Discord消息对象
+            snapshot: 消息快照
             
         Returns:
             str: 格式化后的消息内容
         """
-        author_name = discord_message.author.display_name
-        content = discord_message.content
+        author_name = snapshot["author"]
+        content = snapshot["content"]
         
         # 构建消息前缀
         prefix = self.config.message_prefix
         
         # 如果消息为空但有附件，添加提示
-        if not content and discord_message.attachments:
+        if not content and snapshot["attachments"]:
             content = "[发送了附件]"
         
         # 翻译消息内容（如果启用了翻译功能）
@@ -133,251 +415,426 @@ class MessageForwarder:
         
         return ""
     
-    async def _send_text_message(self, kook_channel_id: str, content: str):
+    async def _send_part(self, kook_channel_id: str, part: _KookPart) -> Optional[bool]:
+        """发送转发任务中的一条KOOK消息
+        
+        Returns:
+            Optional[bool]: True表示发送成功；False表示被KOOK拒绝；None表示暂时失败，可以稍后重试
+        """
+        if part.msg_type == 10:
+            return await self._send_card_message(kook_channel_id, part.content, part.description, part.fallback_text)
+        return await self._send_text_message(kook_channel_id, part.content)
+    
+    async def _send_text_message(self, kook_channel_id: str, content: str) -> Optional[bool]:
         """发送文字消息到KOOK频道
         
         Args:
             kook_channel_id: KOOK频道ID
             content: 消息内容
+            
+        Returns:
+            Optional[bool]: True表示发送成功；False表示被KOOK拒绝；None表示暂时失败，可以稍后重试
         """
+        # 尝试使用kook_bot对象发送消息（频道对象来自缓存，稳定状态下只有一次发送请求）
         try:
-            # 尝试使用kook_bot对象发送消息
+            channel = await self.channel_cache.get(kook_channel_id)
+            if channel:
+                await channel.send(content)
+                print(f"✅ 使用kook_bot对象发送消息成功: {content[:50]}...")
+                return True
+        except Exception as e:
+            # 频道对象可能已失效，下次重新获取
+            self.channel_cache.invalidate(kook_channel_id)
+            print(f"⚠️ 使用kook_bot对象发送消息失败，尝试直接API调用: {e}")
+        
+        # 直接使用API发送消息（1表示文本消息）
+        # 限速由KOOK API客户端按桶排队处理，这里只对暂时性错误重试
+        max_retries = 3
+        result = None
+        for attempt in range(max_retries):
+            result = await self._send_api_message(kook_channel_id, content, 1)
+            if result is not None:
+                break
+            print(f"⚠️ 尝试 {attempt+1}/{max_retries}: 发送文字消息到KOOK暂时失败")
+            if attempt < max_retries - 1:
+                await asyncio.sleep(1)  # 等待1秒后重试
+        
+        if result:
+            print(f"✅ 消息已通过API转发到KOOK频道 {kook_channel_id}: {content[:50]}...")
+        return result
+    
+    async def _send_api_message(self, kook_channel_id: str, content: str, msg_type: int) -> Optional[bool]:
+        """通过KOOK API发送一条消息
+        
+        Args:
+            kook_channel_id: KOOK频道ID
+            content: 消息内容
+            msg_type: 消息类型，1文本 10卡片
+            
+        Returns:
+            Optional[bool]: True表示KOOK返回code 0；False表示被KOOK拒绝，重试无意义；
+                None表示暂时失败（网络异常、限速、服务端错误），可以稍后重试
+        """
+        try:
+            status, resp_json = await self.kook_api.create_message(kook_channel_id, content, msg_type)
+        except Exception as e:
+            print(f"⚠️ KOOK API请求异常: {e}")
+            return None
+        
+        if status == 200 and resp_json.get('code') == 0:
+            return True
+        
+        print(f"❌ 发送消息到KOOK失败 (HTTP {status}): {resp_json}")
+        if status == 429 or status >= 500:
+            return None
+        return False
+    
+    def start_outbox(self):
+        """启动发件箱刷盘和重放任务（重复调用无副作用）"""
+        if self._outbox_task is None or self._outbox_task.done():
+            self.outbox.start()
+            self._outbox_task = asyncio.create_task(self._run_outbox_replay())
+            print(f"📮 发件箱已启动，待重放消息: {self.outbox.count()} 条")
+    
+    async def _run_outbox_replay(self):
+        """启动时重放发件箱，之后定期重试未确认的消息"""
+        while True:
             try:
-                channel = await self.kook_bot.client.fetch_public_channel(kook_channel_id)
-                if channel:
-                    await channel.send(content)
-                    print(f"✅ 使用kook_bot对象发送消息成功: {content[:50]}...")
-                    return
+                await self.replay_outbox()
             except Exception as e:
-                print(f"⚠️ 使用kook_bot对象发送消息失败，尝试直接API调用: {e}")
-            
-            # 直接使用API发送消息
-            import aiohttp
-            import os
-            from dotenv import load_dotenv
-            
-            # 加载环境变量获取token
-            load_dotenv()
-            token = os.getenv('KOOK_BOT_TOKEN')
-            
-            # 构建API请求
-            url = "https://www.kookapp.cn/api/v3/message/create"
-            headers = {
-                "Authorization": f"Bot {token}",
-                "Content-Type": "application/json"
-            }
-            data = {
-                "target_id": kook_channel_id,
-                "content": content,
-                "type": 1  # 1表示文本消息
-            }
+                print(f"❌ 重放发件箱失败: {e}")
+            await asyncio.sleep(self.config.outbox_retry_interval)
+    
+    async def replay_outbox(self):
+        """把发件箱中未确认的转发任务重新提交到对应频道的转发队列
+        
+        重放的任务排在各频道新提交的任务之前，较早的消息仍然先发出。
+        """
+        max_age = self.config.outbox_max_age_hours * 3600
+        now = time.time()
+        entries = await self.outbox.claim_pending()
+        # 同一条消息、已发送部分相同的多个目标频道共享一次构建
+        shared: Dict[Tuple[str, Tuple[str, ...]], _SharedParts] = {}
+        for entry in entries:
+            if now - entry["created_at"] > max_age:
+                # 过期消息不再补发
+                self.outbox.ack(entry["id"])
+                print(f"🗑️ 发件箱消息已过期，放弃补发到KOOK频道 {entry['target_id']}")
+                continue
             
-            # 发送请求并添加重试机制
-            max_retries = 3
-            for attempt in range(max_retries):
+            if entry["msg_type"] != MSG_TYPE_FORWARD:
+                # 旧版本登记的单条KOOK消息
+                await self.queue.submit(entry["target_id"], lambda entry=entry: self._replay_entry(entry), front=True)
+                continue
+            
+            # 转发任务：从消息快照重新构建，跳过已发送的部分
+            sent = frozenset(entry["sent"])
+            key = (entry["content"], tuple(sorted(sent)))
+            parts = shared.get(key)
+            if parts is None:
                 try:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.post(url, headers=headers, json=data) as response:
-                            resp_json = await response.json()
-                            if response.status == 200:
-                                print(f"✅ 消息已通过API转发到KOOK频道 {kook_channel_id}: {content[:50]}...")
-                                print(f"✅ API响应: {resp_json}")
-                                return
-                            else:
-                                print(f"⚠️ 尝试 {attempt+1}/{max_retries}: 发送文字消息到KOOK失败: {resp_json}")
-                                if attempt < max_retries - 1:
-                                    await asyncio.sleep(1)  # 等待1秒后重试
-                except Exception as inner_e:
-                    print(f"⚠️ 尝试 {attempt+1}/{max_retries}: API请求异常: {inner_e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(1)  # 等待1秒后重试
-            
-            print(f"❌ 所有尝试都失败，无法发送消息到KOOK频道 {kook_channel_id}")
-        except Exception as e:
-            print(f"❌ 发送文字消息到KOOK失败: {e}")
+                    snapshot = json.loads(entry["content"])
+                except ValueError as e:
+                    self.outbox.ack(entry["id"])
+                    print(f"❌ 发件箱中的转发任务无法解析，已丢弃: {e}")
+                    continue
+                parts = _SharedParts(lambda snapshot=snapshot, sent=sent: self._build_kook_parts(snapshot, sent))
+                shared[key] = parts
+            await self.queue.submit(
+                entry["target_id"],
+                lambda entry=entry, parts=parts, sent=sent: self._run_forward_job(
+                    entry["id"], entry["target_id"], parts, sent, entry["created_at"]
+                ),
+                front=True
+            )
+        if entries:
+            print(f"📮 已从发件箱重新提交 {len(entries)} 条消息")
+    
+    async def _replay_entry(self, entry: dict):
+        """补发一条旧版本登记的单条KOOK消息"""
+        result = await self._send_api_message(entry["target_id"], entry["content"], entry["msg_type"])
+        if result is None:
+            self.outbox.release(entry["id"])
+        else:
+            self.outbox.ack(entry["id"])
+            if result:
+                print(f"✅ 已补发发件箱消息到KOOK频道 {entry['target_id']}: {entry['content'][:50]}...")
     
-    async def _forward_attachments(self, discord_message: discord.Message, kook_channel_id: str):
-        """转发附件到KOOK
+    async def _build_attachment_parts(self, attachments: List[dict]) -> AsyncIterator[_KookPart]:
+        """把附件转换为KOOK消息
+        
+        各附件的下载和上传并发进行（受单条消息和全局并发上限约束），
+        生成的KOOK消息仍按附件原始顺序排列。
         
         Args:
-            discord_message: Discord消息对象
-            kook_channel_id: KOOK频道ID
+            attachments: 消息快照中的附件列表
+            
+        Yields:
+            _KookPart: 一条KOOK消息
         """
-        for attachment in discord_message.attachments:
-            try:
-                # 检查是否为视频文件，如果是则跳过（由main.py处理）
-                file_ext = os.path.splitext(attachment.filename)[1].lower()
-                video_extensions = {'.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.mkv', '.m4v'}
+        video_extensions = {'.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.mkv', '.m4v'}
+        forwarded = []
+        for attachment in attachments:
+            # 检查是否为视频文件，如果是则跳过（由main.py处理）
+            file_ext = os.path.splitext(attachment["filename"])[1].lower()
+            if file_ext in video_extensions:
+                print(f"⏩ 跳过视频文件 {attachment['filename']}，将由主处理器处理")
+                continue
+            forwarded.append(attachment)
+        
+        if not forwarded:
+            return
+        
+        message_semaphore = asyncio.Semaphore(self.config.attachment_concurrency)
+        
+        async def prepare(attachment: dict):
+            async with message_semaphore, self._attachment_semaphore:
+                return await self._prepare_attachment(attachment)
+        
+        tasks = [asyncio.create_task(prepare(attachment)) for attachment in forwarded]
+        # 相册模式：连续的图片合并为一条图片组卡片消息
+        album: List[Tuple[str, str, str]] = []
+        try:
+            # 按原始顺序等待，后面的附件在前面的消息发送期间继续下载上传
+            for attachment, task in zip(forwarded, tasks):
+                filename = attachment["filename"]
+                key = self._attachment_key(attachment)
+                try:
+                    file_url, notice = await task
+                except Exception as e:
+                    print(f"❌ 转发附件失败 {filename}: {e}")
+                    continue
                 
-                if file_ext in video_extensions:
-                    print(f"⏩ 跳过视频文件 {attachment.filename}，将由主处理器处理")
+                if file_url and self.config.album_mode and self._is_image_file(Path(filename)):
+                    album.append((file_url, filename, key))
                     continue
                 
-                # 下载附件
-                file_path = await self._download_attachment(attachment)
-                if file_path:
-                    # 发送到KOOK
-                    await self._send_file_to_kook(kook_channel_id, file_path, attachment.filename)
-                    
-                    # 清理本地文件（可选，根据配置决定）
-                    await self._schedule_file_cleanup(file_path, attachment.content_type)
-                    
-            except Exception as e:
-                print(f"❌ 转发附件失败 {attachment.filename}: {e}")
+                if album:
+                    for part in self._build_image_album(album):
+                        yield part
+                    album = []
+                if file_url:
+                    part = self._build_uploaded_file(file_url, filename, self._is_video_file(Path(filename)))
+                    yield part._replace(keys=(key,))
+                elif notice:
+                    yield _KookPart(1, notice, keys=(key,))
+            
+            if album:
+                for part in self._build_image_album(album):
+                    yield part
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
     
-    async def _download_attachment(self, attachment: discord.Attachment) -> Optional[Path]:
-        """下载Discord附件到本地
+    async def _prepare_attachment(self, attachment: dict) -> Tuple[Optional[str], Optional[str]]:
+        """下载附件并上传到KOOK，不发送消息
         
         Args:
-            attachment: Discord附件对象
+            attachment: 消息快照中的附件
             
         Returns:
-            Optional[Path]: 下载的文件路径，失败返回None
+            Tuple[Optional[str], Optional[str]]: (KOOK资源URL, 无法上传时发送的提示文本)
         """
+        # 超过KOOK上传限制的文件不必下载
+        if attachment["size"] and attachment["size"] > KOOK_UPLOAD_LIMIT:
+            print(f"⚠️ 文件过大 {attachment['size']/1024/1024:.2f}MB，将发送文本通知")
+            return None, f"{self.config.message_prefix} 文件过大(>20MB): {attachment['filename']}"
+        
+        # 下载附件（小文件留在内存中，大文件落盘），同时计算内容哈希
+        downloaded = await self._download_attachment(attachment)
+        if downloaded is None:
+            return None, None
+        
+        media, digest = downloaded
         try:
-            # 根据文件类型选择存储目录
-            content_type = attachment.content_type or ""
-            if content_type.startswith("image/"):
-                # 图片存储在images子目录
-                target_dir = self.download_dir / "images"
-            elif content_type.startswith("video/"):
-                # 视频存储在videos子目录
-                target_dir = self.download_dir / "videos"
-            else:
-                # 其他文件存储在下载根目录
-                target_dir = self.download_dir
+            return await self._upload_file_to_kook(media, attachment["filename"], digest)
+        finally:
+            # 清理本地文件（仅落盘的大文件需要）
+            if isinstance(media, Path):
+                await self._schedule_file_cleanup(media, attachment["content_type"])
+    
+    def _get_download_session(self) -> aiohttp.ClientSession:
+        """获取下载Discord附件共用的HTTP会话（复用连接），不存在或已关闭时创建"""
+        if self._download_session is None or self._download_session.closed:
+            timeout = aiohttp.ClientTimeout(total=30)  # 30秒超时
+            self._download_session = aiohttp.ClientSession(timeout=timeout)
+        return self._download_session
+    
+    async def _download_attachment(self, attachment: dict) -> Optional[Tuple[Union[io.BytesIO, Path], str]]:
+        """下载Discord附件
+        
+        不超过内存缓冲上限的附件直接保存在内存中上传，不产生临时文件；
+        超过上限时把已缓冲的内容写入本地文件，继续边下载边写盘（文件读写在线程中执行，不阻塞事件循环）。
+        下载的同时计算内容的SHA-256，用于媒体缓存去重。
+        
+        Args:
+            attachment: 消息快照中的附件
             
-            # 确保目标目录存在
-            target_dir.mkdir(exist_ok=True)
+        Returns:
+            Optional[Tuple[Union[io.BytesIO, Path], str]]: (内存缓冲或下载的文件路径, 内容哈希)，失败返回None
+        """
+        memory_limit = self.config.media_memory_limit
+        file_path = None
+        try:
+            # 下载文件
+            async with self._get_download_session().get(attachment["url"]) as response:
+                if response.status != 200:
+                    print(f"❌ 下载附件失败，HTTP状态码: {response.status}")
+                    return None
+                
+                buffer = io.BytesIO()
+                digest = hashlib.sha256()
+                file = None
+                # 已知大小超过上限时直接写盘
+                if attachment["size"] and attachment["size"] > memory_limit:
+                    file_path = self._attachment_path(attachment)
+                    file = await asyncio.to_thread(open, file_path, 'wb')
+                try:
+                    async for chunk in response.content.iter_chunked(65536):
+                        digest.update(chunk)
+                        if file is None and buffer.tell() + len(chunk) > memory_limit:
+                            # 超出内存缓冲上限，转存到磁盘
+                            file_path = self._attachment_path(attachment)
+                            file = await asyncio.to_thread(open, file_path, 'wb')
+                            await asyncio.to_thread(file.write, buffer.getvalue())
+                            buffer = None
+                        if file is not None:
+                            await asyncio.to_thread(file.write, chunk)
+                        else:
+                            buffer.write(chunk)
+                finally:
+                    if file is not None:
+                        await asyncio.to_thread(file.close)
             
-            # 生成本地文件路径
-            file_path = target_dir / f"{attachment.id}_{attachment.filename}"
+            if file_path is not None:
+                print(f"📥 已下载附件到 {file_path.parent}: {file_path.name}")
+                return file_path, digest.hexdigest()
             
-            # 下载文件
-            timeout = aiohttp.ClientTimeout(total=30)  # 30秒超时
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(attachment.url) as response:
-                    if response.status == 200:
-                        with open(file_path, 'wb') as f:
-                            async for chunk in response.content.iter_chunked(8192):
-                                f.write(chunk)
-                        
-                        print(f"📥 已下载附件到 {target_dir}: {file_path.name}")
-                        return file_path
-                    else:
-                        print(f"❌ 下载附件失败，HTTP状态码: {response.status}")
-                        return None
+            buffer.seek(0)
+            print(f"📥 已下载附件到内存: {attachment['filename']} ({buffer.getbuffer().nbytes/1024:.1f}KB)")
+            return buffer, digest.hexdigest()
                         
         except Exception as e:
             print(f"❌ 下载附件异常: {e}")
+            if file_path is not None and file_path.exists():
+                file_path.unlink()
             return None
     
-    async def _send_file_to_kook(self, kook_channel_id: str, file_path: Path, original_filename: str):
-        """发送文件到KOOK频道
+    def _attachment_path(self, attachment: dict) -> Path:
+        """获取附件落盘时的本地路径"""
+        # 根据文件类型选择存储目录
+        content_type = attachment["content_type"] or ""
+        if content_type.startswith("image/"):
+            # 图片存储在images子目录
+            target_dir = self.download_dir / "images"
+        elif content_type.startswith("video/"):
+            # 视频存储在videos子目录
+            target_dir = self.download_dir / "videos"
+        else:
+            # 其他文件存储在下载根目录
+            target_dir = self.download_dir
+        
+        # 确保目标目录存在
+        target_dir.mkdir(exist_ok=True)
+        return target_dir / f"{attachment['id']}_{attachment['filename']}"
+    
+    async def _upload_file_to_kook(self, media: Union[io.BytesIO, Path], original_filename: str,
+                                   digest: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+        """上传文件到KOOK
         
         Args:
-            kook_channel_id: KOOK频道ID
-            file_path: 本地文件路径
+            media: 内存中的文件内容或本地文件路径
             original_filename: 原始文件名
+            digest: 文件内容的SHA-256，用于查找已上传过的相同文件
+            
+        Returns:
+            Tuple[Optional[str], Optional[str]]: (KOOK资源URL, 无法上传时发送的提示文本)
         """
         try:
-            # 尝试使用kook_bot对象发送文件
-            try:
-                channel = await self.kook_bot.client.fetch_public_channel(kook_channel_id)
-                if channel:
-                    with open(file_path, 'rb') as f:
-                        await channel.send(file=f)
-                    print(f"✅ 使用kook_bot对象发送文件成功: {original_filename}")
-                    return
-            except Exception as e:
-                print(f"⚠️ 使用kook_bot对象发送文件失败，尝试直接API调用: {e}")
-            
-            # 使用aiohttp直接调用KOOK API上传文件
-            import os
-            from dotenv import load_dotenv
-            import aiohttp
+            # 直接调用KOOK API上传文件
             import mimetypes
-            import json
+            
+            name_path = Path(original_filename)
             
             # 检查文件扩展名
-            file_ext = os.path.splitext(original_filename)[1].lower()
+            file_ext = name_path.suffix.lower()
             
             # 如果是不支持的格式，直接发送文件名和提示
             unsupported_formats = ['.svg', '.webp', '.tiff', '.psd']
             if file_ext in unsupported_formats:
-                await self._send_text_message(kook_channel_id, f"{self.config.message_prefix} 不支持的文件格式: {original_filename}")
-                print(f"⚠️ 不支持的文件格式 {file_ext}，已发送文本通知")
-                return
-            
-            # 加载环境变量获取token
-            load_dotenv()
-            token = os.getenv('KOOK_BOT_TOKEN')
+                print(f"⚠️ 不支持的文件格式 {file_ext}，将发送文本通知")
+                return None, f"{self.config.message_prefix} 不支持的文件格式: {original_filename}"
             
             # 获取文件MIME类型
-            content_type, _ = mimetypes.guess_type(file_path)
+            content_type, _ = mimetypes.guess_type(original_filename)
             if not content_type:
                 content_type = 'application/octet-stream'
             
             # 检查文件大小，KOOK限制为20MB
-            file_size = os.path.getsize(file_path)
-            if file_size > 20 * 1024 * 1024:  # 20MB
-                await self._send_text_message(kook_channel_id, f"{self.config.message_prefix} 文件过大(>20MB): {original_filename}")
-                print(f"⚠️ 文件过大 {file_size/1024/1024:.2f}MB，已发送文本通知")
-                return
+            if isinstance(media, Path):
+                file_size = os.path.getsize(media)
+            else:
+                file_size = media.getbuffer().nbytes
+            if file_size > KOOK_UPLOAD_LIMIT:
+                print(f"⚠️ 文件过大 {file_size/1024/1024:.2f}MB，将发送文本通知")
+                return None, f"{self.config.message_prefix} 文件过大(>20MB): {original_filename}"
                 
-            # 构建API请求上传文件
-            upload_url = "https://www.kookapp.cn/api/v3/asset/create"
-            headers = {
-                "Authorization": f"Bot {token}"
-            }
-            
             # 判断文件类型
             file_type = 1  # 1表示图片
-            is_video = self._is_video_file(file_path)
-            if is_video:
+            if self._is_video_file(name_path):
                 file_type = 2  # 2表示视频/音频
             else:
                 # 如果不是图片也不是视频，则为其他文件
                 if not content_type.startswith('image/'):
                     file_type = 3  # 3表示其他文件
             
-            # 使用aiohttp上传文件
-            async with aiohttp.ClientSession() as session:
-                with open(file_path, 'rb') as f:
-                    form = aiohttp.FormData()
-                    form.add_field('file', f, filename=original_filename, content_type=content_type)
-                    form.add_field('type', str(file_type))
-                    
-                    async with session.post(upload_url, headers=headers, data=form) as response:
-                        if response.status == 200:
-                            resp_json = await response.json()
-                            if resp_json.get('code') == 0 and resp_json.get('data', {}).get('url'):
-                                file_url = resp_json['data']['url']
-                                
-                                # 根据文件类型发送不同格式的消息
-                                if self._is_image_file(file_path):
-                                    # 图片卡片消息
-                                    await self._send_image_card(kook_channel_id, file_url, original_filename)
-                                elif self._is_video_file(file_path):
-                                    # 视频卡片消息
-                                    await self._send_video_card(kook_channel_id, file_url, original_filename)
-                                else:
-                                    # 普通文件消息
-                                    await self._send_text_message(kook_channel_id, f"{self.config.message_prefix} 文件: {original_filename}\n{file_url}")
-                                
-                                print(f"✅ 文件已上传并发送: {original_filename}")
-                            else:
-                                # 如果上传失败，只发送文本消息
-                                await self._send_text_message(kook_channel_id, f"{self.config.message_prefix} 文件上传失败: {original_filename}")
-                                print(f"❌ 文件上传成功但未获取到URL: {resp_json}")
-                        else:
-                            # 如果上传失败，只发送文本消息
-                            await self._send_text_message(kook_channel_id, f"{self.config.message_prefix} 文件上传失败: {original_filename}")
-                            print(f"❌ 上传文件到KOOK失败，HTTP状态码: {response.status}")
+            # 相同内容已上传过时直接引用缓存的URL
+            file_url = await self.media_cache.get(digest)
+            if file_url:
+                print(f"♻️ 媒体缓存命中，跳过上传: {original_filename}")
+                return file_url, None
+            
+            # 通过共享的KOOK API客户端上传文件
+            if isinstance(media, Path):
+                # aiohttp在线程池中读取文件内容上传，这里只需避免在事件循环中打开文件
+                f = await asyncio.to_thread(open, media, 'rb')
+                try:
+                    status, resp_json = await self.kook_api.upload_asset(
+                        f, original_filename, content_type=content_type, file_type=file_type
+                    )
+                finally:
+                    await asyncio.to_thread(f.close)
+            else:
+                status, resp_json = await self.kook_api.upload_asset(
+                    media, original_filename, content_type=content_type, file_type=file_type
+                )
+            
+            if status == 200:
+                if resp_json.get('code') == 0 and resp_json.get('data', {}).get('url'):
+                    file_url = resp_json['data']['url']
+                    await self.media_cache.put(digest, file_url, file_size)
+                    return file_url, None
+                # 如果上传失败，只发送文本消息
+                print(f"❌ 文件上传成功但未获取到URL: {resp_json}")
+            else:
+                # 如果上传失败，只发送文本消息
+                print(f"❌ 上传文件到KOOK失败，HTTP状态码: {status}")
             
         except Exception as e:
             print(f"❌ 上传文件到KOOK异常: {e}")
-            await self._send_text_message(kook_channel_id, f"{self.config.message_prefix} 文件上传失败: {original_filename}")
+        return None, f"{self.config.message_prefix} 文件上传失败: {original_filename}"
+    
+    def _build_uploaded_file(self, file_url: str, original_filename: str, is_video: bool) -> _KookPart:
+        """根据文件类型构建发送已上传KOOK资源的消息"""
+        if self._is_image_file(Path(original_filename)):
+            # 图片卡片消息
+            return self._build_image_card(file_url, original_filename)
+        elif is_video:
+            # 视频卡片消息
+            return self._build_video_card(file_url, original_filename)
+        # 普通文件消息
+        return _KookPart(1, f"{self.config.message_prefix} 文件: {original_filename}\n{file_url}")
     
     def _is_image_file(self, file_path: Path) -> bool:
         """判断是否为图片文件"""
@@ -389,273 +846,219 @@ class MessageForwarder:
         video_extensions = {'.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.mkv'}
         return file_path.suffix.lower() in video_extensions
     
-    async def _send_image_card(self, kook_channel_id: str, image_url: str, original_filename: str):
-        """发送图片卡片消息到KOOK
+    def _build_image_card(self, image_url: str, original_filename: str) -> _KookPart:
+        """构建图片卡片消息
         
         Args:
-            kook_channel_id: KOOK频道ID
             image_url: 图片URL
             original_filename: 原始文件名
         """
-        try:
-            # 使用KOOK的卡片消息API发送图片
-            import os
-            from dotenv import load_dotenv
-            import aiohttp
-            import json
-            
-            # 加载环境变量获取token
-            load_dotenv()
-            token = os.getenv('KOOK_BOT_TOKEN')
-            
-            # 构建卡片消息
-            card = {
+        # 构建卡片消息
+        card = {
+            "type": "card",
+            "theme": "secondary",
+            "size": "lg",
+            "modules": [
+                {
+                    "type": "header",
+                    "text": {
+                        "type": "plain-text",
+                        "content": f"{self.config.message_prefix} 图片: {original_filename}"
+                    }
+                },
+                {
+                    "type": "container",
+                    "elements": [
+                        {
+                            "type": "image",
+                            "src": image_url
+                        }
+                    ]
+                }
+            ]
+        }
+        
+        return _KookPart(
+            10, json.dumps([card]), f"图片卡片消息: {original_filename}",
+            f"{self.config.message_prefix} 图片: {original_filename}\n{image_url}"
+        )
+    
+    def _build_image_album(self, images: List[Tuple[str, str, str]]) -> List[_KookPart]:
+        """把多张图片合并为一条卡片消息
+        
+        每个image-group模块最多9张图片，超出时拆成多个模块；
+        模块数或卡片数超过KOOK限制时再拆成多条消息，每条消息记录自己包含的图片的键。
+        
+        Args:
+            images: (图片URL, 原始文件名, 附件键) 列表，按发送顺序排列
+        """
+        if len(images) == 1:
+            url, filename, key = images[0]
+            return [self._build_image_card(url, filename)._replace(keys=(key,))]
+        
+        # 每张卡片的图片模块（image-group需要至少2张，单张用container）
+        modules = []
+        for i in range(0, len(images), KOOK_IMAGE_GROUP_LIMIT):
+            group = images[i:i + KOOK_IMAGE_GROUP_LIMIT]
+            modules.append({
+                "type": "image-group" if len(group) > 1 else "container",
+                "elements": [{"type": "image", "src": url} for url, _, _ in group]
+            })
+        
+        cards = []
+        for i in range(0, len(modules), KOOK_CARD_MODULE_LIMIT - 1):
+            cards.append({
                 "type": "card",
                 "theme": "secondary",
                 "size": "lg",
-                "modules": [
-                    {
-                        "type": "header",
-                        "text": {
-                            "type": "plain-text",
-                            "content": f"{self.config.message_prefix} 图片: {original_filename}"
-                        }
-                    },
-                    {
-                        "type": "container",
-                        "elements": [
-                            {
-                                "type": "image",
-                                "src": image_url
-                            }
-                        ]
-                    }
-                ]
-            }
-            
-            # 将卡片消息转换为JSON字符串
-            card_content = json.dumps([card])
-            
-            # 构建API请求
-            url = "https://www.kookapp.cn/api/v3/message/create"
-            headers = {
-                "Authorization": f"Bot {token}",
-                "Content-Type": "application/json"
+                "modules": modules[i:i + KOOK_CARD_MODULE_LIMIT - 1]
+            })
+        # 第一张卡片加上标题
+        cards[0]["modules"].insert(0, {
+            "type": "header",
+            "text": {
+                "type": "plain-text",
+                "content": f"{self.config.message_prefix} 图片 ×{len(images)}"
             }
-            data = {
-                "target_id": kook_channel_id,
-                "content": card_content,
-                "type": 10  # 10表示卡片消息
-            }
-            
-            # 发送请求
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=data) as response:
-                    if response.status == 200:
-                        resp_json = await response.json()
-                        if resp_json.get('code') == 0:
-                            print(f"✅ 图片卡片消息已发送: {original_filename}")
-                        else:
-                            print(f"❌ 发送图片卡片消息失败: {resp_json}")
-                            # 失败时回退到普通文本消息
-                            await self._send_text_message(kook_channel_id, f"{self.config.message_prefix} 图片: {original_filename}\n{image_url}")
-                    else:
-                        print(f"❌ 发送图片卡片消息失败，HTTP状态码: {response.status}")
-                        # 失败时回退到普通文本消息
-                        await self._send_text_message(kook_channel_id, f"{self.config.message_prefix} 图片: {original_filename}\n{image_url}")
-        except Exception as e:
-            print(f"❌ 发送图片卡片消息异常: {e}")
-            # 异常时回退到普通文本消息
-            await self._send_text_message(kook_channel_id, f"{self.config.message_prefix} 图片: {original_filename}\n{image_url}")
+        })
+        
+        fallback_text = f"{self.config.message_prefix} 图片 ×{len(images)}\n" + "\n".join(url for url, _, _ in images)
+        return [
+            _KookPart(
+                10, json.dumps(cards[i:i + KOOK_CARDS_PER_MESSAGE]), f"图片组卡片消息: {len(images)} 张图片",
+                fallback_text if i == 0 else None,
+                tuple(key for _, _, key in images[n * KOOK_IMAGES_PER_MESSAGE:(n + 1) * KOOK_IMAGES_PER_MESSAGE])
+            )
+            for n, i in enumerate(range(0, len(cards), KOOK_CARDS_PER_MESSAGE))
+        ]
     
-    async def _send_video_card(self, kook_channel_id: str, video_url: str, original_filename: str):
-        """发送视频卡片消息到KOOK
+    def _build_video_card(self, video_url: str, original_filename: str) -> _KookPart:
+        """构建视频卡片消息
         
         Args:
-            kook_channel_id: KOOK频道ID
             video_url: 视频URL
             original_filename: 原始文件名
         """
-        try:
-            # 使用KOOK的卡片消息API发送视频
-            import os
-            from dotenv import load_dotenv
-            import aiohttp
-            import json
-            
-            # 加载环境变量获取token
-            load_dotenv()
-            token = os.getenv('KOOK_BOT_TOKEN')
-            
-            # 构建卡片消息
-            card = {
-                "type": "card",
-                "theme": "secondary",
-                "size": "lg",
-                "modules": [
-                    {
-                        "type": "header",
-                        "text": {
-                            "type": "plain-text",
-                            "content": f"{self.config.message_prefix} 视频: {original_filename}"
-                        }
-                    },
-                    {
-                        "type": "video",
-                        "title": original_filename,
-                        "src": video_url
+        # 构建卡片消息
+        card = {
+            "type": "card",
+            "theme": "secondary",
+            "size": "lg",
+            "modules": [
+                {
+                    "type": "header",
+                    "text": {
+                        "type": "plain-text",
+                        "content": f"{self.config.message_prefix} 视频: {original_filename}"
                     }
-                ]
-            }
-            
-            # 将卡片消息转换为JSON字符串
-            card_content = json.dumps([card])
-            
-            # 构建API请求
-            url = "https://www.kookapp.cn/api/v3/message/create"
-            headers = {
-                "Authorization": f"Bot {token}",
-                "Content-Type": "application/json"
-            }
-            data = {
-                "target_id": kook_channel_id,
-                "content": card_content,
-                "type": 10  # 10表示卡片消息
-            }
-            
-            # 发送请求
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=data) as response:
-                    if response.status == 200:
-                        resp_json = await response.json()
-                        if resp_json.get('code') == 0:
-                            print(f"✅ 视频卡片消息已发送: {original_filename}")
-                        else:
-                            print(f"❌ 发送视频卡片消息失败: {resp_json}")
-                            # 失败时回退到普通文本消息
-                            await self._send_text_message(kook_channel_id, f"{self.config.message_prefix} 视频: {original_filename}\n{video_url}")
-                    else:
-                        print(f"❌ 发送视频卡片消息失败，HTTP状态码: {response.status}")
-                        # 失败时回退到普通文本消息
-                        await self._send_text_message(kook_channel_id, f"{self.config.message_prefix} 视频: {original_filename}\n{video_url}")
-        except Exception as e:
-            print(f"❌ 发送视频卡片消息异常: {e}")
-            # 异常时回退到普通文本消息
-            await self._send_text_message(kook_channel_id, f"{self.config.message_prefix} 视频: {original_filename}\n{video_url}")
+                },
+                {
+                    "type": "video",
+                    "title": original_filename,
+                    "src": video_url
+                }
+            ]
+        }
+        
+        return _KookPart(
+            10, json.dumps([card]), f"视频卡片消息: {original_filename}",
+            f"{self.config.message_prefix} 视频: {original_filename}\n{video_url}"
+        )
     
-    async def _schedule_file_cleanup(self, file_path: Path, content_type: Optional[str]):
-        """安排文件清理
+    async def _send_card_message(self, kook_channel_id: str, card_content: str, description: str,
+                                 fallback_text: Optional[str]) -> Optional[bool]:
+        """发送卡片消息到KOOK，卡片被拒绝或发送异常时回退到普通文本消息
         
         Args:
-            file_path: 文件路径
-            content_type: 文件MIME类型
+            kook_channel_id: KOOK频道ID
+            card_content: 卡片列表的JSON字符串
+            description: 日志中使用的消息描述
+            fallback_text: 回退时发送的文本，为空时不回退
+            
+        Returns:
+            Optional[bool]: True表示发送成功；False表示被KOOK拒绝；None表示暂时失败，可以稍后重试
         """
         try:
-            # 根据文件类型确定清理时间
-            if content_type and content_type.startswith('image/'):
-                cleanup_hours = int(os.getenv('IMAGE_CLEANUP_HOURS', '24'))
-            elif content_type and content_type.startswith('video/'):
-                cleanup_hours = int(os.getenv('VIDEO_CLEANUP_HOURS', '12'))
-            else:
-                cleanup_hours = 6  # 其他文件默认6小时后清理
-            
-            # 安排异步清理任务
-            asyncio.create_task(self._cleanup_file_after_delay(file_path, cleanup_hours * 3600))
-            
+            # 发送请求（10表示卡片消息）
+            result = await self._send_api_message(kook_channel_id, card_content, 10)
         except Exception as e:
-            print(f"❌ 安排文件清理失败: {e}")
+            print(f"❌ 发送{description}异常: {e}")
+            result = False
+        
+        if result:
+            print(f"✅ {description} 已发送")
+        elif result is False and fallback_text:
+            # 卡片被KOOK拒绝，回退到普通文本消息
+            return await self._send_text_message(kook_channel_id, fallback_text)
+        elif result is None:
+            print(f"⏳ {description} 暂时发送失败")
+        return result
+    
+    def _media_category(self, content_type: Optional[str]) -> str:
+        """根据文件类型确定本地媒体类别（决定保留时间）"""
+        if content_type and content_type.startswith('image/'):
+            return "image"
+        elif content_type and content_type.startswith('video/'):
+            return "video"
+        return "other"
     
-    async def _cleanup_file_after_delay(self, file_path: Path, delay_seconds: int):
-        """延迟清理文件
+    async def _schedule_file_cleanup(self, file_path: Path, content_type: Optional[str]):
+        """安排文件清理（登记到媒体存储，按保留时间和磁盘预算统一清理）
         
         Args:
             file_path: 文件路径
-            delay_seconds: 延迟秒数
+            content_type: 文件MIME类型
         """
         try:
-            await asyncio.sleep(delay_seconds)
-            if file_path.exists():
-                file_path.unlink()
-                print(f"🗑️ 已清理文件: {file_path}")
+            self.media_store.track(file_path, self._media_category(content_type))
         except Exception as e:
-            print(f"❌ 清理文件失败: {e}")
-            
-    def start_periodic_cleanup(self):
-        """启动定期清理任务"""
-        asyncio.create_task(self._run_periodic_cleanup())
-        print("✅ 已启动定期清理任务")
+            print(f"❌ 安排文件清理失败: {e}")
+    
+    async def close(self, drain_timeout: float = 10):
+        """停止转发队列和发件箱任务，落盘发件箱，关闭数据库、翻译器和下载会话
         
-    async def _run_periodic_cleanup(self):
-        """运行定期清理任务"""
-        while True:
-            try:
-                # 每天运行一次清理
-                await asyncio.sleep(24 * 3600)  # 24小时
-                await self._cleanup_old_files()
-            except Exception as e:
-                print(f"❌ 定期清理任务异常: {e}")
-                # 出错后等待1小时再重试
-                await asyncio.sleep(3600)
-                
-    async def _cleanup_old_files(self):
-        """清理所有过期文件"""
-        try:
-            # 获取清理时间配置
-            image_max_age = int(os.getenv('IMAGE_MAX_AGE_DAYS', '7')) * 24 * 3600  # 默认7天
-            video_max_age = int(os.getenv('VIDEO_MAX_AGE_DAYS', '3')) * 24 * 3600  # 默认3天
-            other_max_age = int(os.getenv('OTHER_MAX_AGE_DAYS', '1')) * 24 * 3600  # 默认1天
-            
-            # 当前时间
-            now = time.time()
-            
-            # 清理图片目录
-            await self._cleanup_directory(self.download_dir / "images", now, image_max_age)
-            
-            # 清理视频目录
-            await self._cleanup_directory(self.download_dir / "videos", now, video_max_age)
-            
-            # 清理其他文件
-            await self._cleanup_directory(self.download_dir, now, other_max_age, exclude_dirs=True)
-            
-            print(f"✅ 定期清理完成")
-        except Exception as e:
-            print(f"❌ 清理过期文件失败: {e}")
-            
-    async def _cleanup_directory(self, directory: Path, now: float, max_age: int, exclude_dirs: bool = False):
-        """清理指定目录中的过期文件
+        先在 drain_timeout 秒内等待队列中的转发任务发送完；超时后剩余的任务被丢弃，
+        它们在入队前已登记到发件箱，下次启动时补发（已发送的文字和附件不再发送）。
         
         Args:
-            directory: 目录路径
-            now: 当前时间戳
-            max_age: 最大保留时间（秒）
-            exclude_dirs: 是否排除子目录
+            drain_timeout: 等待队列发送完的最长时间，单位为秒
         """
-        if not directory.exists() or not directory.is_dir():
-            return
-            
+        if self._outbox_task is not None:
+            self._outbox_task.cancel()
+            await asyncio.gather(self._outbox_task, return_exceptions=True)
+            self._outbox_task = None
+        await self.config_watcher.stop()
+        remove_reload_listener(self._on_settings_reload)
         try:
-            deleted_count = 0
-            for item in directory.iterdir():
-                # 跳过目录（如果设置了exclude_dirs）
-                if exclude_dirs and item.is_dir():
-                    continue
-                    
-                # 只处理文件
-                if item.is_file():
-                    # 获取文件修改时间
-                    mtime = item.stat().st_mtime
-                    age = now - mtime
-                    
-                    # 如果文件超过最大保留时间，则删除
-                    if age > max_age:
-                        item.unlink()
-                        deleted_count += 1
-                        
-            if deleted_count > 0:
-                print(f"🗑️ 已从 {directory} 清理 {deleted_count} 个过期文件")
-        except Exception as e:
-            print(f"❌ 清理目录 {directory} 失败: {e}")
+            await asyncio.wait_for(self.queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ 转发队列未能在{drain_timeout}秒内发送完，剩余的消息将在下次启动时从发件箱补发")
+        await self.queue.close()
+        await self.outbox.close()
+        self.media_cache.close()
+        self.translator.close()
+        if self._download_session is not None:
+            await self._download_session.close()
+            self._download_session = None
+    
+    def _on_settings_reload(self, settings: Settings):
+        """把重新加载的配置推送给翻译器和媒体存储"""
+        old, self._settings = self._settings, settings
+        self.translator.apply_settings(settings)
+        # 只应用.env中修改过的保留时间，不覆盖运行中通过其他途径（如WebUI）设置的值
+        for category in ("image", "video", "other"):
+            hours = getattr(settings, f"{category}_cleanup_hours")
+            if hours != getattr(old, f"{category}_cleanup_hours"):
+                self.media_store.set_retention(category, hours * 3600)
+        if settings.media_disk_budget_mb != old.media_disk_budget_mb:
+            self.media_store.max_bytes = int(settings.media_disk_budget_mb * 1024 * 1024)
+    
+    def start_config_watcher(self):
+        """监视.env和转发规则文件，变化时在后台重新加载配置（重复调用无副作用）"""
+        if self.config.config_watch_interval > 0:
+            self.config_watcher.start()
+            print(f"👀 已启动配置热加载 (检查间隔: {self.config.config_watch_interval}秒)")
     
-    def reload_config(self):
+    def reload_config(self) -> bool:
         """重新加载配置"""
-        self.config.reload_config()
\ No newline at end of file
+        return self.config.reload_config()
\ No newline at end of file
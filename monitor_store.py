@@ -0,0 +1,184 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+# 通过 add_game 添加、不属于任何频道的默认监控列表
+DEFAULT_USER_ID = "default"
+
+
+class MonitorStore:
+    """Steam价格监控列表存储（SQLite）
+
+    每条监控（用户、频道、游戏）是一行，添加、移除一个游戏或更新一个游戏的价格
+    都只写对应的行，不再把整个监控列表重写到JSON文件。按AppID和频道建立索引，
+    价格检查时按游戏取订阅者，列出监控时按频道查询。
+    """
+
+    def __init__(self, db_path="data/steam/monitors.db"):
+        """
+        初始化监控列表存储
+
+        Args:
+            db_path: SQLite数据库路径
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn_lock = threading.Lock()
+        with self._conn_lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS monitors (
+                    user_id TEXT NOT NULL,
+                    channel_id TEXT NOT NULL,
+                    appid TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    last_price REAL,
+                    last_discount INTEGER,
+                    currency TEXT NOT NULL DEFAULT 'CNY',
+                    added_time REAL NOT NULL,
+                    PRIMARY KEY (user_id, channel_id, appid)
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_monitors_appid ON monitors (appid)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_monitors_channel ON monitors (channel_id)")
+            self._conn.commit()
+
+    def add(self, user_id, channel_id, appid, name: str, last_price: Optional[float] = None,
+            last_discount: Optional[int] = None, currency: str = "CNY", added_time: Optional[float] = None) -> bool:
+        """
+        添加一条监控
+
+        Returns:
+            bool: 是否添加成功，已在监控中时返回False
+        """
+        with self._conn_lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO monitors "
+                    "(user_id, channel_id, appid, name, last_price, last_discount, currency, added_time) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (str(user_id), str(channel_id), str(appid), name, last_price, last_discount, currency,
+                     time.time() if added_time is None else added_time)
+                )
+        return cursor.rowcount > 0
+
+    def remove(self, user_id, channel_id, appid) -> bool:
+        """移除一条监控，返回是否存在并已移除"""
+        with self._conn_lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "DELETE FROM monitors WHERE user_id = ? AND channel_id = ? AND appid = ?",
+                    (str(user_id), str(channel_id), str(appid))
+                )
+        return cursor.rowcount > 0
+
+    def remove_all(self, user_id, channel_id) -> int:
+        """移除用户在频道中的所有监控，返回移除的条数"""
+        with self._conn_lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "DELETE FROM monitors WHERE user_id = ? AND channel_id = ?", (str(user_id), str(channel_id))
+                )
+        return cursor.rowcount
+
+    def get(self, user_id, channel_id, appid) -> Optional[dict]:
+        """获取一条监控，不存在时返回None"""
+        with self._conn_lock:
+            row = self._conn.execute(
+                "SELECT * FROM monitors WHERE user_id = ? AND channel_id = ? AND appid = ?",
+                (str(user_id), str(channel_id), str(appid))
+            ).fetchone()
+        return dict(row) if row else None
+
+    def list(self, user_id, channel_id) -> List[dict]:
+        """列出用户在频道中的监控（按添加时间排序）"""
+        with self._conn_lock:
+            rows = self._conn.execute(
+                "SELECT * FROM monitors WHERE user_id = ? AND channel_id = ? ORDER BY added_time",
+                (str(user_id), str(channel_id))
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def appids(self) -> List[str]:
+        """所有被监控的游戏（去重）"""
+        with self._conn_lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT appid FROM monitors")]
+
+    def subscribers(self, appid) -> List[dict]:
+        """监控某个游戏的所有订阅"""
+        with self._conn_lock:
+            rows = self._conn.execute("SELECT * FROM monitors WHERE appid = ?", (str(appid),)).fetchall()
+        return [dict(row) for row in rows]
+
+    def update_prices(self, updates: Iterable[Tuple[str, str, str, float, int]]) -> int:
+        """
+        在一个事务中更新多条监控的价格
+
+        Args:
+            updates: (user_id, channel_id, appid, last_price, last_discount) 列表
+
+        Returns:
+            int: 更新的条数
+        """
+        rows = [(price, discount, str(user_id), str(channel_id), str(appid))
+                for user_id, channel_id, appid, price, discount in updates]
+        if not rows:
+            return 0
+        with self._conn_lock:
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE monitors SET last_price = ?, last_discount = ? "
+                    "WHERE user_id = ? AND channel_id = ? AND appid = ?", rows
+                )
+        return len(rows)
+
+    def count(self) -> int:
+        """监控总条数"""
+        with self._conn_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM monitors").fetchone()[0]
+
+    def import_json(self, path) -> int:
+        """
+        导入旧版本的 monitor_list.json
+
+        支持两种格式：{"default": [{"id", "name", "price", "currency"}]} 和
+        {"用户ID_频道ID": {AppID: {"name", "last_price", "last_discount", "currency", "added_time"}}}。
+
+        Returns:
+            int: 导入的监控条数
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        rows = []
+        now = time.time()
+        for key, games in data.items():
+            if isinstance(games, list):
+                for game in games:
+                    rows.append((DEFAULT_USER_ID, "", str(game["id"]), game.get("name", ""), game.get("price"),
+                                 None, game.get("currency", "CNY"), now))
+                continue
+            user_id, _, channel_id = key.partition("_")
+            for appid, game in games.items():
+                # 旧版本的添加时间是事件循环时间，不是时间戳，导入时使用当前时间
+                rows.append((user_id, channel_id, str(appid), game.get("name", ""), game.get("last_price"),
+                             game.get("last_discount"), game.get("currency", "CNY"), now))
+        with self._conn_lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO monitors "
+                    "(user_id, channel_id, appid, name, last_price, last_discount, currency, added_time) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+        return len(rows)
+
+    def close(self):
+        """关闭数据库"""
+        with self._conn_lock:
+            self._conn.close()
@@ -0,0 +1,264 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+# 转发任务：一条Discord消息到一个KOOK频道，content 为消息快照（JSON），
+# 由若干条KOOK消息组成，sent 记录已发送部分的键（文字、附件ID）；1 和 10 为单条KOOK文本/卡片消息
+MSG_TYPE_FORWARD = 0
+
+
+class Outbox:
+    """转发消息的预写发件箱（SQLite）
+
+    消息加入转发队列前先登记，全部内容被KOOK接收后确认删除；进程重启或KOOK不可用时，
+    未确认的消息保留在磁盘上并在之后重放，已发送的部分按 sent 中记录的键跳过。
+
+    登记和确认先写入内存缓冲，由后台任务每隔 flush_interval 秒合并为一个事务落盘；
+    在同一个刷盘周期内就发送成功的消息不会产生任何磁盘写入。
+    所有刷盘都经过同一把锁依次执行，先取出的批次一定先写入，确认不会早于对应的登记落盘。
+    """
+
+    def __init__(self, db_path="data/outbox.db", flush_interval: float = 0.5, max_batch: int = 200):
+        """
+        初始化发件箱
+
+        Args:
+            db_path: SQLite数据库路径
+            flush_interval: 缓冲刷盘间隔，单位为秒
+            max_batch: 缓冲条数达到该值时立即刷盘
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn_lock = threading.Lock()
+        with self._conn_lock:
+            # WAL + NORMAL：提交不逐条fsync，由检查点批量落盘
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS outbox (
+                    id TEXT PRIMARY KEY,
+                    target_id TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    msg_type INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    sent TEXT NOT NULL DEFAULT '[]'
+                )"""
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+            if "sent" not in columns:
+                # 旧版本的发件箱没有 sent 列
+                self._conn.execute("ALTER TABLE outbox ADD COLUMN sent TEXT NOT NULL DEFAULT '[]'")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_created ON outbox (created_at)")
+            self._conn.commit()
+
+        # 尚未落盘的登记（id -> 行数据）和确认（id集合）
+        self._pending_adds: Dict[str, tuple] = {}
+        self._pending_acks: Set[str] = set()
+        self._pending_attempts: Set[str] = set()
+        self._pending_sent: Dict[str, str] = {}
+        # 正在发送中的消息，重放时跳过
+        self._inflight: Set[str] = set()
+
+        self._flush_event: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        # 同一时间只有一个批次在写入
+        self._flush_lock = asyncio.Lock()
+
+    def start(self):
+        """启动后台刷盘任务（需要在事件循环中调用）"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_event = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def add(self, target_id: str, content: str, msg_type: int = 1) -> str:
+        """登记一条待发送消息
+
+        Args:
+            target_id: KOOK频道ID
+            content: 消息内容（转发任务为消息快照JSON）
+            msg_type: KOOK消息类型，MSG_TYPE_FORWARD 表示转发任务
+
+        Returns:
+            str: 发件箱条目ID
+        """
+        entry_id = uuid.uuid4().hex
+        self._pending_adds[entry_id] = (entry_id, str(target_id), content, msg_type, time.time(), 0, '[]')
+        self._inflight.add(entry_id)
+        self._wake_flusher()
+        return entry_id
+
+    def ack(self, entry_id: Optional[str]):
+        """确认消息已被KOOK接收，从发件箱移除"""
+        if not entry_id:
+            return
+        self._inflight.discard(entry_id)
+        self._pending_attempts.discard(entry_id)
+        self._pending_sent.pop(entry_id, None)
+        if self._pending_adds.pop(entry_id, None) is None:
+            # 已落盘的条目需要删除
+            self._pending_acks.add(entry_id)
+            self._wake_flusher()
+
+    def release(self, entry_id: Optional[str]):
+        """发送失败，保留在发件箱中等待重放"""
+        if not entry_id:
+            return
+        self._inflight.discard(entry_id)
+        row = self._pending_adds.get(entry_id)
+        if row is not None:
+            self._pending_adds[entry_id] = row[:5] + (row[5] + 1, row[6])
+        else:
+            self._pending_attempts.add(entry_id)
+        self._wake_flusher()
+
+    def advance(self, entry_id: Optional[str], sent: Iterable[str]):
+        """记录转发任务已发送部分的键（全部键，覆盖之前的记录），重放时不再构建这些部分"""
+        if not entry_id:
+            return
+        value = json.dumps(sorted(sent))
+        row = self._pending_adds.get(entry_id)
+        if row is not None:
+            self._pending_adds[entry_id] = row[:6] + (value,)
+        else:
+            self._pending_sent[entry_id] = value
+        self._wake_flusher()
+
+    async def claim_pending(self, limit: int = 100) -> List[dict]:
+        """取出待重放的消息（按登记时间排序），并标记为发送中
+
+        Args:
+            limit: 最多返回的条数
+
+        Returns:
+            List[dict]: 发件箱条目
+        """
+        await self.flush()
+        with self._conn_lock:
+            rows = self._conn.execute(
+                "SELECT id, target_id, content, msg_type, created_at, attempts, sent FROM outbox "
+                "ORDER BY created_at LIMIT ?",
+                (limit + len(self._inflight),)
+            ).fetchall()
+
+        entries = []
+        for row in rows:
+            if row[0] in self._inflight:
+                continue
+            self._inflight.add(row[0])
+            entries.append({
+                "id": row[0],
+                "target_id": row[1],
+                "content": row[2],
+                "msg_type": row[3],
+                "created_at": row[4],
+                "attempts": row[5],
+                "sent": json.loads(row[6])
+            })
+            if len(entries) >= limit:
+                break
+        return entries
+
+    def count(self) -> int:
+        """发件箱中尚未确认的消息数"""
+        with self._conn_lock:
+            stored = self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        return stored + len(self._pending_adds) - len(self._pending_acks)
+
+    def _wake_flusher(self):
+        if self._flush_event is None:
+            # 刷盘任务未启动时直接同步落盘，保证不丢消息
+            self._flush_now()
+        elif len(self._pending_adds) + len(self._pending_acks) >= self.max_batch:
+            self._flush_event.set()
+
+    async def _flush_loop(self):
+        """后台刷盘任务"""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"❌ 发件箱刷盘失败: {e}")
+
+    async def flush(self):
+        """把缓冲中的登记和确认落盘，等待之前正在写入的批次完成后再写入"""
+        async with self._flush_lock:
+            # 在锁内取出批次，保证批次按取出顺序写入
+            batch = self._take_batch()
+            if not batch:
+                return
+            write = asyncio.ensure_future(asyncio.to_thread(self._write_batch, *batch))
+            try:
+                await asyncio.shield(write)
+            except asyncio.CancelledError:
+                # 调用方被取消时也要等线程写完再释放锁，否则下一个批次可能先写入
+                await asyncio.wait([write])
+                raise
+
+    def _take_batch(self):
+        if not (self._pending_adds or self._pending_acks or self._pending_attempts or self._pending_sent):
+            return None
+        adds = list(self._pending_adds.values())
+        acks = list(self._pending_acks)
+        attempts = list(self._pending_attempts)
+        sent = [(value, entry_id) for entry_id, value in self._pending_sent.items()]
+        self._pending_adds = {}
+        self._pending_acks = set()
+        self._pending_attempts = set()
+        self._pending_sent = {}
+        return adds, acks, attempts, sent
+
+    def _flush_now(self):
+        # 仅在刷盘任务未运行时使用，此时没有正在写入的批次
+        batch = self._take_batch()
+        if batch:
+            self._write_batch(*batch)
+
+    def _write_batch(self, adds, acks, attempts, sent):
+        """在一个事务中写入一批登记和确认"""
+        with self._conn_lock:
+            with self._conn:
+                if adds:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO outbox "
+                        "(id, target_id, content, msg_type, created_at, attempts, sent) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        adds
+                    )
+                if attempts:
+                    self._conn.executemany(
+                        "UPDATE outbox SET attempts = attempts + 1 WHERE id = ?",
+                        [(entry_id,) for entry_id in attempts]
+                    )
+                if sent:
+                    self._conn.executemany("UPDATE outbox SET sent = ? WHERE id = ?", sent)
+                if acks:
+                    self._conn.executemany(
+                        "DELETE FROM outbox WHERE id = ?",
+                        [(entry_id,) for entry_id in acks]
+                    )
+
+    async def close(self):
+        """停止刷盘任务，落盘剩余缓冲并关闭数据库"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+            self._flush_event = None
+        await self.flush()
+        with self._conn_lock:
+            self._conn.close()
@@ -0,0 +1,249 @@
+import os
+from dataclasses import dataclass
+from typing import Callable, List, Mapping, Optional, Tuple
+
+from dotenv import dotenv_values, load_dotenv
+
+
+def _env_str(env: Mapping[str, str], name: str, default: str = '') -> str:
+    return env.get(name, default)
+
+
+def _env_bool(env: Mapping[str, str], name: str, default: bool) -> bool:
+    return env.get(name, 'true' if default else 'false').lower() == 'true'
+
+
+def _env_int(env: Mapping[str, str], name: str, default: int) -> int:
+    return int(env.get(name, str(default)))
+
+
+def _env_float(env: Mapping[str, str], name: str, default: float) -> float:
+    return float(env.get(name, str(default)))
+
+
+@dataclass(frozen=True)
+class Settings:
+    """机器人运行配置（不可变）
+
+    启动时读取一次 .env 和环境变量，之后各模块共享同一个实例，
+    转发、翻译等热路径上不再读取文件或环境变量。需要重新加载时创建新实例整体替换。
+    """
+
+    # 平台配置
+    enable_discord: bool = True
+    enable_kook: bool = True
+    discord_token: Optional[str] = None
+    kook_token: Optional[str] = None
+    kook_ready_timeout: int = 30
+    discord_hello_reply: bool = True
+
+    # 转发配置
+    forward_rules: str = ''
+    forward_rules_file: str = 'data/forward_rules.json'
+    forward_bot_messages: bool = False
+    message_prefix: str = '[Discord]'
+    forward_workers: int = 4
+    forward_queue_size: int = 100
+    outbox_path: str = 'data/outbox.db'
+    outbox_retry_interval: int = 30
+    outbox_max_age_hours: int = 24
+    media_memory_limit: int = 8 * 1024 * 1024
+    media_cache_path: str = 'data/media_cache.db'
+    attachment_concurrency: int = 4
+    attachment_workers: int = 8
+    album_mode: bool = True
+    config_watch_interval: float = 5.0
+
+    # KOOK配置
+    kook_channel_cache_ttl: int = 600
+    kook_channel_negative_ttl: int = 60
+
+    # 本地媒体清理配置
+    download_dir: str = 'downloads'
+    cleanup_interval: int = 24
+    media_store_path: str = 'data/media_store.db'
+    image_cleanup_hours: float = 24
+    video_cleanup_hours: float = 12
+    other_cleanup_hours: float = 6
+    media_disk_budget_mb: float = 2048
+
+    # Steam监控配置
+    enable_steam_monitor: bool = True
+    steam_check_interval: int = 30
+    steam_price_concurrency: int = 4
+    steam_app_list_refresh_hours: float = 24
+    steam_api_key: str = ''
+
+    # 翻译配置
+    translation_enabled: bool = False
+    translation_service: str = 'libre'
+    translation_source_language: str = 'auto'
+    translation_target_language: str = 'zh-CN'
+    translation_whitelist: Tuple[str, ...] = ()
+    translation_batch_window: float = 0.02
+    translation_batch_size: int = 16
+    translation_cache_enabled: bool = True
+    translation_cache_ttl: int = 86400
+    translation_cache_max_entries: int = 2000
+    translation_cache_max_bytes: int = 4 * 1024 * 1024
+    translation_cache_db: Optional[str] = None
+
+    # 翻译平台凭据
+    libre_api_url: str = ''
+    libre_api_key: str = ''
+    tencent_secret_id: str = ''
+    tencent_secret_key: str = ''
+    tencent_timeout: float = 10
+    tencent_workers: int = 4
+    google_api_key: str = ''
+    baidu_app_id: str = ''
+    baidu_app_key: str = ''
+    youdao_app_key: str = ''
+    youdao_app_secret: str = ''
+
+    @classmethod
+    def from_env(cls, env: Optional[Mapping[str, str]] = None) -> "Settings":
+        """读取 .env 和环境变量创建配置
+
+        Args:
+            env: 配置来源，为空时先把 .env 加载到进程环境变量，再读取 os.environ（启动时使用）
+
+        Raises:
+            ValueError: 数值类配置格式不正确
+        """
+        if env is None:
+            load_dotenv()
+            env = os.environ
+        return cls(
+            enable_discord=_env_bool(env, 'ENABLE_DISCORD', True),
+            enable_kook=_env_bool(env, 'ENABLE_KOOK', True),
+            discord_token=env.get('DISCORD_BOT_TOKEN') or None,
+            kook_token=env.get('KOOK_BOT_TOKEN') or None,
+            kook_ready_timeout=_env_int(env, 'KOOK_READY_TIMEOUT', 30),
+            discord_hello_reply=_env_bool(env, 'DISCORD_HELLO_REPLY_ENABLED', True),
+
+            forward_rules=_env_str(env, 'FORWARD_RULES'),
+            forward_rules_file=_env_str(env, 'FORWARD_RULES_FILE', 'data/forward_rules.json'),
+            forward_bot_messages=_env_bool(env, 'FORWARD_BOT_MESSAGES', False),
+            message_prefix=_env_str(env, 'MESSAGE_PREFIX', '[Discord]'),
+            forward_workers=_env_int(env, 'FORWARD_WORKERS', 4),
+            forward_queue_size=_env_int(env, 'FORWARD_QUEUE_SIZE', 100),
+            outbox_path=_env_str(env, 'OUTBOX_PATH', 'data/outbox.db'),
+            outbox_retry_interval=_env_int(env, 'OUTBOX_RETRY_INTERVAL', 30),
+            outbox_max_age_hours=_env_int(env, 'OUTBOX_MAX_AGE_HOURS', 24),
+            media_memory_limit=int(_env_float(env, 'MEDIA_MEMORY_LIMIT_MB', 8) * 1024 * 1024),
+            media_cache_path=_env_str(env, 'MEDIA_CACHE_PATH', 'data/media_cache.db'),
+            attachment_concurrency=_env_int(env, 'ATTACHMENT_CONCURRENCY', 4),
+            attachment_workers=_env_int(env, 'ATTACHMENT_WORKERS', 8),
+            album_mode=_env_bool(env, 'ALBUM_MODE', True),
+            config_watch_interval=_env_float(env, 'CONFIG_WATCH_INTERVAL', 5),
+
+            kook_channel_cache_ttl=_env_int(env, 'KOOK_CHANNEL_CACHE_TTL', 600),
+            kook_channel_negative_ttl=_env_int(env, 'KOOK_CHANNEL_NEGATIVE_TTL', 60),
+
+            download_dir=_env_str(env, 'DOWNLOAD_DIR', 'downloads'),
+            cleanup_interval=_env_int(env, 'CLEANUP_INTERVAL', 24),
+            media_store_path=_env_str(env, 'MEDIA_STORE_PATH', 'data/media_store.db'),
+            image_cleanup_hours=_env_float(env, 'IMAGE_CLEANUP_HOURS', 24),
+            video_cleanup_hours=_env_float(env, 'VIDEO_CLEANUP_HOURS', 12),
+            other_cleanup_hours=_env_float(env, 'OTHER_CLEANUP_HOURS', 6),
+            media_disk_budget_mb=_env_float(env, 'MEDIA_DISK_BUDGET_MB', 2048),
+
+            enable_steam_monitor=_env_bool(env, 'ENABLE_STEAM_MONITOR', True),
+            steam_check_interval=_env_int(env, 'STEAM_CHECK_INTERVAL', 30),
+            steam_price_concurrency=_env_int(env, 'STEAM_PRICE_CONCURRENCY', 4),
+            steam_app_list_refresh_hours=_env_float(env, 'STEAM_APP_LIST_REFRESH_HOURS', 24),
+            steam_api_key=_env_str(env, 'STEAM_API_KEY'),
+
+            translation_enabled=_env_bool(env, 'TRANSLATION_ENABLED', False),
+            translation_service=_env_str(env, 'TRANSLATION_SERVICE', 'libre').lower(),
+            translation_source_language=_env_str(env, 'TRANSLATION_SOURCE_LANGUAGE', 'auto'),
+            translation_target_language=_env_str(env, 'TRANSLATION_TARGET_LANGUAGE', 'zh-CN'),
+            translation_whitelist=tuple(
+                item.strip() for item in _env_str(env, 'TRANSLATION_WHITELIST').split(',') if item.strip()
+            ),
+            translation_batch_window=_env_float(env, 'TRANSLATION_BATCH_WINDOW', 0.02),
+            translation_batch_size=_env_int(env, 'TRANSLATION_BATCH_SIZE', 16),
+            translation_cache_enabled=_env_bool(env, 'TRANSLATION_CACHE_ENABLED', True),
+            translation_cache_ttl=_env_int(env, 'TRANSLATION_CACHE_TTL', 86400),
+            translation_cache_max_entries=_env_int(env, 'TRANSLATION_CACHE_MAX_ENTRIES', 2000),
+            translation_cache_max_bytes=_env_int(env, 'TRANSLATION_CACHE_MAX_BYTES', 4 * 1024 * 1024),
+            translation_cache_db=_env_str(env, 'TRANSLATION_CACHE_DB') or None,
+
+            libre_api_url=_env_str(env, 'LIBRE_TRANSLATION_API_URL'),
+            libre_api_key=_env_str(env, 'LIBRE_TRANSLATION_API_KEY'),
+            tencent_secret_id=_env_str(env, 'TENCENT_SECRET_ID'),
+            tencent_secret_key=_env_str(env, 'TENCENT_SECRET_KEY'),
+            tencent_timeout=_env_float(env, 'TENCENT_TRANSLATE_TIMEOUT', 10),
+            tencent_workers=_env_int(env, 'TENCENT_TRANSLATE_WORKERS', 4),
+            google_api_key=_env_str(env, 'GOOGLE_TRANSLATION_API_KEY'),
+            baidu_app_id=_env_str(env, 'BAIDU_APP_ID'),
+            baidu_app_key=_env_str(env, 'BAIDU_APP_KEY'),
+            youdao_app_key=_env_str(env, 'YOUDAO_APP_KEY'),
+            youdao_app_secret=_env_str(env, 'YOUDAO_APP_SECRET')
+        )
+
+
+_settings: Optional[Settings] = None
+
+
+def get_settings() -> Settings:
+    """
+    获取全局共享的配置，首次调用时读取 .env 和环境变量
+    """
+    global _settings
+    if _settings is None:
+        _settings = Settings.from_env()
+    return _settings
+
+
+# 配置重新加载后需要收到新配置的组件
+_reload_listeners: List[Callable[[Settings], None]] = []
+
+
+def read_settings() -> Settings:
+    """重新读取 .env 创建新配置，不修改进程环境变量，也不替换全局配置
+
+    .env 中的值优先于进程环境变量（启动时已加载到环境变量中的旧值不会盖住修改后的 .env）。
+    只读取文件和解析，可以在线程中调用。
+
+    Raises:
+        ValueError: 新配置格式不正确
+    """
+    env = dict(os.environ)
+    env.update({name: value for name, value in dotenv_values().items() if value is not None})
+    return Settings.from_env(env)
+
+
+def add_reload_listener(listener: Callable[[Settings], None]):
+    """注册配置重新加载的监听函数，reload_settings 替换全局配置后用新配置调用"""
+    _reload_listeners.append(listener)
+
+
+def remove_reload_listener(listener: Callable[[Settings], None]):
+    """移除配置重新加载的监听函数"""
+    if listener in _reload_listeners:
+        _reload_listeners.remove(listener)
+
+
+def reload_settings(settings: Optional[Settings] = None) -> Settings:
+    """替换全局配置，并把新配置推送给所有注册的组件
+
+    需要在事件循环中调用，监听函数同步执行，组件不会看到只更新了一半的配置。
+
+    Args:
+        settings: 新配置，为空时调用 read_settings 重新读取 .env
+
+    Raises:
+        ValueError: 新配置格式不正确，此时全局配置保持不变
+    """
+    global _settings
+    if settings is None:
+        settings = read_settings()
+    _settings = settings
+    for listener in list(_reload_listeners):
+        try:
+            listener(settings)
+        except Exception as e:
+            print(f"❌ 应用重新加载的配置失败: {e}")
+    return settings
@@ -0,0 +1,175 @@
+import itertools
+import json
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+# 二进制缓存文件格式：魔数 | 元数据长度 | 元数据(JSON) | 游戏数 | 名称字节数 | AppID | 偏移量 | 名称排序 | 名称
+_MAGIC = b"STCATv1\0"
+_HEADER = struct.Struct("<I")
+_COUNTS = struct.Struct("<II")
+
+
+class SteamCatalog:
+    """Steam游戏目录（AppID <-> 游戏名），紧凑存储
+
+    全量游戏列表有十几万条，用两个 dict 分别保存 名称->ID、ID->名称 时每条记录都是独立的
+    str / int 对象。这里按AppID排序后把所有名称以UTF-8拼接成一个 bytes，另用 array 保存
+    AppID、名称偏移量和按名称排序的下标：ID查名称、名称查ID都是二分查找，
+    名称只在查询时解码。运行中从商店API补充的游戏放在一个小的附加字典中。
+
+    目录同时是按AppID排序的游戏名序列（catalog[i] 为第 i 个游戏名），供搜索索引直接引用。
+    """
+
+    def __init__(self, apps: Iterable[Tuple[int, str]] = ()):
+        """
+        构建游戏目录
+
+        Args:
+            apps: (AppID, 游戏名) 列表；同名游戏以最后一个为准
+        """
+        by_name: Dict[str, int] = {}
+        for appid, name in apps:
+            if name:
+                by_name[name] = int(appid)
+        by_id = {appid: name for name, appid in by_name.items()}
+        del by_name
+
+        ids = sorted(by_id)
+        blob = bytearray()
+        offsets = array('I', [0])
+        for appid in ids:
+            blob += by_id[appid].encode('utf-8')
+            offsets.append(len(blob))
+        del by_id
+
+        self._ids = array('I', ids)
+        self._offsets = offsets
+        self._blob = bytes(blob)
+        # 按名称（UTF-8字节序）排序的下标
+        self._by_name = array('I', sorted(range(len(ids)), key=self._name_bytes))
+
+        # 运行中补充的游戏
+        self._extra_ids: Dict[int, str] = {}
+        self._extra_names: Dict[str, int] = {}
+
+    def _name_bytes(self, index: int) -> bytes:
+        return self._blob[self._offsets[index]:self._offsets[index + 1]]
+
+    def __getitem__(self, index: int) -> str:
+        """按AppID排序的第 index 个游戏名（不含运行中补充的游戏）"""
+        if index < 0:
+            index += len(self._ids)
+        if not 0 <= index < len(self._ids):
+            raise IndexError(index)
+        return self._name_bytes(index).decode('utf-8')
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __bool__(self):
+        return bool(self._ids) or bool(self._extra_ids)
+
+    def __contains__(self, name) -> bool:
+        return self.get_id(name) is not None
+
+    def get_name(self, appid) -> Optional[str]:
+        """根据AppID获取游戏名，未找到时返回None"""
+        try:
+            appid = int(appid)
+        except (TypeError, ValueError):
+            return None
+        index = bisect_left(self._ids, appid)
+        if index < len(self._ids) and self._ids[index] == appid:
+            return self[index]
+        return self._extra_ids.get(appid)
+
+    def get_id(self, name) -> Optional[int]:
+        """根据游戏名（完全一致）获取AppID，未找到时返回None"""
+        if not isinstance(name, str):
+            return None
+        key = name.encode('utf-8')
+        position = bisect_left(self._by_name, key, key=self._name_bytes)
+        if position < len(self._by_name) and self._name_bytes(self._by_name[position]) == key:
+            return self._ids[self._by_name[position]]
+        return self._extra_names.get(name)
+
+    def add(self, appid, name: str):
+        """补充一个游戏（如从商店API查到的新游戏）"""
+        if not name or self.get_name(appid) is not None:
+            return
+        self._extra_ids[int(appid)] = name
+        self._extra_names[name] = int(appid)
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        """遍历 (游戏名, AppID)，包含运行中补充的游戏"""
+        for index, appid in enumerate(self._ids):
+            yield self[index], appid
+        yield from self._extra_names.items()
+
+    def updated(self, apps: Iterable[Tuple[int, str]]) -> "SteamCatalog":
+        """合并增量更新（新增或改名的游戏），返回新的游戏目录，当前目录不变"""
+        current = ((appid, name) for name, appid in self.items())
+        return SteamCatalog(itertools.chain(current, apps))
+
+    def save(self, path, meta: Optional[dict] = None):
+        """
+        保存为二进制缓存文件（先写临时文件再替换，写入中途失败不会损坏旧缓存）
+
+        Args:
+            path: 缓存文件路径
+            meta: 随缓存保存的元数据（如 ETag、最后更新时间）
+        """
+        catalog = self.updated(()) if self._extra_ids else self
+        path = Path(path)
+        meta_bytes = json.dumps(dict(meta or {}, byteorder=sys.byteorder)).encode('utf-8')
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(_HEADER.pack(len(meta_bytes)))
+            f.write(meta_bytes)
+            f.write(_COUNTS.pack(len(catalog._ids), len(catalog._blob)))
+            catalog._ids.tofile(f)
+            catalog._offsets.tofile(f)
+            catalog._by_name.tofile(f)
+            f.write(catalog._blob)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path) -> Tuple["SteamCatalog", dict]:
+        """
+        从二进制缓存文件加载游戏目录（不需要解析JSON或重新排序）
+
+        Returns:
+            Tuple[SteamCatalog, dict]: 游戏目录和保存时的元数据
+
+        Raises:
+            ValueError: 文件格式不正确
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"不是有效的游戏目录缓存文件: {path}")
+            meta_len, = _HEADER.unpack(f.read(_HEADER.size))
+            meta = json.loads(f.read(meta_len).decode('utf-8'))
+            count, blob_len = _COUNTS.unpack(f.read(_COUNTS.size))
+            catalog = cls()
+            for name, length in (('_ids', count), ('_offsets', count + 1), ('_by_name', count)):
+                values = array('I')
+                values.fromfile(f, length)
+                if meta.get('byteorder', sys.byteorder) != sys.byteorder:
+                    values.byteswap()
+                setattr(catalog, name, values)
+            catalog._blob = f.read(blob_len)
+            if len(catalog._blob) != blob_len or catalog._offsets[-1] != blob_len:
+                raise ValueError(f"游戏目录缓存文件不完整: {path}")
+        meta.pop('byteorder', None)
+        return catalog, meta
+
+    def memory_usage(self) -> int:
+        """目录占用的内存（字节，不含附加字典）"""
+        return (len(self._blob) + self._ids.itemsize * len(self._ids)
+                + self._offsets.itemsize * len(self._offsets) + self._by_name.itemsize * len(self._by_name))
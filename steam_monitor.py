@@ -1,34 +1,47 @@
 import aiohttp
 import json
 import asyncio
-import os
+import time
 from pathlib import Path
 from rapidfuzz import process, fuzz
 import logging
+from game_search import GameNameIndex
+from monitor_store import DEFAULT_USER_ID, MonitorStore
+from steam_catalog import SteamCatalog
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-import aiofiles
 
 logger = logging.getLogger("steam_monitor")
 
+# 商店 appdetails 接口在 filters=price_overview 时支持一次查询多个AppID
+PRICE_BATCH_SIZE = 50
+
+# 全量游戏列表接口（无需密钥，支持 ETag / If-Modified-Since 条件请求）
+APP_LIST_URL = "https://api.steampowered.com/ISteamApps/GetAppList/v2/"
+# 分页游戏列表接口（需要Web API密钥，支持 if_modified_since 只获取有变化的游戏）
+STORE_APP_LIST_URL = "https://api.steampowered.com/IStoreService/GetAppList/v1/"
+STORE_APP_LIST_PAGE_SIZE = 50000
+
 class SteamMonitor:
     def __init__(self, config=None):
         self.config = config or {}
         self.data_dir = Path("./data/steam")
         self.data_dir.mkdir(parents=True, exist_ok=True)
         
-        self.json1_path = self.data_dir / "game_list.json"  # 存储所有Steam游戏英文名与id对应的字典
-        self.json2_path = self.data_dir / "monitor_list.json"  # 存储用户或群组的监控列表
+        self.json1_path = self.data_dir / "game_list.json"  # 旧版本的游戏列表缓存（游戏名 -> AppID），仅用于迁移
+        self.json2_path = self.data_dir / "monitor_list.json"  # 旧版本的监控列表，仅用于迁移
+        self.catalog_path = self.data_dir / "game_catalog.bin"  # 游戏目录二进制缓存
 
-        # 确保数据文件存在，如果不存在则创建空文件
-        if not self.json1_path.exists():
-            with open(self.json1_path, "w", encoding="utf-8") as f:
-                json.dump({}, f)
-        if not self.json2_path.exists():
-            with open(self.json2_path, "w", encoding="utf-8") as f:
-                json.dump({}, f)
+        # 用户或群组的监控列表，每条监控单独一行
+        self.monitor_store = MonitorStore(self.data_dir / "monitors.db")
 
         # 从配置中获取价格检查间隔时间，默认为 30 分钟
         self.interval_minutes = self.config.get("interval_minutes", 30)
+        # 价格检查时同时进行的商店API请求数
+        self.price_concurrency = max(1, self.config.get("price_concurrency", 4))
+        # Steam Web API密钥（可选，配置后增量获取游戏列表）
+        self.api_key = self.config.get("api_key") or ""
+        # 游戏列表刷新间隔，默认为 24 小时，0 表示只在没有缓存时获取
+        self.app_list_refresh_hours = self.config.get("app_list_refresh_hours", 24)
         logger.info("正在初始化Steam游戏价格监控")
 
         self.scheduler = AsyncIOScheduler()
@@ -36,20 +49,23 @@ class SteamMonitor:
         self.scheduler.add_job(
             self.run_monitor_prices, "interval", minutes=self.interval_minutes
         )
+        # 添加定时任务，定期刷新游戏列表
+        if self.app_list_refresh_hours > 0:
+            self.scheduler.add_job(
+                self.get_app_list, "interval", hours=self.app_list_refresh_hours
+            )
         
-        self.monitor_list_lock = asyncio.Lock()  # 用于保护 monitor_list 文件的读写
         self.data_initialized = asyncio.Event()  # 添加一个Event来标记数据是否初始化完成
         
         # 初始化数据
-        self.app_dict_all = {}
-        self.app_dict_all_reverse = {}
-        self.monitor_list = {}
-
-    async def initialize(self):
-        """异步初始化数据，获取游戏列表和加载用户监控列表"""
-        await self.get_app_list()  # 获取Steam全量游戏列表
-        await self.load_user_monitors()  # 加载用户监控列表
-        self.scheduler.start()  # 启动调度器
+        self.catalog = SteamCatalog()  # Steam全量游戏目录（AppID <-> 游戏名）
+        # 游戏名模糊搜索索引，游戏列表加载后重建
+        self.name_index = GameNameIndex()
+        # 游戏列表缓存的元数据（ETag、最后修改时间、上次检查时间）
+        self.catalog_meta = {}
+        self._app_list_lock = asyncio.Lock()
+        self._refresh_task = None
+        self._init_task = None
         
     async def get_game_name_by_id(self, game_id):
         """根据游戏ID获取游戏名称
@@ -61,13 +77,14 @@ class SteamMonitor:
             str: 游戏名称，如果未找到则返回None
         """
         # 确保游戏列表已加载
-        if not self.app_dict_all:
-            await self.get_app_list()
+        if not self.data_initialized.is_set():
+            await self.initialize()
             
-        # 从反向字典中查找游戏名称
+        # 从游戏目录中查找游戏名称
         game_id = str(game_id)  # 确保ID是字符串
-        if game_id in self.app_dict_all_reverse:
-            return self.app_dict_all_reverse[game_id]
+        game_name = self.catalog.get_name(game_id)
+        if game_name is not None:
+            return game_name
             
         # 如果本地缓存中没有，尝试从Steam API获取
         try:
@@ -79,8 +96,8 @@ class SteamMonitor:
                         if data and data.get(game_id, {}).get('success', False):
                             game_name = data[game_id]['data']['name']
                             # 更新本地缓存
-                            self.app_dict_all_reverse[game_id] = game_name
-                            self.app_dict_all[game_name] = game_id
+                            self.catalog.add(game_id, game_name)
+                            self.name_index.add(game_name)
                             return game_name
         except Exception as e:
             logger.error(f"获取游戏名称失败: {e}")
@@ -88,13 +105,25 @@ class SteamMonitor:
         return None
         
     async def initialize(self):
-        """异步初始化数据，获取游戏列表和加载用户监控列表"""
-        await self.get_app_list()  # 获取Steam全量游戏列表
+        """异步初始化数据，获取游戏列表和加载用户监控列表
+        
+        两个机器人共用同一个监控实例，重复调用时等待同一次初始化完成。
+        """
+        if self._init_task is None:
+            self._init_task = asyncio.ensure_future(self._initialize())
+        await asyncio.shield(self._init_task)
+        
+    async def _initialize(self):
+        await self.load_app_list()  # 从本地缓存加载Steam全量游戏列表
         await self.load_user_monitors()  # 加载用户监控列表
         self.scheduler.start()  # 启动调度器
         self.data_initialized.set()  # 设置Event，表示数据初始化完成
         logger.info("Steam监控初始化完成")
         
+        # 没有缓存或缓存已过期时在后台刷新游戏列表，不推迟初始化完成
+        if self._app_list_stale():
+            self._refresh_task = asyncio.create_task(self.get_app_list())
+        
     async def add_game(self, game_input):
         """添加游戏到监控列表
         
@@ -118,41 +147,22 @@ class SteamMonitor:
         else:
             # 尝试查找游戏名称
             game_name = game_input
-            if game_name not in self.app_dict_all:
+            if game_name not in self.catalog:
                 # 尝试模糊匹配
-                matches = process.extract(game_name, self.app_dict_all.keys(), scorer=fuzz.token_sort_ratio, limit=1)
-                if matches and matches[0][1] > 80:  # 匹配度大于80%
-                    game_name = matches[0][0]
+                match = await self.search_game_name(game_name, scorer=fuzz.token_sort_ratio)
+                if match and match[1] > 80:  # 匹配度大于80%
+                    game_name = match[0]
                 else:
                     logger.error(f"未找到名称为 {game_name} 的游戏")
                     return False
-            game_id = self.app_dict_all[game_name]
+            game_id = self.catalog.get_id(game_name)
             
-        # 添加到监控列表
-        async with self.monitor_list_lock:
-            # 创建默认用户ID
-            default_user_id = "default"
-            if default_user_id not in self.monitor_list:
-                self.monitor_list[default_user_id] = []
-                
-            # 检查是否已在监控列表中
-            for game in self.monitor_list[default_user_id]:
-                if game['id'] == game_id:
-                    logger.info(f"游戏 {game_name} 已在监控列表中")
-                    return False
-                    
-            # 添加游戏到监控列表
-            self.monitor_list[default_user_id].append({
-                'id': game_id,
-                'name': game_name,
-                'price': None,  # 初始价格为空，将在下次检查时更新
-                'currency': 'CNY'
-            })
-            
-            # 保存监控列表
-            await self.save_monitor_list()
-            logger.info(f"已添加游戏 {game_name} (ID: {game_id}) 到监控列表")
-            return True
+        # 添加到默认监控列表（初始价格为空，将在下次检查时更新）
+        if not self.monitor_store.add(DEFAULT_USER_ID, "", game_id, game_name, currency="CNY"):
+            logger.info(f"游戏 {game_name} 已在监控列表中")
+            return False
+        logger.info(f"已添加游戏 {game_name} (ID: {game_id}) 到监控列表")
+        return True
             
     async def remove_game(self, game_input):
         """从监控列表中移除游戏
@@ -177,40 +187,22 @@ class SteamMonitor:
         else:
             # 尝试查找游戏名称
             game_name = game_input
-            if game_name not in self.app_dict_all:
+            if game_name not in self.catalog:
                 # 尝试模糊匹配
-                matches = process.extract(game_name, self.app_dict_all.keys(), scorer=fuzz.token_sort_ratio, limit=1)
-                if matches and matches[0][1] > 80:  # 匹配度大于80%
-                    game_name = matches[0][0]
+                match = await self.search_game_name(game_name, scorer=fuzz.token_sort_ratio)
+                if match and match[1] > 80:  # 匹配度大于80%
+                    game_name = match[0]
                 else:
                     logger.error(f"未找到名称为 {game_name} 的游戏")
                     return False
-            game_id = self.app_dict_all[game_name]
+            game_id = self.catalog.get_id(game_name)
             
-        # 从监控列表中移除
-        async with self.monitor_list_lock:
-            # 创建默认用户ID
-            default_user_id = "default"
-            if default_user_id not in self.monitor_list:
-                logger.error("监控列表为空")
-                return False
-                
-            # 查找并移除游戏
-            removed = False
-            for i, game in enumerate(self.monitor_list[default_user_id]):
-                if game['id'] == game_id:
-                    self.monitor_list[default_user_id].pop(i)
-                    removed = True
-                    break
-                    
-            if not removed:
-                logger.error(f"游戏 {game_name} 不在监控列表中")
-                return False
-                
-            # 保存监控列表
-            await self.save_monitor_list()
-            logger.info(f"已从监控列表中移除游戏 {game_name} (ID: {game_id})")
-            return True
+        # 从默认监控列表中移除
+        if not self.monitor_store.remove(DEFAULT_USER_ID, "", game_id):
+            logger.error(f"游戏 {game_name} 不在监控列表中")
+            return False
+        logger.info(f"已从监控列表中移除游戏 {game_name} (ID: {game_id})")
+        return True
             
     async def get_monitored_games(self):
         """获取当前监控的游戏列表
@@ -223,67 +215,186 @@ class SteamMonitor:
             await self.initialize()
             
         # 获取默认用户的监控列表
-        default_user_id = "default"
-        if default_user_id not in self.monitor_list:
-            return []
-            
-        return self.monitor_list[default_user_id]
-        
-    async def save_monitor_list(self):
-        """保存监控列表到文件"""
-        # 确保数据目录存在
-        os.makedirs(self.data_dir, exist_ok=True)
-        
-        # 保存监控列表到文件
-        monitor_file = os.path.join(self.data_dir, 'monitor_list.json')
-        async with aiofiles.open(monitor_file, 'w', encoding='utf-8') as f:
-            await f.write(json.dumps(self.monitor_list, ensure_ascii=False, indent=2))
-        
-        logger.info("监控列表已保存")
+        return [
+            {
+                'id': game['appid'],
+                'name': game['name'],
+                'price': game['last_price'],
+                'currency': game['currency']
+            }
+            for game in self.monitor_store.list(DEFAULT_USER_ID, "")
+        ]
+
+    def _app_list_stale(self):
+        """游戏列表缓存是否需要刷新"""
+        if not self.catalog:
+            return True
+        if self.app_list_refresh_hours <= 0:
+            return False
+        return time.time() - self.catalog_meta.get("checked_at", 0) >= self.app_list_refresh_hours * 3600
 
-    async def get_app_list(self):
-        """获取Steam全量游戏列表（AppID + 名称），并缓存到 game_list.json"""
+    async def load_app_list(self):
+        """从本地缓存加载游戏列表（二进制缓存，或迁移旧版本的 game_list.json）"""
         try:
-            url = "https://api.steampowered.com/ISteamApps/GetAppList/v2/"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    res = await response.json()
-            self.app_dict_all = {
-                app["name"]: app["appid"] for app in res["applist"]["apps"]
-            }
-            self.app_dict_all_reverse = {v: k for k, v in self.app_dict_all.items()}
-            with open(self.json1_path, "w", encoding="utf-8") as f:
-                json.dump(self.app_dict_all, f, ensure_ascii=False, indent=4)
-            logger.info("Steam游戏列表更新成功")
+            if self.catalog_path.exists():
+                catalog, meta = await asyncio.to_thread(SteamCatalog.load, self.catalog_path)
+            elif self.json1_path.exists():
+                catalog = await asyncio.to_thread(self._load_legacy_catalog)
+                meta = {}
+            else:
+                logger.info("没有本地游戏列表缓存，将在后台获取")
+                return
         except Exception as e:
-            logger.error(f"获取游戏列表失败：{e}")
-            self.app_dict_all = {}  # 确保即使失败也初始化为空字典
-        finally:  # 无论成功失败，都尝试从文件中加载，避免空字典
-            if not self.app_dict_all:  # 如果上面失败了，尝试从本地文件加载
-                try:
-                    with open(self.json1_path, "r", encoding="utf-8") as f:
-                        self.app_dict_all = json.load(f)
-                    self.app_dict_all_reverse = {
-                        v: k for k, v in self.app_dict_all.items()
-                    }
-                    logger.info("从本地文件加载Steam游戏列表成功")
-                except Exception as e:
-                    logger.error(f"从本地文件加载游戏列表失败：{e}")
-                    self.app_dict_all = {}  # 彻底失败则设置为空
-                    self.app_dict_all_reverse = {}
+            logger.error(f"从本地文件加载游戏列表失败：{e}")
+            return
+        self.catalog_meta = meta
+        await self._set_catalog(catalog)
+        logger.info("从本地文件加载Steam游戏列表成功")
+
+    def _load_legacy_catalog(self):
+        """从旧版本的JSON缓存（游戏名 -> AppID）加载游戏目录"""
+        with open(self.json1_path, "r", encoding="utf-8") as f:
+            return SteamCatalog((appid, name) for name, appid in json.load(f).items())
+
+    async def get_app_list(self, full=False):
+        """
+        刷新Steam全量游戏列表（AppID + 名称），并缓存到 game_catalog.bin。
+        配置了Web API密钥时用 IStoreService/GetAppList 只获取上次刷新后有变化的游戏，
+        否则请求 GetAppList/v2 并带上 ETag / If-Modified-Since，未变化时服务器不返回内容。
+        解析响应、构建游戏目录和搜索索引、写缓存都在线程中进行，失败时继续使用当前游戏列表。
+        Args:
+            full (bool): 忽略缓存，重新获取全量列表。
+        Returns:
+            bool: 是否刷新成功（包括列表未变化）。
+        """
+        async with self._app_list_lock:
+            try:
+                if self.api_key:
+                    catalog, meta = await self._fetch_store_app_list(full)
+                else:
+                    catalog, meta = await self._fetch_app_list(full)
+            except Exception as e:
+                logger.error(f"获取游戏列表失败：{e}")
+                return False
+
+            meta["checked_at"] = time.time()
+            if catalog is None:
+                logger.info("Steam游戏列表没有变化")
+                catalog = self.catalog
+            else:
+                await self._set_catalog(catalog)
+                logger.info("Steam游戏列表更新成功")
+            self.catalog_meta = meta
+            try:
+                await asyncio.to_thread(catalog.save, self.catalog_path, meta)
+                # 旧版本的JSON缓存已被二进制缓存取代
+                self.json1_path.unlink(missing_ok=True)
+            except Exception as e:
+                logger.error(f"保存游戏列表缓存失败：{e}")
+            return True
+
+    async def _fetch_app_list(self, full):
+        """
+        请求 GetAppList/v2（条件请求）。
+        Returns:
+            tuple: (新的游戏目录，未变化时为 None, 缓存元数据)
+        """
+        headers = {}
+        if self.catalog and not full and self.catalog_meta.get("source") == "applist":
+            if self.catalog_meta.get("etag"):
+                headers["If-None-Match"] = self.catalog_meta["etag"]
+            if self.catalog_meta.get("last_modified"):
+                headers["If-Modified-Since"] = self.catalog_meta["last_modified"]
+
+        async with aiohttp.ClientSession() as session:
+            async with session.get(APP_LIST_URL, headers=headers) as response:
+                if response.status == 304:
+                    return None, dict(self.catalog_meta)
+                response.raise_for_status()
+                meta = {
+                    "source": "applist",
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                }
+                body = await response.read()
+
+        def parse():
+            apps = json.loads(body)["applist"]["apps"]
+            return SteamCatalog((app["appid"], app["name"]) for app in apps)
+
+        return await asyncio.to_thread(parse), meta
+
+    async def _fetch_store_app_list(self, full):
+        """
+        分页请求 IStoreService/GetAppList，只获取 if_modified_since 之后有变化的游戏并合并到当前目录。
+        Returns:
+            tuple: (新的游戏目录，没有变化时为 None, 缓存元数据)
+        """
+        incremental = bool(self.catalog) and not full and self.catalog_meta.get("source") == "store"
+        since = self.catalog_meta.get("store_last_modified", 0) if incremental else 0
+        newest = since
+        apps = []
+        last_appid = 0
+        async with aiohttp.ClientSession() as session:
+            while True:
+                params = {
+                    "key": self.api_key,
+                    "if_modified_since": since,
+                    "last_appid": last_appid,
+                    "max_results": STORE_APP_LIST_PAGE_SIZE,
+                    "include_games": "true",
+                    "include_dlc": "true",
+                    "include_software": "true",
+                    "include_videos": "true",
+                    "include_hardware": "true",
+                }
+                async with session.get(STORE_APP_LIST_URL, params=params) as response:
+                    response.raise_for_status()
+                    res = (await response.json()).get("response", {})
+                for app in res.get("apps", []):
+                    apps.append((app["appid"], app["name"]))
+                    newest = max(newest, app.get("last_modified", 0))
+                if not res.get("have_more_results"):
+                    break
+                last_appid = res.get("last_appid", last_appid)
+
+        meta = {"source": "store", "store_last_modified": newest}
+        if incremental and not apps:
+            return None, meta
+        logger.info(f"获取到 {len(apps)} 个{'有变化的' if incremental else ''}游戏")
+        base = self.catalog if incremental else SteamCatalog()
+        return await asyncio.to_thread(base.updated, apps), meta
+
+    async def _set_catalog(self, catalog):
+        """在线程中为新的游戏目录建立搜索索引，再整体替换当前目录和索引"""
+        name_index = await asyncio.to_thread(GameNameIndex, catalog)
+        self.catalog = catalog
+        self.name_index = name_index
+        logger.info(f"Steam游戏目录共 {len(catalog)} 个游戏，占用约 {catalog.memory_usage()/1024/1024:.1f}MB，搜索索引已建立")
+
+    async def search_game_name(self, game_name, scorer=fuzz.token_set_ratio, score_cutoff=0):
+        """
+        在游戏名索引中模糊搜索（在线程中执行，不阻塞事件循环）。
+        Args:
+            game_name (str): 用户输入的游戏名。
+            scorer: rapidfuzz 打分函数。
+            score_cutoff (float): 最低匹配分数。
+        Returns:
+            tuple or None: (匹配的游戏名, 匹配分数)，没有匹配时返回 None。
+        """
+        return await asyncio.to_thread(self.name_index.search_one, game_name, scorer, score_cutoff)
 
     async def load_user_monitors(self):
-        """加载用户监控列表（从 monitor_list.json 文件）"""
+        """导入旧版本的监控列表（monitor_list.json），导入后重命名为 .bak"""
+        if not self.json2_path.exists():
+            logger.info(f"监控列表已加载，共 {self.monitor_store.count()} 条监控")
+            return
         try:
-            async with self.monitor_list_lock:  # 加锁读取，防止文件被其他操作同时修改
-                with open(self.json2_path, "r", encoding="utf-8") as f:
-                    self.monitor_list = json.load(f)
-            logger.info("监控列表加载成功")
-        except (FileNotFoundError, json.JSONDecodeError) as e:  # 组合异常捕获
-            self.monitor_list = {}  # 文件不存在或者文件损坏时初始化为空字典
-            logger.info(f"监控列表文件不存在或损坏，已创建空列表: {e}")
-            with open(self.json2_path, "w", encoding="utf-8") as f:
-                json.dump({}, f)
+            imported = await asyncio.to_thread(self.monitor_store.import_json, self.json2_path)
+            self.json2_path.replace(self.json2_path.with_name(self.json2_path.name + ".bak"))
+            logger.info(f"已从 monitor_list.json 导入 {imported} 条监控")
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logger.error(f"导入旧版本监控列表失败: {e}")
 
     async def get_appid_by_name(self, user_input):
         """
@@ -297,31 +408,34 @@ class SteamMonitor:
         # 等待数据初始化完成
         await self.data_initialized.wait()
         
-        if not self.app_dict_all:  # 检查字典是否为空
+        if not self.catalog:  # 检查游戏目录是否为空
             logger.warning("游戏列表为空，无法进行模糊匹配")
             return None
 
-        matched_result = process.extractOne(
-            user_input, self.app_dict_all.keys(), scorer=fuzz.token_set_ratio
-        )
-        if matched_result and matched_result[1] >= 70:
+        matched_result = await self.search_game_name(user_input, scorer=fuzz.token_set_ratio, score_cutoff=70)
+        if matched_result:
             matched_name = matched_result[0]
-            return [self.app_dict_all[matched_name], matched_name]
+            return [self.catalog.get_id(matched_name), matched_name]
         else:
             return None
 
-    async def get_steam_price(self, appid, region="cn"):
+    async def get_steam_price(self, appid, region="cn", session=None):
         """
         获取游戏价格信息。
         Args:
             appid (str or int): Steam 游戏的 AppID。
             region (str): 区域代码，默认为 "cn" (中国)。
+            session (aiohttp.ClientSession): 复用的HTTP会话，为空时临时创建。
         Returns:
             dict or None: 包含价格信息的字典，或 None（如果获取失败或游戏不存在）。
         """
         try:
             url = f"https://store.steampowered.com/api/appdetails?appids={appid}&cc={region}&l=zh-cn"
-            async with aiohttp.ClientSession() as session:
+            if session is None:
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(url) as response:
+                        res = await response.json()
+            else:
                 async with session.get(url) as response:
                     res = await response.json()
 
@@ -347,17 +461,84 @@ class SteamMonitor:
                 )
                 return None
 
-            return {
-                "is_free": False,
-                "current_price": price_info["final"] / 100,  # 单位转换为元
-                "original_price": price_info["initial"] / 100,
-                "discount": price_info["discount_percent"],
-                "currency": price_info["currency"],  # 货币类型
-            }
+            return self._parse_price_overview(price_info)
         except Exception as e:
             logger.error(f"获取游戏 {appid} 价格时发生异常：{e}")
             return None
 
+    @staticmethod
+    def _parse_price_overview(price_info):
+        """把商店API的 price_overview 转换为价格信息字典"""
+        return {
+            "is_free": False,
+            "current_price": price_info["final"] / 100,  # 单位转换为元
+            "original_price": price_info["initial"] / 100,
+            "discount": price_info["discount_percent"],
+            "currency": price_info["currency"],  # 货币类型
+        }
+
+    async def get_steam_prices(self, appids, region="cn"):
+        """
+        批量获取多个游戏的价格信息。
+        AppID 先去重，再按 PRICE_BATCH_SIZE 个一组用 filters=price_overview 一次查询，
+        各组请求并发执行（同时进行的请求数不超过 price_concurrency），共用一个HTTP会话。
+        批量结果中没有价格的游戏（免费、未上架等）再单独查询完整信息。
+        Args:
+            appids (iterable): Steam 游戏的 AppID。
+            region (str): 区域代码，默认为 "cn" (中国)。
+        Returns:
+            dict: AppID(str) -> 价格信息字典或 None（获取失败或没有价格）。
+        """
+        unique_ids = list(dict.fromkeys(str(appid) for appid in appids))
+        prices = {appid: None for appid in unique_ids}
+        if not unique_ids:
+            return prices
+
+        semaphore = asyncio.Semaphore(self.price_concurrency)
+        fallback_ids = []
+
+        async with aiohttp.ClientSession() as session:
+
+            async def fetch_batch(batch):
+                url = (
+                    "https://store.steampowered.com/api/appdetails"
+                    f"?appids={','.join(batch)}&filters=price_overview&cc={region}"
+                )
+                try:
+                    async with semaphore:
+                        async with session.get(url) as response:
+                            res = await response.json()
+                except Exception as e:
+                    logger.error(f"批量获取游戏价格时发生异常：{e}")
+                    res = None
+                if not isinstance(res, dict):
+                    # 批量请求失败时逐个重试
+                    fallback_ids.extend(batch)
+                    return
+                for appid in batch:
+                    data = res.get(appid) or {}
+                    price_info = data.get("data") if data.get("success") else None
+                    if isinstance(price_info, dict) and price_info.get("price_overview"):
+                        prices[appid] = self._parse_price_overview(price_info["price_overview"])
+                    elif data.get("success"):
+                        # 免费或没有价格信息的游戏，过滤后的结果无法区分，查询完整信息
+                        fallback_ids.append(appid)
+                    else:
+                        logger.warning(f"获取游戏 {appid} 价格失败或游戏不存在，data: {data}")
+
+            async def fetch_one(appid):
+                async with semaphore:
+                    prices[appid] = await self.get_steam_price(appid, region, session=session)
+
+            await asyncio.gather(*(
+                fetch_batch(unique_ids[i:i + PRICE_BATCH_SIZE])
+                for i in range(0, len(unique_ids), PRICE_BATCH_SIZE)
+            ))
+            if fallback_ids:
+                await asyncio.gather(*(fetch_one(appid) for appid in fallback_ids))
+
+        return prices
+
     async def add_monitor(self, user_id, channel_id, game_name):
         """
         添加游戏监控。
@@ -390,25 +571,14 @@ class SteamMonitor:
             "last_price": price_info.get("current_price", 0),
             "last_discount": price_info.get("discount", 0),
             "currency": price_info.get("currency", "CNY"),
-            "added_time": asyncio.get_event_loop().time(),  # 使用当前时间作为添加时间
+            "added_time": time.time(),  # 使用当前时间作为添加时间
         }
         
-        # 更新监控列表
-        key = f"{user_id}_{channel_id}"
-        async with self.monitor_list_lock:
-            if key not in self.monitor_list:
-                self.monitor_list[key] = {}
-            
-            # 检查是否已经在监控
-            if str(appid) in self.monitor_list[key]:
-                return False, f"游戏 '{matched_name}' 已在监控列表中", monitor_info
-            
-            # 添加到监控列表
-            self.monitor_list[key][str(appid)] = monitor_info
-            
-            # 保存到文件
-            with open(self.json2_path, "w", encoding="utf-8") as f:
-                json.dump(self.monitor_list, f, ensure_ascii=False, indent=4)
+        # 添加到监控列表（只写入这一条监控）
+        if not self.monitor_store.add(user_id, channel_id, appid, matched_name, monitor_info["last_price"],
+                                      monitor_info["last_discount"], monitor_info["currency"],
+                                      monitor_info["added_time"]):
+            return False, f"游戏 '{matched_name}' 已在监控列表中", monitor_info
         
         return True, f"已添加游戏 '{matched_name}' 到监控列表", monitor_info
 
@@ -425,18 +595,14 @@ class SteamMonitor:
         # 等待数据初始化完成
         await self.data_initialized.wait()
         
-        key = f"{user_id}_{channel_id}"
-        
         # 检查是否有监控列表
-        if key not in self.monitor_list:
+        monitors = self.monitor_store.list(user_id, channel_id)
+        if not monitors:
             return False, "您没有任何监控游戏"
         
         # 如果输入为空，则移除所有监控
         if not game_name:
-            async with self.monitor_list_lock:
-                del self.monitor_list[key]
-                with open(self.json2_path, "w", encoding="utf-8") as f:
-                    json.dump(self.monitor_list, f, ensure_ascii=False, indent=4)
+            self.monitor_store.remove_all(user_id, channel_id)
             return True, "已移除所有监控游戏"
         
         # 模糊匹配游戏名称
@@ -444,8 +610,8 @@ class SteamMonitor:
         if not match_result:
             # 尝试在用户的监控列表中匹配
             user_games = {
-                self.app_dict_all_reverse.get(int(appid), appid): appid
-                for appid in self.monitor_list[key].keys()
+                self.catalog.get_name(game["appid"]) or game["name"]: game["appid"]
+                for game in monitors
             }
             match_in_user_list = process.extractOne(
                 game_name, user_games.keys(), scorer=fuzz.token_set_ratio
@@ -460,22 +626,10 @@ class SteamMonitor:
             appid, matched_name = match_result
             appid = str(appid)
         
-        # 检查游戏是否在监控列表中
-        if appid not in self.monitor_list[key]:
+        # 移除监控，检查游戏是否在监控列表中
+        if not self.monitor_store.remove(user_id, channel_id, appid):
             return False, f"游戏 '{matched_name}' 不在监控列表中"
         
-        # 移除监控
-        async with self.monitor_list_lock:
-            del self.monitor_list[key][appid]
-            
-            # 如果用户没有监控任何游戏，则移除用户
-            if not self.monitor_list[key]:
-                del self.monitor_list[key]
-            
-            # 保存到文件
-            with open(self.json2_path, "w", encoding="utf-8") as f:
-                json.dump(self.monitor_list, f, ensure_ascii=False, indent=4)
-        
         return True, f"已移除游戏 '{matched_name}' 的监控"
 
     async def list_monitors(self, user_id, channel_id):
@@ -490,14 +644,8 @@ class SteamMonitor:
         # 等待数据初始化完成
         await self.data_initialized.wait()
         
-        key = f"{user_id}_{channel_id}"
-        
-        # 检查是否有监控列表
-        if key not in self.monitor_list or not self.monitor_list[key]:
-            return []
-        
         # 返回监控列表
-        return list(self.monitor_list[key].values())
+        return self.monitor_store.list(user_id, channel_id)
 
     async def run_monitor_prices(self):
         """定时检查价格变动并发送通知"""
@@ -509,39 +657,51 @@ class SteamMonitor:
             return
         
         # 检查是否有监控列表
-        if not self.monitor_list:
+        appids = self.monitor_store.appids()
+        if not appids:
             logger.info("没有监控列表，跳过本次价格检查")
             return
         
         price_changes = []  # 存储价格变动信息
+        updates = []  # 需要更新的监控价格
         
-        # 遍历所有监控列表
-        for key, games in self.monitor_list.items():
-            user_id, channel_id = key.split("_")
+        # 所有监控列表中的游戏去重后并发查询价格，每个游戏只请求一次
+        prices = await self.get_steam_prices(appids)
+        logger.info(f"已获取 {len(prices)} 个游戏的价格")
+        
+        # 按游戏取订阅者，把价格分发给每条监控
+        for appid, price_info in prices.items():
+            if not price_info:
+                logger.warning(f"无法获取游戏 {appid} 的价格信息，跳过")
+                continue
+            current_price = price_info["current_price"]
+            current_discount = price_info["discount"]
             
-            for appid, game_info in games.items():
-                # 获取最新价格
-                price_info = await self.get_steam_price(appid)
-                if not price_info:
-                    logger.warning(f"无法获取游戏 {game_info['name']} 的价格信息，跳过")
-                    continue
-                
+            for game_info in self.monitor_store.subscribers(appid):
                 # 检查价格是否变动
                 last_price = game_info["last_price"]
-                last_discount = game_info["last_discount"]
-                current_price = price_info["current_price"]
-                current_discount = price_info["discount"]
+                last_discount = game_info["last_discount"] or 0
+                
+                # 还没有记录价格的监控，记录当前价格作为基准
+                if last_price is None:
+                    updates.append((game_info["user_id"], game_info["channel_id"], appid,
+                                    current_price, current_discount))
+                    continue
                 
                 # 价格下降或折扣增加
                 if current_price < last_price or current_discount > last_discount:
                     # 更新监控信息
-                    game_info["last_price"] = current_price
-                    game_info["last_discount"] = current_discount
+                    updates.append((game_info["user_id"], game_info["channel_id"], appid,
+                                    current_price, current_discount))
+                    
+                    # 默认监控列表不属于任何频道，只更新价格
+                    if game_info["user_id"] == DEFAULT_USER_ID:
+                        continue
                     
                     # 添加到价格变动列表
                     price_changes.append({
-                        "user_id": user_id,
-                        "channel_id": channel_id,
+                        "user_id": game_info["user_id"],
+                        "channel_id": game_info["channel_id"],
                         "game_name": game_info["name"],
                         "appid": appid,
                         "old_price": last_price,
@@ -551,11 +711,8 @@ class SteamMonitor:
                         "currency": price_info["currency"],
                     })
         
-        # 保存更新后的监控列表
-        if price_changes:
-            async with self.monitor_list_lock:
-                with open(self.json2_path, "w", encoding="utf-8") as f:
-                    json.dump(self.monitor_list, f, ensure_ascii=False, indent=4)
+        # 在一个事务中保存有变化的监控价格
+        self.monitor_store.update_prices(updates)
         
         # 返回价格变动列表，由调用者处理通知
         return price_changes
@@ -591,4 +748,16 @@ class SteamMonitor:
         # 添加商店链接
         message += f"\n🔗 商店链接: https://store.steampowered.com/app/{appid}\n"
         
-        return message
\ No newline at end of file
+        return message
+
+_steam_monitor = None
+
+
+def get_steam_monitor(config=None):
+    """
+    获取全局共享的Steam监控实例（KOOK和Discord机器人运行在同一进程中，共用一份游戏目录和监控列表）
+    """
+    global _steam_monitor
+    if _steam_monitor is None:
+        _steam_monitor = SteamMonitor(config)
+    return _steam_monitor
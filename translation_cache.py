@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+# 连续的空格/制表符（保留换行，换行会影响译文排版）
+_INLINE_SPACES = re.compile(r'[ \t　]+')
+
+
+class TranslationCache:
+    """翻译结果缓存
+
+    以 (翻译服务, 源语言, 目标语言, 规范化文本) 为键。第一层是内存LRU，
+    按条数和字节数双重限制并带TTL；第二层是可选的SQLite持久化缓存，
+    重启后重复的公告、机器人消息仍然不需要再调用翻译API。
+    """
+
+    def __init__(self, ttl: int = 86400, max_entries: int = 2000, max_bytes: int = 4 * 1024 * 1024,
+                 db_path: Optional[str] = None):
+        """
+        初始化翻译缓存
+
+        Args:
+            ttl: 缓存有效期，单位为秒
+            max_entries: 内存缓存最大条数
+            max_bytes: 内存缓存最大字节数（按原文+译文的UTF-8长度计算）
+            db_path: SQLite持久化缓存路径，为空时只使用内存缓存
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        # 键 -> (译文, 过期时间, 占用字节数)
+        self._entries: "OrderedDict[str, Tuple[str, float, int]]" = OrderedDict()
+        self._bytes = 0
+
+        # 统计信息
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+        self._conn = None
+        self._conn_lock = threading.Lock()
+        if db_path:
+            path = Path(db_path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), check_same_thread=False)
+            with self._conn_lock:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                self._conn.execute(
+                    """CREATE TABLE IF NOT EXISTS translation_cache (
+                        key TEXT PRIMARY KEY,
+                        translated TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )"""
+                )
+                # 启动时顺带清掉过期条目
+                self._conn.execute("DELETE FROM translation_cache WHERE expires_at < ?", (time.time(),))
+                self._conn.commit()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """规范化文本：统一Unicode形式、去掉首尾空白、合并行内连续空格"""
+        text = unicodedata.normalize('NFC', text)
+        lines = [_INLINE_SPACES.sub(' ', line).strip() for line in text.strip().split('\n')]
+        return '\n'.join(lines)
+
+    @classmethod
+    def make_key(cls, service: str, source_language: str, target_language: str, text: str) -> str:
+        """生成缓存键"""
+        raw = '\x00'.join((service, source_language, target_language, cls.normalize(text)))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """查询缓存，依次查内存和持久化缓存
+
+        Returns:
+            Optional[str]: 命中时返回译文，否则返回None
+        """
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self._remove(key)
+
+        if self._conn is not None:
+            try:
+                row = await asyncio.to_thread(self._db_get, key, now)
+            except Exception as e:
+                print(f"⚠️ 读取翻译持久化缓存失败: {e}")
+                row = None
+            if row is not None:
+                translated, expires_at = row
+                self._store(key, translated, expires_at)
+                self.persistent_hits += 1
+                return translated
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, translated: str):
+        """写入缓存（内存和持久化缓存）"""
+        expires_at = time.time() + self.ttl
+        self._store(key, translated, expires_at)
+        if self._conn is not None:
+            try:
+                await asyncio.to_thread(self._db_set, key, translated, expires_at)
+            except Exception as e:
+                print(f"⚠️ 写入翻译持久化缓存失败: {e}")
+
+    def _store(self, key: str, translated: str, expires_at: float):
+        size = len(key) + len(translated.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (translated, expires_at, size)
+        self._bytes += size
+        # 超出条数或字节数限制时淘汰最久未使用的条目
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _db_get(self, key: str, now: float):
+        with self._conn_lock:
+            return self._conn.execute(
+                "SELECT translated, expires_at FROM translation_cache WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+
+    def _db_set(self, key: str, translated: str, expires_at: float):
+        with self._conn_lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO translation_cache (key, translated, expires_at) VALUES (?, ?, ?)",
+                    (key, translated, expires_at)
+                )
+
+    def get_stats(self) -> dict:
+        """获取缓存统计信息"""
+        lookups = self.hits + self.persistent_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.persistent_hits) / lookups if lookups else 0.0,
+            "persistent": self._conn is not None
+        }
+
+    def clear(self):
+        """清空内存缓存"""
+        self._entries.clear()
+        self._bytes = 0
+
+    def close(self):
+        """关闭持久化缓存"""
+        if self._conn is not None:
+            with self._conn_lock:
+                self._conn.close()
+            self._conn = None
@@ -1,12 +1,18 @@
-import os
 import abc
+import asyncio
+import threading
 import aiohttp
-from dotenv import load_dotenv
-from typing import Dict, Optional, Type
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Type
+from settings import Settings, get_settings
+from translation_cache import TranslationCache
 
 # 翻译服务基类
 class TranslationService(abc.ABC):
-    def __init__(self, source_language: str, target_language: str):
+    # 不支持批量接口时，逐条翻译的最大并发数
+    max_concurrency = 4
+    
+    def __init__(self, source_language: str, target_language: str, settings: Settings):
         self.source_language = source_language
         self.target_language = target_language
         
@@ -14,25 +20,58 @@ class TranslationService(abc.ABC):
     async def translate(self, text: str) -> str:
         """翻译文本的抽象方法，需要子类实现"""
         pass
+    
+    async def translate_batch(self, texts: List[str]) -> List[str]:
+        """批量翻译文本
+        
+        默认实现逐条调用translate并限制并发数；支持批量接口的服务应覆盖此方法，
+        用一次请求翻译多段文本。
+        
+        Args:
+            texts: 要翻译的文本列表
+            
+        Returns:
+            List[str]: 与输入一一对应的译文，翻译失败的条目返回原文
+        """
+        if not texts:
+            return []
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def translate_one(text: str) -> str:
+            async with semaphore:
+                try:
+                    return await self.translate(text)
+                except Exception as e:
+                    print(f"❌ 翻译过程中出错: {e}")
+                    return text
+        
+        return list(await asyncio.gather(*(translate_one(text) for text in texts)))
         
     @classmethod
     @abc.abstractmethod
-    def is_configured(cls) -> bool:
+    def is_configured(cls, settings: Settings) -> bool:
         """检查翻译服务是否配置正确的抽象方法，需要子类实现"""
         pass
+    
+    def close(self, cancel_pending: bool = True):
+        """释放翻译服务持有的资源（线程池等），默认无需处理
+        
+        Args:
+            cancel_pending: 是否取消尚未开始的请求；替换服务时为False，让已提交的翻译完成
+        """
+        pass
 
 # LibreTranslate服务实现
 class LibreTranslateService(TranslationService):
-    def __init__(self, source_language: str, target_language: str):
-        super().__init__(source_language, target_language)
-        self.api_url = os.getenv('LIBRE_TRANSLATION_API_URL', 'https://libretranslate.com/translate')
-        self.api_key = os.getenv('LIBRE_TRANSLATION_API_KEY', '')
+    def __init__(self, source_language: str, target_language: str, settings: Settings):
+        super().__init__(source_language, target_language, settings)
+        self.api_url = settings.libre_api_url or 'https://libretranslate.com/translate'
+        self.api_key = settings.libre_api_key
         
     @classmethod
-    def is_configured(cls) -> bool:
+    def is_configured(cls, settings: Settings) -> bool:
         """检查LibreTranslate服务是否配置正确"""
-        api_url = os.getenv('LIBRE_TRANSLATION_API_URL', '')
-        return bool(api_url)
+        return bool(settings.libre_api_url)
         
     async def translate(self, text: str) -> str:
         """使用LibreTranslate API翻译文本"""
@@ -60,20 +99,126 @@ class LibreTranslateService(TranslationService):
         except Exception as e:
             print(f"❌ LibreTranslate翻译过程中出错: {e}")
             return text
+    
+    async def translate_batch(self, texts: List[str]) -> List[str]:
+        """使用LibreTranslate API批量翻译文本（q传数组）"""
+        if len(texts) <= 1:
+            return [await self.translate(text) for text in texts]
+        try:
+            async with aiohttp.ClientSession() as session:
+                payload = {
+                    "q": texts,
+                    "source": self.source_language,
+                    "target": self.target_language,
+                    "format": "text"
+                }
+                
+                if self.api_key:
+                    payload["api_key"] = self.api_key
+                
+                async with session.post(self.api_url, json=payload) as response:
+                    if response.status == 200:
+                        result = await response.json()
+                        translated = result.get("translatedText")
+                        if isinstance(translated, list) and len(translated) == len(texts):
+                            return [item or text for item, text in zip(translated, texts)]
+                    else:
+                        print(f"❌ LibreTranslate批量翻译失败，状态码: {response.status}")
+        except Exception as e:
+            print(f"❌ LibreTranslate批量翻译过程中出错: {e}")
+        # 旧版本不支持数组参数或批量请求失败时，回退到逐条翻译
+        return await super().translate_batch(texts)
 
 # 腾讯云翻译服务实现
 class TencentTranslateService(TranslationService):
-    def __init__(self, source_language: str, target_language: str):
-        super().__init__(source_language, target_language)
-        self.secret_id = os.getenv('TENCENT_SECRET_ID', '')
-        self.secret_key = os.getenv('TENCENT_SECRET_KEY', '')
+    def __init__(self, source_language: str, target_language: str, settings: Settings):
+        super().__init__(source_language, target_language, settings)
+        self.secret_id = settings.tencent_secret_id
+        self.secret_key = settings.tencent_secret_key
+        self.timeout = settings.tencent_timeout
+        self.max_concurrency = settings.tencent_workers
+        
+        # 腾讯云SDK是同步接口，放到有界线程池中执行，避免阻塞事件循环
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="tencent-tmt")
+        # 复用同一个客户端及其连接
+        self._client = None
+        self._models = None
+        self._client_lock = threading.Lock()
         
     @classmethod
-    def is_configured(cls) -> bool:
+    def is_configured(cls, settings: Settings) -> bool:
         """检查腾讯云翻译服务是否配置正确"""
-        secret_id = os.getenv('TENCENT_SECRET_ID', '')
-        secret_key = os.getenv('TENCENT_SECRET_KEY', '')
-        return bool(secret_id and secret_key)
+        return bool(settings.tencent_secret_id and settings.tencent_secret_key)
+    
+    def _get_client(self):
+        """获取腾讯云翻译客户端，首次调用时创建（在线程池中调用）"""
+        with self._client_lock:
+            if self._client is None:
+                from tencentcloud.common import credential
+                from tencentcloud.common.profile.client_profile import ClientProfile
+                from tencentcloud.common.profile.http_profile import HttpProfile
+                from tencentcloud.tmt.v20180321 import tmt_client, models
+                
+                # 设置腾讯云API认证信息
+                cred = credential.Credential(self.secret_id, self.secret_key)
+                httpProfile = HttpProfile()
+                httpProfile.endpoint = "tmt.tencentcloudapi.com"
+                # SDK请求自身的超时，保证放弃等待后线程池中的调用也会在超时后结束
+                httpProfile.reqTimeout = max(int(self.timeout), 1)
+                clientProfile = ClientProfile()
+                clientProfile.httpProfile = httpProfile
+                self._client = tmt_client.TmtClient(cred, "ap-guangzhou", clientProfile)
+                self._models = models
+            return self._client, self._models
+    
+    def _languages(self):
+        """获取腾讯云使用的源语言和目标语言代码"""
+        source_lang = "auto" if self.source_language == "auto" else self.source_language
+        target_lang = self.target_language
+        
+        # 处理语言代码格式差异
+        if target_lang == "zh-CN":
+            target_lang = "zh"
+        return source_lang, target_lang
+    
+    def _text_translate(self, text: str) -> str:
+        """同步调用TextTranslate接口（在线程池中执行）"""
+        client, models = self._get_client()
+        source_lang, target_lang = self._languages()
+        
+        # 创建请求对象
+        req = models.TextTranslateRequest()
+        req.SourceText = text
+        req.Source = source_lang
+        req.Target = target_lang
+        req.ProjectId = 0
+        
+        # 发送请求
+        resp = client.TextTranslate(req)
+        return resp.TargetText
+    
+    def _text_translate_batch(self, texts: List[str]) -> List[str]:
+        """同步调用TextTranslateBatch接口（在线程池中执行）"""
+        client, models = self._get_client()
+        source_lang, target_lang = self._languages()
+        
+        req = models.TextTranslateBatchRequest()
+        req.SourceTextList = texts
+        req.Source = source_lang
+        req.Target = target_lang
+        req.ProjectId = 0
+        
+        resp = client.TextTranslateBatch(req)
+        return list(resp.TargetTextList)
+    
+    async def _run_in_executor(self, func, *args):
+        """在线程池中执行同步SDK调用，超时后放弃等待"""
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(loop.run_in_executor(self._executor, func, *args), timeout=self.timeout)
+    
+    def close(self, cancel_pending: bool = True):
+        """关闭线程池：不等待正在执行的SDK调用（它们在reqTimeout后结束），默认取消尚未开始的调用"""
+        self._executor.shutdown(wait=False, cancel_futures=cancel_pending)
         
     async def translate(self, text: str) -> str:
         """使用腾讯云翻译API翻译文本"""
@@ -82,58 +227,52 @@ class TencentTranslateService(TranslationService):
             if not self.secret_id or not self.secret_key:
                 print("❌ 腾讯云翻译API密钥未配置")
                 return text
-                
-            # 导入腾讯云SDK
-            try:
-                from tencentcloud.common import credential
-                from tencentcloud.common.profile.client_profile import ClientProfile
-                from tencentcloud.common.profile.http_profile import HttpProfile
-                from tencentcloud.tmt.v20180321 import tmt_client, models
-            except ImportError:
-                print("❌ 腾讯云SDK未安装，请运行: pip install tencentcloud-sdk-python")
-                return text
-                
-            # 设置腾讯云API认证信息
-            cred = credential.Credential(self.secret_id, self.secret_key)
-            httpProfile = HttpProfile()
-            httpProfile.endpoint = "tmt.tencentcloudapi.com"
-            clientProfile = ClientProfile()
-            clientProfile.httpProfile = httpProfile
-            client = tmt_client.TmtClient(cred, "ap-guangzhou", clientProfile)
-            
-            # 设置请求参数
-            source_lang = "auto" if self.source_language == "auto" else self.source_language
-            target_lang = self.target_language
-            
-            # 处理语言代码格式差异
-            if target_lang == "zh-CN":
-                target_lang = "zh"
-                
-            # 创建请求对象
-            req = models.TextTranslateRequest()
-            req.SourceText = text
-            req.Source = source_lang
-            req.Target = target_lang
-            req.ProjectId = 0
             
-            # 发送请求
-            resp = client.TextTranslate(req)
-            return resp.TargetText
+            return await self._run_in_executor(self._text_translate, text)
+        except ImportError:
+            print("❌ 腾讯云SDK未安装，请运行: pip install tencentcloud-sdk-python")
+            return text
+        except asyncio.TimeoutError:
+            print(f"❌ 腾讯云翻译超时（{self.timeout}秒）")
+            return text
         except Exception as e:
             print(f"❌ 腾讯云翻译过程中出错: {e}")
             return text
+    
+    async def translate_batch(self, texts: List[str]) -> List[str]:
+        """使用腾讯云TextTranslateBatch接口批量翻译文本"""
+        if len(texts) <= 1:
+            return [await self.translate(text) for text in texts]
+        try:
+            if not self.secret_id or not self.secret_key:
+                print("❌ 腾讯云翻译API密钥未配置")
+                return list(texts)
+            
+            translated = await self._run_in_executor(self._text_translate_batch, texts)
+            if len(translated) == len(texts):
+                return translated
+            print(f"❌ 腾讯云批量翻译返回条数不匹配: {len(translated)}/{len(texts)}")
+        except ImportError:
+            print("❌ 腾讯云SDK未安装，请运行: pip install tencentcloud-sdk-python")
+            return list(texts)
+        except asyncio.TimeoutError:
+            print(f"❌ 腾讯云批量翻译超时（{self.timeout}秒）")
+            return list(texts)
+        except Exception as e:
+            print(f"❌ 腾讯云批量翻译过程中出错: {e}")
+        # 批量接口失败时回退到逐条翻译
+        return await super().translate_batch(texts)
 
 # Google翻译服务实现
 class GoogleTranslateService(TranslationService):
-    def __init__(self, source_language: str, target_language: str):
-        super().__init__(source_language, target_language)
-        self.api_key = os.getenv('GOOGLE_TRANSLATION_API_KEY', '')
+    def __init__(self, source_language: str, target_language: str, settings: Settings):
+        super().__init__(source_language, target_language, settings)
+        self.api_key = settings.google_api_key
         
     @classmethod
-    def is_configured(cls) -> bool:
+    def is_configured(cls, settings: Settings) -> bool:
         """检查Google翻译服务是否配置正确"""
-        api_key = os.getenv('GOOGLE_TRANSLATION_API_KEY', '')
-        return bool(api_key)
+        return bool(settings.google_api_key)
         
     async def translate(self, text: str) -> str:
         """使用Google翻译API翻译文本"""
@@ -169,20 +308,63 @@ class GoogleTranslateService(TranslationService):
         except Exception as e:
             print(f"❌ Google翻译过程中出错: {e}")
             return text
+    
+    async def translate_batch(self, texts: List[str]) -> List[str]:
+        """使用Google翻译API批量翻译文本（一次请求传多个q）"""
+        if len(texts) <= 1:
+            return [await self.translate(text) for text in texts]
+        try:
+            if not self.api_key:
+                print("❌ Google翻译API密钥未配置")
+                return list(texts)
+                
+            async with aiohttp.ClientSession() as session:
+                url = f"https://translation.googleapis.com/language/translate/v2?key={self.api_key}"
+                payload = {
+                    "q": texts,
+                    "target": self.target_language,
+                    "format": "text"
+                }
+                
+                if self.source_language != "auto":
+                    payload["source"] = self.source_language
+                
+                async with session.post(url, json=payload) as response:
+                    if response.status == 200:
+                        result = await response.json()
+                        translations = result.get("data", {}).get("translations", [])
+                        if len(translations) == len(texts):
+                            return [item.get("translatedText", text) for item, text in zip(translations, texts)]
+                        print(f"❌ Google批量翻译返回条数不匹配: {len(translations)}/{len(texts)}")
+                    else:
+                        print(f"❌ Google批量翻译失败，状态码: {response.status}")
+                    return list(texts)
+        except Exception as e:
+            print(f"❌ Google批量翻译过程中出错: {e}")
+            return list(texts)
 
 # 百度翻译服务实现
 class BaiduTranslateService(TranslationService):
-    def __init__(self, source_language: str, target_language: str):
-        super().__init__(source_language, target_language)
-        self.app_id = os.getenv('BAIDU_APP_ID', '')
-        self.app_key = os.getenv('BAIDU_APP_KEY', '')
+    # 百度翻译API使用的语言代码与其他服务不同
+    LANG_MAP = {
+        "zh-CN": "zh",
+        "en": "en",
+        "ja": "jp",
+        "ko": "kor",
+        "fr": "fra",
+        "es": "spa",
+        "ru": "ru"
+    }
+    
+    def __init__(self, source_language: str, target_language: str, settings: Settings):
+        super().__init__(source_language, target_language, settings)
+        self.app_id = settings.baidu_app_id
+        self.app_key = settings.baidu_app_key
         
     @classmethod
-    def is_configured(cls) -> bool:
+    def is_configured(cls, settings: Settings) -> bool:
         """检查百度翻译服务是否配置正确"""
-        app_id = os.getenv('BAIDU_APP_ID', '')
-        app_key = os.getenv('BAIDU_APP_KEY', '')
-        return bool(app_id and app_key)
+        return bool(settings.baidu_app_id and settings.baidu_app_key)
         
     async def translate(self, text: str) -> str:
         """使用百度翻译API翻译文本"""
@@ -204,18 +386,8 @@ class BaiduTranslateService(TranslationService):
             target_lang = self.target_language
             
             # 百度翻译API使用的语言代码可能与其他服务不同，需要转换
-            lang_map = {
-                "zh-CN": "zh",
-                "en": "en",
-                "ja": "jp",
-                "ko": "kor",
-                "fr": "fra",
-                "es": "spa",
-                "ru": "ru"
-            }
-            
-            source_lang = lang_map.get(source_lang, source_lang)
-            target_lang = lang_map.get(target_lang, target_lang)
+            source_lang = self.LANG_MAP.get(source_lang, source_lang)
+            target_lang = self.LANG_MAP.get(target_lang, target_lang)
             
             # 发送请求
             async with aiohttp.ClientSession() as session:
@@ -242,20 +414,103 @@ class BaiduTranslateService(TranslationService):
         except Exception as e:
             print(f"❌ 百度翻译过程中出错: {e}")
             return text
+    
+    # 百度翻译单次请求的文本长度上限（按字符粗略控制，官方限制为6000字节）
+    BATCH_MAX_CHARS = 1800
+    
+    async def translate_batch(self, texts: List[str]) -> List[str]:
+        """使用百度翻译API批量翻译文本
+        
+        百度接口按行返回翻译结果，把多段单行文本用换行拼接后一次请求；
+        包含换行或过长的文本仍然单独翻译。
+        """
+        if len(texts) <= 1:
+            return [await self.translate(text) for text in texts]
+        
+        results = list(texts)
+        single_indexes = []
+        groups = []
+        current, current_len = [], 0
+        for index, text in enumerate(texts):
+            stripped = text.strip()
+            if '\n' in stripped or not stripped or len(stripped) > self.BATCH_MAX_CHARS:
+                single_indexes.append(index)
+                continue
+            if current and current_len + len(stripped) + 1 > self.BATCH_MAX_CHARS:
+                groups.append(current)
+                current, current_len = [], 0
+            current.append(index)
+            current_len += len(stripped) + 1
+        if current:
+            groups.append(current)
+        
+        for group in groups:
+            joined = '\n'.join(texts[index].strip() for index in group)
+            lines = await self._translate_lines(joined)
+            if lines is not None and len(lines) == len(group):
+                for index, line in zip(group, lines):
+                    results[index] = line
+            else:
+                single_indexes.extend(group)
+        
+        if single_indexes:
+            translated = await super().translate_batch([texts[index] for index in single_indexes])
+            for index, line in zip(single_indexes, translated):
+                results[index] = line
+        return results
+    
+    async def _translate_lines(self, text: str) -> Optional[List[str]]:
+        """翻译多行文本，返回逐行译文，失败时返回None"""
+        try:
+            if not self.app_id or not self.app_key:
+                print("❌ 百度翻译API密钥未配置")
+                return None
+                
+            import random
+            import hashlib
+            
+            salt = str(random.randint(32768, 65536))
+            sign = hashlib.md5((self.app_id + text + salt + self.app_key).encode()).hexdigest()
+            
+            source_lang = self.LANG_MAP.get(self.source_language, self.source_language)
+            target_lang = self.LANG_MAP.get(self.target_language, self.target_language)
+            
+            async with aiohttp.ClientSession() as session:
+                url = "https://api.fanyi.baidu.com/api/trans/vip/translate"
+                params = {
+                    "q": text,
+                    "from": source_lang,
+                    "to": target_lang,
+                    "appid": self.app_id,
+                    "salt": salt,
+                    "sign": sign
+                }
+                
+                async with session.get(url, params=params) as response:
+                    if response.status == 200:
+                        result = await response.json()
+                        trans_result = result.get("trans_result")
+                        if trans_result:
+                            return [item.get("dst", item.get("src", "")) for item in trans_result]
+                        print(f"❌ 百度批量翻译失败: {result}")
+                    else:
+                        print(f"❌ 百度批量翻译失败，状态码: {response.status}")
+                    return None
+        except Exception as e:
+            print(f"❌ 百度批量翻译过程中出错: {e}")
+            return None
 
 # 有道翻译服务实现
 class YoudaoTranslateService(TranslationService):
-    def __init__(self, source_language: str, target_language: str):
-        super().__init__(source_language, target_language)
-        self.app_key = os.getenv('YOUDAO_APP_KEY', '')
-        self.app_secret = os.getenv('YOUDAO_APP_SECRET', '')
+    def __init__(self, source_language: str, target_language: str, settings: Settings):
+        super().__init__(source_language, target_language, settings)
+        self.app_key = settings.youdao_app_key
+        self.app_secret = settings.youdao_app_secret
         
     @classmethod
-    def is_configured(cls) -> bool:
+    def is_configured(cls, settings: Settings) -> bool:
         """检查有道翻译服务是否配置正确"""
-        app_key = os.getenv('YOUDAO_APP_KEY', '')
-        app_secret = os.getenv('YOUDAO_APP_SECRET', '')
-        return bool(app_key and app_secret)
+        return bool(settings.youdao_app_key and settings.youdao_app_secret)
         
     async def translate(self, text: str) -> str:
         """使用有道翻译API翻译文本"""
@@ -330,6 +585,18 @@ class YoudaoTranslateService(TranslationService):
         return q if size <= 20 else q[0:10] + str(size) + q[size - 10:size]
 
 # 主翻译器类
+# 翻译服务使用的配置，重新加载后有变化时重新创建翻译服务
+_SERVICE_FIELDS = (
+    'translation_enabled', 'translation_service', 'translation_source_language', 'translation_target_language',
+    'libre_api_url', 'libre_api_key', 'tencent_secret_id', 'tencent_secret_key', 'tencent_timeout',
+    'tencent_workers', 'google_api_key', 'baidu_app_id', 'baidu_app_key', 'youdao_app_key', 'youdao_app_secret'
+)
+# 翻译缓存使用的配置，重新加载后有变化时重新创建缓存
+_CACHE_FIELDS = (
+    'translation_enabled', 'translation_cache_enabled', 'translation_cache_ttl',
+    'translation_cache_max_entries', 'translation_cache_max_bytes', 'translation_cache_db'
+)
+
 class Translator:
     # 支持的翻译服务映射
     SERVICES: Dict[str, Type[TranslationService]] = {
@@ -340,26 +607,75 @@ class Translator:
         'youdao': YoudaoTranslateService
     }
     
-    def __init__(self):
-        """初始化翻译服务"""
-        load_dotenv()
-        self.enabled = os.getenv('TRANSLATION_ENABLED', 'false').lower() == 'true'
-        self.service_type = os.getenv('TRANSLATION_SERVICE', 'libre').lower()
-        self.target_language = os.getenv('TRANSLATION_TARGET_LANGUAGE', 'zh-CN')
-        self.source_language = os.getenv('TRANSLATION_SOURCE_LANGUAGE', 'auto')
+    def __init__(self, settings: Optional[Settings] = None):
+        """
+        初始化翻译服务
         
-        # 初始化白名单
-        whitelist_str = os.getenv('TRANSLATION_WHITELIST', '')
-        self.whitelist = [item.strip() for item in whitelist_str.split(',') if item.strip()]
+        Args:
+            settings: 机器人配置，为空时使用全局共享的配置
+        """
+        self._load(settings or get_settings())
         
         # 初始化翻译服务
         self.service = self._create_service()
         
-        # 打印翻译器状态
+        # 初始化翻译结果缓存
+        self.cache = self._create_cache()
+        
+        self._batch_pending = []
+        self._batch_task = None
+        
+        self._print_status()
+    
+    def _load(self, settings: Settings):
+        """把配置展开为属性"""
+        self.settings = settings
+        self.enabled = settings.translation_enabled
+        self.service_type = settings.translation_service
+        self.target_language = settings.translation_target_language
+        self.source_language = settings.translation_source_language
+        
+        # 初始化白名单
+        self.whitelist = list(settings.translation_whitelist)
+        
+        # 批量翻译合并窗口：窗口内并发到达的翻译请求合并为一次批量请求，0表示不合并
+        self.batch_window = settings.translation_batch_window
+        self.batch_size = settings.translation_batch_size
+    
+    def apply_settings(self, settings: Settings):
+        """应用重新加载的配置（在事件循环中调用）
+        
+        翻译服务或缓存的配置有变化时才重新创建它们；正在进行的翻译继续使用旧的服务完成。
+        
+        Args:
+            settings: 新的机器人配置
+        """
+        old = self.settings
+        if settings == old:
+            return
+        self._load(settings)
+        
+        if any(getattr(settings, name) != getattr(old, name) for name in _SERVICE_FIELDS):
+            old_service, self.service = self.service, self._create_service()
+            if old_service:
+                old_service.close(cancel_pending=False)
+        
+        if any(getattr(settings, name) != getattr(old, name) for name in _CACHE_FIELDS):
+            old_cache, self.cache = self.cache, self._create_cache()
+            if old_cache:
+                old_cache.close()
+        
+        self._print_status()
+    
+    def _print_status(self):
+        """打印翻译器状态"""
         if self.enabled:
             print(f"✅ 翻译功能已启用 - 服务类型: {self.service_type}, 目标语言: {self.target_language}")
             if self.whitelist:
                 print(f"✅ 翻译白名单已设置: {', '.join(self.whitelist)}")
+            if self.cache:
+                stats = self.cache.get_stats()
+                print(f"✅ 翻译缓存已启用 - 有效期: {self.cache.ttl}秒, 持久化: {'是' if stats['persistent'] else '否'}")
         else:
             print("❌ 翻译功能已禁用")
     
@@ -373,12 +689,38 @@ class Translator:
             print(f"❌ 不支持的翻译服务类型: {self.service_type}")
             return None
             
-        if not service_class.is_configured():
+        if not service_class.is_configured(self.settings):
             print(f"❌ {self.service_type}翻译服务配置不正确")
             return None
             
-        return service_class(self.source_language, self.target_language)
+        return service_class(self.source_language, self.target_language, self.settings)
             
+    def _create_cache(self) -> Optional[TranslationCache]:
+        """根据配置创建翻译结果缓存"""
+        if not self.enabled or not self.settings.translation_cache_enabled:
+            return None
+        try:
+            return TranslationCache(
+                ttl=self.settings.translation_cache_ttl,
+                max_entries=self.settings.translation_cache_max_entries,
+                max_bytes=self.settings.translation_cache_max_bytes,
+                db_path=self.settings.translation_cache_db
+            )
+        except Exception as e:
+            print(f"❌ 创建翻译缓存失败，将不使用缓存: {e}")
+            return None
+    
+    def close(self):
+        """关闭翻译服务和翻译缓存"""
+        if self.service:
+            self.service.close()
+        if self.cache:
+            self.cache.close()
+    
+    def get_cache_stats(self) -> Optional[dict]:
+        """获取翻译缓存统计信息，未启用缓存时返回None"""
+        return self.cache.get_stats() if self.cache else None
+    
     def is_enabled(self) -> bool:
         """检查翻译功能是否启用
         
@@ -461,6 +803,91 @@ class Translator:
                 return True
         return False
     
+    def _has_translatable_content(self, text: str) -> bool:
+        """检查文本是否包含需要翻译的文字（纯表情、数字、符号无需调用翻译API）"""
+        return any(ch.isalpha() for ch in text)
+    
+    async def translate_texts(self, texts: List[str]) -> List[str]:
+        """批量翻译多段文本，优先使用缓存，未命中的部分合并为一次批量请求
+        
+        Args:
+            texts: 要翻译的文本列表
+            
+        Returns:
+            List[str]: 与输入一一对应的译文，翻译失败的条目返回原文
+        """
+        results = list(texts)
+        # 未命中缓存的文本 -> 在输入中的位置（相同文本只翻译一次）
+        missing: Dict[str, List[int]] = {}
+        keys: Dict[str, str] = {}
+        
+        for index, text in enumerate(texts):
+            if not self._has_translatable_content(text):
+                continue
+            if text in missing:
+                missing[text].append(index)
+                continue
+            if self.cache:
+                key = self.cache.make_key(self.service_type, self.source_language, self.target_language, text)
+                cached = await self.cache.get(key)
+                if cached is not None:
+                    results[index] = cached
+                    continue
+                keys[text] = key
+            missing[text] = [index]
+        
+        if not missing:
+            return results
+        
+        pending = list(missing.keys())
+        try:
+            translated = await self.service.translate_batch(pending)
+        except Exception as e:
+            print(f"❌ 批量翻译过程中出错: {e}")
+            return results
+        
+        for text, translated_text in zip(pending, translated):
+            for index in missing[text]:
+                results[index] = translated_text
+            # 翻译服务失败时返回原文，只缓存真正得到译文的结果，避免把失败结果缓存下来
+            if self.cache and translated_text and translated_text != text:
+                await self.cache.set(keys[text], translated_text)
+        return results
+    
+    async def _translate_coalesced(self, text: str) -> str:
+        """翻译单段文本；短时间内并发到达的多条消息会合并为一次批量请求"""
+        if self.batch_window <= 0:
+            return (await self.translate_texts([text]))[0]
+        
+        future = asyncio.get_running_loop().create_future()
+        self._batch_pending.append((text, future))
+        if len(self._batch_pending) >= self.batch_size:
+            # 攒够一批立即发送
+            asyncio.create_task(self._flush_batch(0))
+        elif self._batch_task is None:
+            self._batch_task = asyncio.create_task(self._flush_batch(self.batch_window))
+        return await future
+    
+    async def _flush_batch(self, delay: float):
+        """等待合并窗口结束后发送当前积攒的翻译请求"""
+        if delay:
+            await asyncio.sleep(delay)
+        if self._batch_task is asyncio.current_task():
+            self._batch_task = None
+        pending, self._batch_pending = self._batch_pending, []
+        if not pending:
+            return
+        
+        texts = [text for text, _ in pending]
+        try:
+            translated = await self.translate_texts(texts)
+        except Exception as e:
+            print(f"❌ 批量翻译过程中出错: {e}")
+            translated = texts
+        for (_, future), translated_text in zip(pending, translated):
+            if not future.done():
+                future.set_result(translated_text)
+    
     async def translate_text(self, text: str) -> str:
         """翻译文本，跳过代码块和白名单内容
         
@@ -480,7 +907,7 @@ class Translator:
         # 如果不包含代码块，直接翻译整个文本
         if not self._contains_code_block(text):
             try:
-                return await self.service.translate(text)
+                return await self._translate_coalesced(text)
             except Exception as e:
                 print(f"❌ 翻译过程中出错: {e}")
                 return text
@@ -488,22 +915,19 @@ class Translator:
         # 包含代码块，分割处理
         try:
             parts = self._split_text_and_code_blocks(text)
-            result = ""
             
-            for part in parts:
-                if part["type"] == "text" and part["content"].strip():
-                    # 检查文本部分是否在白名单中
-                    if self._should_skip_translation(part["content"]):
-                        result += part["content"]
-                    else:
-                        # 只翻译非代码块且不在白名单中的部分
-                        translated = await self.service.translate(part["content"])
-                        result += translated
-                else:
-                    # 代码块部分保持原样
-                    result += part["content"]
+            # 只翻译非代码块且不在白名单中的部分，所有片段合并为一次批量请求
+            indexes = [
+                index for index, part in enumerate(parts)
+                if part["type"] == "text" and part["content"].strip()
+                and not self._should_skip_translation(part["content"])
+            ]
+            translated = await self.translate_texts([parts[index]["content"] for index in indexes])
+            for index, translated_text in zip(indexes, translated):
+                parts[index]["content"] = translated_text
             
-            return result
+            # 代码块部分保持原样
+            return "".join(part["content"] for part in parts)
         except Exception as e:
             print(f"❌ 处理代码块翻译过程中出错: {e}")
-            return text
\ No newline at end of file
+            return text